@@ -0,0 +1,169 @@
+import os
+
+# Runtime configuration for the QuickDraw backend.
+# Every setting can be overridden with an environment variable so the same
+# build can be tuned per deployment (classroom events, dev laptops, CI).
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Micro-batching: concurrent recognition requests are gathered into one
+# batched forward pass of up to BATCH_MAX_SIZE drawings, waiting at most
+# BATCH_MAX_WAIT_MS for the batch to fill up.
+BATCH_MAX_SIZE = _env_int("QUICKDRAW_BATCH_MAX_SIZE", 32)
+BATCH_MAX_WAIT_MS = _env_float("QUICKDRAW_BATCH_MAX_WAIT_MS", 5.0)
+
+# Inference executor: preprocessing runs on a bounded thread pool of
+# INFERENCE_WORKERS threads. Up to INFERENCE_QUEUE_SIZE further requests may
+# wait; beyond that requests are rejected with 503 instead of queueing forever.
+INFERENCE_WORKERS = _env_int("QUICKDRAW_INFERENCE_WORKERS", min(4, os.cpu_count() or 1))
+INFERENCE_QUEUE_SIZE = _env_int("QUICKDRAW_INFERENCE_QUEUE_SIZE", 64)
+
+# Incremental drawing sessions: each session keeps a 400x400 canvas on the
+# server (and its points in fast mode or while capturing). A session takes at
+# most SESSION_MAX_POINTS points (413 beyond that; WebSocket drawings get an
+# error message). Idle sessions expire after SESSION_TTL_SECONDS and all
+# sessions together are capped at SESSION_MAX_MEMORY_MB (LRU eviction).
+SESSION_TTL_SECONDS = _env_float("QUICKDRAW_SESSION_TTL_SECONDS", 300)
+SESSION_MAX_MEMORY_MB = _env_float("QUICKDRAW_SESSION_MAX_MEMORY_MB", 64)
+SESSION_MAX_POINTS = _env_int("QUICKDRAW_SESSION_MAX_POINTS", 10000)
+
+# WebSocket live recognition: bursts of points are coalesced so each client
+# gets at most one inference per WS_INFERENCE_INTERVAL_MS, and a new guess is
+# only pushed when the top class changes or its confidence moves by at least
+# WS_MIN_CONFIDENCE_DELTA.
+WS_INFERENCE_INTERVAL_MS = _env_float("QUICKDRAW_WS_INFERENCE_INTERVAL_MS", 250)
+WS_MIN_CONFIDENCE_DELTA = _env_float("QUICKDRAW_WS_MIN_CONFIDENCE_DELTA", 0.05)
+
+# Prediction cache: probabilities are cached by a hash of the final 64x64
+# model input. CACHE_MAX_ENTRIES=0 disables it.
+CACHE_MAX_ENTRIES = _env_int("QUICKDRAW_CACHE_MAX_ENTRIES", 4096)
+CACHE_TTL_SECONDS = _env_float("QUICKDRAW_CACHE_TTL_SECONDS", 120)
+
+# Inference backend: "keras" serves the .keras model with TensorFlow, "tflite"
+# and "onnx" serve a model exported by model_training/export_model.py without
+# importing TensorFlow. MODEL_PATH defaults to the .keras model (or its
+# .tflite/.onnx sibling); INFERENCE_THREADS=0 leaves the runtime's default.
+INFERENCE_BACKEND = os.environ.get("QUICKDRAW_INFERENCE_BACKEND", "keras").lower()
+MODEL_PATH = os.environ.get("QUICKDRAW_MODEL_PATH") or None
+INFERENCE_THREADS = _env_int("QUICKDRAW_INFERENCE_THREADS", 0) or None
+
+# Thread tuning: OPENCV_THREADS sets cv2.setNumThreads (unset = OpenCV's
+# default, one thread per core) and CPU_AFFINITY pins the process to a CPU
+# list like "0-3". With THREAD_CALIBRATION=1 the model / OpenCV thread counts
+# are measured at startup (THREAD_CALIBRATION_SECONDS of load per candidate,
+# in subprocesses) and the best throughput within THREAD_TARGET_P99_MS wins;
+# see app/tuning.py. The outcome is reported by /api/model-info.
+OPENCV_THREADS = int(os.environ["QUICKDRAW_OPENCV_THREADS"]) if os.environ.get("QUICKDRAW_OPENCV_THREADS") else None
+CPU_AFFINITY = os.environ.get("QUICKDRAW_CPU_AFFINITY", "")
+THREAD_CALIBRATION = os.environ.get("QUICKDRAW_THREAD_CALIBRATION", "0").lower() in ("1", "true", "yes", "on")
+THREAD_TARGET_P99_MS = _env_float("QUICKDRAW_THREAD_TARGET_P99_MS", 100)
+THREAD_CALIBRATION_SECONDS = _env_float("QUICKDRAW_THREAD_CALIBRATION_SECONDS", 3)
+
+# Preprocessing: "hybrid" paints a 400x400 canvas and runs the OpenCV
+# medianBlur/GaussianBlur/OTSU/contour-crop chain; "fast" rasterizes the
+# strokes straight into 64x64 from their own bounding box. Validate a switch
+# with benchmarks/validate_fast_preprocessing.py.
+PREPROCESSING = os.environ.get("QUICKDRAW_PREPROCESSING", "hybrid").lower()
+
+# Logging: per-request details are logged at DEBUG, which is off by default.
+# Set QUICKDRAW_LOG_LEVEL=DEBUG to trace every recognition request.
+LOG_LEVEL = os.environ.get("QUICKDRAW_LOG_LEVEL", "INFO").upper()
+
+# Bulk scoring (/api/recognize-drawings/batch): NDJSON drawings are
+# preprocessed on BULK_WORKERS threads and scored BULK_BATCH_SIZE at a time
+# (a request may ask for up to BULK_MAX_BATCH_SIZE with ?batch_size=); the
+# forward passes go through the micro-batcher under inference admission.
+BULK_BATCH_SIZE = _env_int("QUICKDRAW_BULK_BATCH_SIZE", 128)
+BULK_MAX_BATCH_SIZE = _env_int("QUICKDRAW_BULK_MAX_BATCH_SIZE", 512)
+BULK_WORKERS = _env_int("QUICKDRAW_BULK_WORKERS", min(4, os.cpu_count() or 1))
+
+# Ink gating for session / WebSocket polls: once a drawing has a prediction,
+# a new inference only runs after GATE_MIN_INK_LENGTH canvas pixels of new
+# stroke, GATE_MIN_NEW_STROKES finished strokes (0 = ignore) or a bounding box
+# change of GATE_MIN_BBOX_CHANGE (fraction of its size); otherwise the previous
+# result is returned with "gated": true. Off unless QUICKDRAW_GATING=1.
+GATING_ENABLED = os.environ.get("QUICKDRAW_GATING", "0").lower() in ("1", "true", "yes", "on")
+GATE_MIN_INK_LENGTH = _env_float("QUICKDRAW_GATE_MIN_INK_LENGTH", 40)
+GATE_MIN_NEW_STROKES = _env_int("QUICKDRAW_GATE_MIN_NEW_STROKES", 1)
+GATE_MIN_BBOX_CHANGE = _env_float("QUICKDRAW_GATE_MIN_BBOX_CHANGE", 0.1)
+
+# Game rounds: the server picks the target and decides the win. A round lasts
+# ROUND_DURATION_SECONDS from its start (plus ROUND_GRACE_SECONDS for the final
+# drawing to arrive) and allows ROUND_MAX_INFERENCES forward passes
+# (0 = unlimited). Rounds are kept for ROUND_TTL_SECONDS after they are
+# created, at most ROUND_MAX_ACTIVE at a time (oldest evicted first).
+ROUND_DURATION_SECONDS = _env_float("QUICKDRAW_ROUND_DURATION_SECONDS", 30)
+ROUND_GRACE_SECONDS = _env_float("QUICKDRAW_ROUND_GRACE_SECONDS", 3)
+ROUND_MAX_INFERENCES = _env_int("QUICKDRAW_ROUND_MAX_INFERENCES", 200)
+ROUND_TTL_SECONDS = _env_float("QUICKDRAW_ROUND_TTL_SECONDS", 600)
+ROUND_MAX_ACTIVE = _env_int("QUICKDRAW_ROUND_MAX_ACTIVE", 10000)
+
+# Rate limiting: every client (by address; by the first X-Forwarded-For entry
+# with RATE_LIMIT_TRUST_PROXY=1) gets a token bucket of RATE_LIMIT_INFERENCE_BURST
+# requests refilled at RATE_LIMIT_INFERENCE_RATE per second for the recognition
+# routes, and a looser one for everything else. Excess requests get 429 with
+# Retry-After. Inference requests of a drawing session or game round (round_id
+# query parameter) also take a token from a bucket of that session / round
+# (RATE_LIMIT_SESSION_RATE / _BURST). QUICKDRAW_RATE_LIMIT=0 disables it.
+RATE_LIMIT_ENABLED = os.environ.get("QUICKDRAW_RATE_LIMIT", "1").lower() in ("1", "true", "yes", "on")
+RATE_LIMIT_INFERENCE_RATE = _env_float("QUICKDRAW_RATE_LIMIT_INFERENCE_RATE", 10)
+RATE_LIMIT_INFERENCE_BURST = _env_int("QUICKDRAW_RATE_LIMIT_INFERENCE_BURST", 20)
+RATE_LIMIT_DEFAULT_RATE = _env_float("QUICKDRAW_RATE_LIMIT_DEFAULT_RATE", 50)
+RATE_LIMIT_DEFAULT_BURST = _env_int("QUICKDRAW_RATE_LIMIT_DEFAULT_BURST", 100)
+RATE_LIMIT_SESSION_RATE = _env_float("QUICKDRAW_RATE_LIMIT_SESSION_RATE", 5)
+RATE_LIMIT_SESSION_BURST = _env_int("QUICKDRAW_RATE_LIMIT_SESSION_BURST", 10)
+RATE_LIMIT_MAX_CLIENTS = _env_int("QUICKDRAW_RATE_LIMIT_MAX_CLIENTS", 10000)
+RATE_LIMIT_TRUST_PROXY = os.environ.get("QUICKDRAW_RATE_LIMIT_TRUST_PROXY", "0").lower() in ("1", "true", "yes", "on")
+
+# Test-time augmentation: score TTA_VARIANTS views of every drawing (shifts,
+# zooms, stroke width, padded crop; see app/models/tta.py) in one batched
+# forward pass and average them. Requests fall back to a single pass while
+# forward passes take longer than TTA_LATENCY_BUDGET_MS or the batcher has a
+# backlog. Costs len(TTA_VARIANTS)x model compute; off unless QUICKDRAW_TTA=1.
+TTA_ENABLED = os.environ.get("QUICKDRAW_TTA", "0").lower() in ("1", "true", "yes", "on")
+TTA_VARIANTS = [name.strip() for name in os.environ.get(
+    "QUICKDRAW_TTA_VARIANTS", "identity,shift_left,shift_right,zoom_in,zoom_out,thicker,thinner,padded"
+).split(",") if name.strip()]
+TTA_LATENCY_BUDGET_MS = _env_float("QUICKDRAW_TTA_LATENCY_BUDGET_MS", 50)
+
+# Model administration: with QUICKDRAW_ADMIN_TOKEN set, /api/admin/models can
+# load a new model version in the background and swap it in, or route a
+# percentage of the requests to it as a candidate (send the token in the
+# X-Admin-Token header). Unset, the admin routes answer 403.
+ADMIN_TOKEN = os.environ.get("QUICKDRAW_ADMIN_TOKEN", "")
+
+# HTTP caching: /api/model-info is cached by clients for MODEL_INFO_MAX_AGE
+# seconds (then revalidated with its ETag). The frontend is served from
+# FRONTEND_DIST_DIR when `python -m app.static_build` has been run (hashed,
+# precompressed assets cached for STATIC_MAX_AGE seconds), else from the
+# frontend/ sources.
+MODEL_INFO_MAX_AGE = _env_int("QUICKDRAW_MODEL_INFO_MAX_AGE", 60)
+FRONTEND_DIST_DIR = os.environ.get(
+    "QUICKDRAW_FRONTEND_DIST_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend", "dist")
+)
+STATIC_MAX_AGE = _env_int("QUICKDRAW_STATIC_MAX_AGE", 31536000)
+
+# Drawing capture: the final drawing of every game round (the winning one, or
+# the last one scored before the round closed or expired) is appended with its
+# target, prediction and probabilities to segment files in CAPTURE_DIR, for
+# benchmark replay (benchmarks/bench_recognition.py --capture) and retraining
+# (model_training/render_capture.py). Segments are rotated after
+# CAPTURE_SEGMENT_MB and the oldest deleted beyond CAPTURE_MAX_SEGMENTS
+# (0 = keep all). At most CAPTURE_QUEUE_SIZE drawings wait for the writer
+# thread; more are dropped. Off unless QUICKDRAW_CAPTURE=1.
+CAPTURE_ENABLED = os.environ.get("QUICKDRAW_CAPTURE", "0").lower() in ("1", "true", "yes", "on")
+CAPTURE_DIR = os.environ.get(
+    "QUICKDRAW_CAPTURE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "captures")
+)
+CAPTURE_SEGMENT_MB = _env_float("QUICKDRAW_CAPTURE_SEGMENT_MB", 64)
+CAPTURE_MAX_SEGMENTS = _env_int("QUICKDRAW_CAPTURE_MAX_SEGMENTS", 0)
+CAPTURE_QUEUE_SIZE = _env_int("QUICKDRAW_CAPTURE_QUEUE_SIZE", 1024)
@@ -1,16 +1,93 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from app.routes.drawing import router as drawing_router
+from app.routes.admin import router as admin_router
+from app.models.executor import configure_inference_executor
+from app.models.batching import configure_batcher
+from app.models.bulk import configure_bulk
+from app.models.sessions import configure_ink_gate, configure_stroke_sessions
+from app.models.rounds import configure_rounds, game_rounds
+from app.models.tta import configure_tta, test_time_augmentation
+from app.models.capture import capture_log, configure_capture
+from app.models.registry import model_registry
+from app.models.drawing_model import (
+    configure_prediction_cache, configure_preprocessing, initialize_model, is_model_ready, model_status,
+    prediction_cache
+)
+from app.models.batching import inference_batcher
+from app.models.executor import inference_executor
+from app.models.sessions import ink_gate, stroke_sessions
+from app.ratelimit import configure_rate_limiter, rate_limiter
+from app.tuning import thread_tuning
+from app.static import PrecompressedStaticFiles
+from app.metrics import REQUEST_SECONDS, PROMETHEUS_CONTENT_TYPE, register_stats, render_prometheus
+from app import config
+import asyncio
+import logging
 import os
+import time
+
+# Log through the "app" logger hierarchy; per-request details are DEBUG and off by default
+app_logger = logging.getLogger("app")
+app_logger.setLevel(config.LOG_LEVEL)
+if not app_logger.handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    app_logger.addHandler(log_handler)
+    app_logger.propagate = False
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load + warm up the model in the background: /health and static files are
+    # served right away, /ready turns 200 once the first forward passes are traced
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, start_model)
+    yield
+    # Capture the drawings of the rounds still open, then complete the last segment
+    game_rounds.finish_all()
+    await loop.run_in_executor(None, capture_log.close)
+
+def start_model():
+    """Settle the thread settings (calibrating them if configured), then load and warm up the model"""
+    num_threads = thread_tuning.configure(
+        model_threads=config.INFERENCE_THREADS,
+        opencv_threads=config.OPENCV_THREADS,
+        calibrate=config.THREAD_CALIBRATION,
+        backend_name=config.INFERENCE_BACKEND,
+        path=config.MODEL_PATH,
+        target_p99_ms=config.THREAD_TARGET_P99_MS,
+        duration=config.THREAD_CALIBRATION_SECONDS,
+        concurrency=config.INFERENCE_WORKERS,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        preprocessing=config.PREPROCESSING
+    )
+    warm_up_batch_sizes = (1, config.BATCH_MAX_SIZE) + ((len(config.TTA_VARIANTS),) if config.TTA_ENABLED else ())
+    return initialize_model(warm_up_batch_sizes, config.INFERENCE_BACKEND, config.MODEL_PATH, num_threads)
 
 # Create FastAPI app
 app = FastAPI(
     title="QuickDraw 15-Class API",
     description="AI-powered drawing recognition for 15 QuickDraw classes",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+# Per-client token buckets; registered before CORS so 429 responses still carry the CORS headers
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    retry_after = rate_limiter.check(request)
+    if retry_after:
+        logger.debug("🚦 Rate limited %s %s", rate_limiter.client_key(request), request.url.path)
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(retry_after)},
+            content={"error": "Too many requests, please slow down"}
+        )
+    return await call_next(request)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -20,29 +97,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pin the process before the executor and model threads start (they inherit the CPU mask)
+thread_tuning.pin(config.CPU_AFFINITY)
+
+# Configure the inference pipeline: bounded CPU pool with 503 backpressure + micro-batching
+configure_inference_executor(
+    max_workers=config.INFERENCE_WORKERS,
+    max_queue=config.INFERENCE_QUEUE_SIZE
+)
+configure_batcher(
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS
+)
+configure_prediction_cache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    ttl_seconds=config.CACHE_TTL_SECONDS
+)
+configure_stroke_sessions(
+    ttl_seconds=config.SESSION_TTL_SECONDS,
+    max_memory_mb=config.SESSION_MAX_MEMORY_MB,
+    max_points=config.SESSION_MAX_POINTS
+)
+configure_ink_gate(
+    enabled=config.GATING_ENABLED,
+    min_ink_length=config.GATE_MIN_INK_LENGTH,
+    min_new_strokes=config.GATE_MIN_NEW_STROKES,
+    min_bbox_change=config.GATE_MIN_BBOX_CHANGE
+)
+configure_preprocessing(config.PREPROCESSING)
+configure_tta(
+    enabled=config.TTA_ENABLED,
+    variants=config.TTA_VARIANTS,
+    latency_budget_ms=config.TTA_LATENCY_BUDGET_MS
+)
+configure_bulk(workers=config.BULK_WORKERS)
+configure_rounds(
+    duration_seconds=config.ROUND_DURATION_SECONDS,
+    grace_seconds=config.ROUND_GRACE_SECONDS,
+    max_inferences=config.ROUND_MAX_INFERENCES,
+    ttl_seconds=config.ROUND_TTL_SECONDS,
+    max_rounds=config.ROUND_MAX_ACTIVE
+)
+configure_capture(
+    enabled=config.CAPTURE_ENABLED,
+    directory=config.CAPTURE_DIR,
+    segment_max_bytes=int(config.CAPTURE_SEGMENT_MB * 1024 * 1024),
+    max_segments=config.CAPTURE_MAX_SEGMENTS,
+    queue_size=config.CAPTURE_QUEUE_SIZE
+)
+configure_rate_limiter(
+    enabled=config.RATE_LIMIT_ENABLED,
+    inference_rate=config.RATE_LIMIT_INFERENCE_RATE,
+    inference_burst=config.RATE_LIMIT_INFERENCE_BURST,
+    default_rate=config.RATE_LIMIT_DEFAULT_RATE,
+    default_burst=config.RATE_LIMIT_DEFAULT_BURST,
+    max_clients=config.RATE_LIMIT_MAX_CLIENTS,
+    trust_proxy=config.RATE_LIMIT_TRUST_PROXY,
+    session_rate=config.RATE_LIMIT_SESSION_RATE,
+    session_burst=config.RATE_LIMIT_SESSION_BURST
+)
+
+# Export the pipeline's stats() as gauges on /metrics
+register_stats("executor", inference_executor.stats)
+register_stats("batching", inference_batcher.stats)
+register_stats("cache", prediction_cache.stats)
+register_stats("sessions", stroke_sessions.stats)
+register_stats("gating", ink_gate.stats)
+register_stats("tta", test_time_augmentation.stats)
+register_stats("rounds", game_rounds.stats)
+register_stats("capture", capture_log.stats)
+register_stats("ratelimit", rate_limiter.stats)
+register_stats("models", model_registry.summary)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/api/drawing-sessions/{session_id}/points), not by raw path
+    route = request.scope.get("route")
+    if route is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, request.method, getattr(route, "path", "other"), response.status_code
+        )
+    return response
+
 # Include drawing-related routes
 app.include_router(drawing_router)
+app.include_router(admin_router)
 
 # Serve static files (frontend)
 # Navigate from backend/app/ up to project root, then to frontend/
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 frontend_path = os.path.join(PROJECT_ROOT, "frontend")
 
-print(f"🔍 Checking frontend path: {frontend_path}")
-print(f"📁 Frontend path exists: {os.path.exists(frontend_path)}")
+logger.debug("🔍 Checking frontend path: %s", frontend_path)
 
-if os.path.exists(frontend_path):
-    app.mount("/static", StaticFiles(directory=frontend_path), name="static")
-    print(f"✅ Static files mounted from: {frontend_path}")
+if os.path.isfile(os.path.join(config.FRONTEND_DIST_DIR, "index.html")):
+    # Production build (python -m app.static_build): hashed, precompressed assets
+    app.mount("/static", PrecompressedStaticFiles(directory=config.FRONTEND_DIST_DIR, max_age=config.STATIC_MAX_AGE),
+              name="static")
+    logger.info("✅ Static files mounted from build: %s", config.FRONTEND_DIST_DIR)
+elif os.path.exists(frontend_path):
+    app.mount("/static", PrecompressedStaticFiles(directory=frontend_path), name="static")
+    logger.info("✅ Static files mounted from: %s", frontend_path)
 else:
-    print(f"❌ Frontend directory not found at: {frontend_path}")
+    logger.error("❌ Frontend directory not found at: %s", frontend_path)
     # List available directories for debugging
     parent_dir = os.path.dirname(frontend_path)
     if os.path.exists(parent_dir):
-        print(f"📋 Available directories in {parent_dir}:")
-        for item in os.listdir(parent_dir):
-            if os.path.isdir(os.path.join(parent_dir, item)):
-                print(f"   📂 {item}")
+        logger.error("📋 Available directories in %s: %s", parent_dir,
+                     [item for item in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, item))])
 
 @app.get("/")
 async def root():
@@ -65,8 +229,19 @@ async def serve_game():
 async def health():
     return {"status": "healthy", "service": "QuickDraw 15-Class API"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 until then"""
+    content = {"ready": is_model_ready(), **model_status}
+    return JSONResponse(status_code=200 if content["ready"] else 503, content=content)
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage latency histograms and pipeline gauges in the Prometheus text format"""
+    return Response(content=render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.serve import main
+    main()
 
-# To run: uvicorn app.main:app --reload
\ No newline at end of file
+# To run: uvicorn app.main:app --reload (development) or python -m app.serve --workers N
\ No newline at end of file
@@ -0,0 +1,147 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus-style metrics for the recognition hot path.
+# Histograms are rendered in the text exposition format on /metrics; the
+# stats() dicts of the executor, batcher, cache and session store are
+# exported as gauges next to them. No client library needed.
+
+# Seconds; the pipeline stages range from ~50us (parsing) to ~100ms (forward pass under load)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    """Thread-safe histogram with a fixed set of label names"""
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def remove(self, *label_values):
+        """Drop a label set's series, e.g. of a model version that is no longer served"""
+        with self._lock:
+            self._series.pop(label_values, None)
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+_metrics = []
+_stats_sources = []
+
+
+def histogram(name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+    """Create and register a histogram"""
+    metric = Histogram(name, description, label_names, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_stats(prefix, stats_fn):
+    """
+    Export a component's stats() dict as gauges
+
+    Numeric values become quickdraw_<prefix>_<key> (keys ending in _total are
+    rendered as counters); nested {label: number} dicts such as the batch size
+    histogram become one series per entry with a "key" label.
+    """
+    _stats_sources.append((prefix, stats_fn))
+
+
+def _render_stats(prefix, stats):
+    lines = []
+    for key, value in stats.items():
+        name = f"quickdraw_{prefix}_{key}"
+        kind = "counter" if key.endswith("_total") else "gauge"
+        if isinstance(value, dict):
+            series = [(f'{{key="{label}"}}', number) for label, number in value.items()
+                      if isinstance(number, (int, float))]
+        elif isinstance(value, (int, float)):
+            series = [("", value)]
+        else:
+            continue
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{labels} {_format_value(number)}" for labels, number in series)
+    return lines
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, stats_fn in _stats_sources:
+        lines.extend(_render_stats(prefix, stats_fn()))
+    return "\n".join(lines) + "\n"
+
+
+# Starlette appends "; charset=utf-8" to text/* media types
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Hot-path stages: request_parse, stroke_split, rasterize, median_blur,
+# gaussian_blur, otsu_threshold, contour_crop, resize, fast_rasterize (fast
+# preprocessing mode), model_forward, response_build
+STAGE_SECONDS = histogram(
+    "quickdraw_stage_seconds", "Time spent in each recognition pipeline stage", ("stage",)
+)
+REQUEST_SECONDS = histogram(
+    "quickdraw_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+MODEL_BATCH_SIZE = histogram(
+    "quickdraw_model_batch_size", "Drawings per model forward pass", (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+def stage_timer(stage):
+    """Context manager timing one pipeline stage into quickdraw_stage_seconds"""
+    return STAGE_SECONDS.time(stage)
@@ -0,0 +1,231 @@
+import importlib
+import os
+import threading
+
+import numpy as np
+
+
+class InferenceBackend:
+    """
+    Common interface of the model runtimes the server can use
+
+    Every backend takes a float32 (N, H, W, 1) batch in [0, 1] and returns
+    (N, num_classes) probabilities, so the rest of the pipeline doesn't care
+    which runtime is behind it.
+    """
+
+    name = "base"
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def input_shape(self):
+        """Model input shape as (None, H, W, C), like tf.keras Model.input_shape"""
+        raise NotImplementedError
+
+    def predict(self, images):
+        raise NotImplementedError
+
+    def count_params(self):
+        """Number of model parameters, or None if the runtime doesn't expose it"""
+        return None
+
+
+class KerasBackend(InferenceBackend):
+    """Full tf.keras model - the reference implementation"""
+
+    name = "keras"
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path)
+        import tensorflow as tf  # Deferred: only this backend needs TensorFlow
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError:
+                # TensorFlow already ran an op in this process; its thread pools are fixed now
+                pass
+        self._model = tf.keras.models.load_model(path)
+
+    @property
+    def input_shape(self):
+        return tuple(self._model.input_shape)
+
+    def predict(self, images):
+        # predict_on_batch skips the tf.data/callback machinery model.predict sets up on
+        # every call, which dominates the cost of the small batches we serve
+        return np.asarray(self._model.predict_on_batch(images))
+
+    def count_params(self):
+        return self._model.count_params()
+
+
+def _load_tflite_interpreter():
+    """Find a TFLite interpreter, preferring the standalone runtimes over full TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TFLite flatbuffer (float or int8-quantized) served with ai-edge-litert / tflite-runtime
+
+    The interpreter memory-maps the model file, and the batch dimension is
+    resized on demand so micro-batches still run as one invocation.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path)
+        Interpreter = _load_tflite_interpreter()
+        self._interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # An interpreter must not be invoked from two threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(dim) for dim in self._input["shape"][1:])
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + [int(dim) for dim in self._input["shape"][1:]]
+            self._interpreter.resize_tensor_input(self._input["index"], shape)
+            self._interpreter.allocate_tensors()
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        with self._lock:
+            self._resize(len(images))
+
+            # Fully-quantized models take int8/uint8 input
+            scale, zero_point = self._input["quantization"]
+            if self._input["dtype"] != np.float32 and scale:
+                images = np.round(images / scale + zero_point).astype(self._input["dtype"])
+
+            self._interpreter.set_tensor(self._input["index"], images)
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output["index"])
+
+            scale, zero_point = self._output["quantization"]
+            if self._output["dtype"] != np.float32 and scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            return np.array(output, dtype=np.float32)
+
+    def count_params(self):
+        return None
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX model (float or int8-quantized) served with ONNX Runtime on CPU"""
+
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0]
+
+    @property
+    def input_shape(self):
+        # Symbolic dims (e.g. the batch dimension) come back as strings
+        return tuple(dim if isinstance(dim, int) else None for dim in self._input.shape)
+
+    def predict(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        return np.asarray(self._session.run(None, {self._input.name: images})[0], dtype=np.float32)
+
+    def count_params(self):
+        return None
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend
+}
+
+# File extension each backend is exported with by model_training/export_model.py
+BACKEND_EXTENSIONS = {
+    "keras": ".keras",
+    "tflite": ".tflite",
+    "onnx": ".onnx"
+}
+
+
+def default_backend_path(keras_path, backend_name, quantize="none"):
+    """
+    Path the exported model for backend_name is expected at, next to the .keras file
+
+    Same naming as model_training/export_model.py: quantized exports get a
+    "_dynamic" / "_int8" suffix. The server only resolves the float export by
+    default; a quantized one is selected with QUICKDRAW_MODEL_PATH.
+    """
+    suffix = "" if quantize == "none" or backend_name == "keras" else f"_{quantize}"
+    return os.path.splitext(keras_path)[0] + suffix + BACKEND_EXTENSIONS[backend_name]
+
+
+def create_backend(backend_name, path, num_threads=None):
+    """
+    Load a model with the requested runtime
+
+    Args:
+        backend_name: One of BACKENDS ("keras", "tflite", "onnx")
+        path: Model file for that runtime
+        num_threads: CPU threads for the runtime (None = runtime default)
+
+    Returns:
+        InferenceBackend
+
+    Raises:
+        ValueError: If backend_name is unknown
+    """
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend_name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend_name](path, num_threads=num_threads)
+
+
+def preload_runtime(backend_name):
+    """
+    Import a backend's runtime library without loading a model, e.g. before forking workers
+
+    TensorFlow (the keras backend, or the TFLite fallback) is never imported
+    here: it is not fork-safe once initialized.
+
+    Returns:
+        bool: True if the runtime was imported
+    """
+    modules = {"tflite": ("ai_edge_litert.interpreter", "tflite_runtime.interpreter"), "onnx": ("onnxruntime",)}
+    for module in modules.get(backend_name, ()):
+        try:
+            importlib.import_module(module)
+            return True
+        except ImportError:
+            pass
+    return False
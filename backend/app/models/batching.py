@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.models.drawing_model import (
+    prepare_model_input, prepare_model_input_from_arrays, predict_batch, build_prediction_result,
+    image_fingerprint, prediction_cache, check_model_available, ModelNotReadyError
+)
+from app.models.registry import model_registry
+from app.models.executor import inference_executor, InferenceQueueFullError
+from app.models.sessions import ink_gate
+from app.models.tta import average_probabilities, make_variants, test_time_augmentation
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler for model inference
+
+    Concurrent callers submit one preprocessed (1, H, W, 1) image each (or a
+    (K, H, W, 1) stack, e.g. the test-time augmentation views of a drawing). A
+    single worker task gathers them into batches of up to max_batch_size images,
+    waiting at most max_wait_ms after the first request of a batch arrives, runs
+    one batched forward pass and hands every caller back its own rows of
+    probabilities. Requests routed to different model versions (see
+    app.models.registry) share the batch window but get one forward pass per
+    version.
+    While a forward pass is running new requests keep queueing, so batches grow
+    naturally with load.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._pending = deque()
+        self._pending_rows = 0
+        self._wakeup = None
+        self._worker = None
+        self._loop = None
+        # One forward pass at a time - the batch itself is the parallelism
+        self._model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quickdraw-batcher")
+
+        # Tuning metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.batched_images_total = 0
+        self.max_queue_depth = 0
+        self.batch_size_counts = {}
+        self.last_batch_ms = 0.0
+        self.average_batch_ms = 0.0
+
+    @property
+    def queued_images(self):
+        return self._pending_rows
+
+    def configure(self, max_batch_size=None, max_wait_ms=None):
+        """Update batching limits; applies from the next batch on"""
+        if max_batch_size is not None:
+            self.max_batch_size = max(1, int(max_batch_size))
+        if max_wait_ms is not None:
+            self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, image, version=None):
+        """
+        Queue one preprocessed image and wait for its probabilities
+
+        Args:
+            image: np.array of shape (1, H, W, 1), or (K, H, W, 1) for K images scored together
+            version: ModelVersion to score it with, passed on to predict_fn (None = the active one)
+
+        Returns:
+            np.array: (num_classes,) class probabilities for one image, (K, num_classes) for K
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._pending.append((image, version, future))
+        self._pending_rows += len(image)
+        self.requests_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Give concurrent callers up to max_wait_ms to join this batch
+            deadline = loop.time() + self.max_wait_ms / 1000.0
+            while self._pending_rows < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch, rows = [], 0
+            # A stack larger than max_batch_size still runs, as a batch of its own
+            while self._pending and (not batch or rows + len(self._pending[0][0]) <= self.max_batch_size):
+                image, version, future = self._pending.popleft()
+                self._pending_rows -= len(image)
+                # Skip callers that went away (e.g. client disconnected) while queued
+                if not future.cancelled():
+                    batch.append((image, version, future))
+                    rows += len(image)
+
+            # One forward pass per model version (normally there is just one)
+            versions = {}
+            for image, version, future in batch:
+                versions.setdefault(id(version), []).append((image, version, future))
+            for version_batch in versions.values():
+                await self._run_batch(loop, version_batch)
+
+    async def _run_batch(self, loop, batch):
+        images = np.concatenate([image for image, _, _ in batch], axis=0)
+        version = batch[0][1]
+        started = time.perf_counter()
+        try:
+            if version is None:
+                probabilities = await loop.run_in_executor(self._model_thread, self.predict_fn, images)
+            else:
+                probabilities = await loop.run_in_executor(self._model_thread, self.predict_fn, images, version)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.last_batch_ms = (time.perf_counter() - started) * 1000.0
+            # Smoothed forward pass time, e.g. for the test-time augmentation latency budget
+            self.average_batch_ms += 0.2 * (self.last_batch_ms - self.average_batch_ms)
+
+        self.batches_total += 1
+        self.batched_images_total += len(images)
+        self.batch_size_counts[len(images)] = self.batch_size_counts.get(len(images), 0) + 1
+
+        offset = 0
+        for image, _, future in batch:
+            rows = probabilities[offset] if len(image) == 1 else probabilities[offset:offset + len(image)]
+            offset += len(image)
+            if not future.done():
+                future.set_result(rows)
+
+    def stats(self):
+        """Queue depth and batch size metrics for tuning max_batch_size / max_wait_ms"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": len(self._pending),
+            "queued_images": self._pending_rows,
+            "max_queue_depth": self.max_queue_depth,
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "average_batch_size": (self.batched_images_total / self.batches_total) if self.batches_total else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_size_counts.items())},
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "average_batch_ms": round(self.average_batch_ms, 3)
+        }
+
+
+# Shared scheduler used by the recognition routes, configured from main.py
+inference_batcher = MicroBatcher(predict_batch)
+
+
+def configure_batcher(max_batch_size=None, max_wait_ms=None):
+    """Configure the shared micro-batching scheduler (call once at startup)"""
+    inference_batcher.configure(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+def _prepare_views(prepare_fn, args, variants):
+    processed_image = prepare_fn(*args)
+    return None if processed_image is None else make_variants(processed_image, variants)
+
+
+async def run_batched_prediction(prepare_fn, *args, point_count=0, claim=None, release=None):
+    """
+    Preprocess on the inference executor, then share the forward pass with concurrent callers
+
+    With test-time augmentation enabled and the pipeline within its latency
+    budget, the augmented views of the drawing go through the forward pass
+    together and their probabilities are averaged.
+
+    Args:
+        prepare_fn: Blocking function returning a (1, H, W, 1) model input (or None)
+        *args: Arguments for prepare_fn
+        point_count: Number of drawing points behind the prediction (used for logging)
+        claim: Called once the request is admitted and missed the prediction cache, right
+            before the forward pass, e.g. to count it against a game round; its exceptions propagate
+        release: Called to give the claim back if the forward pass fails
+
+    Returns:
+        dict: Prediction results with confidence scores (same shape as predict_drawing)
+
+    Raises:
+        InferenceQueueFullError: If the inference pipeline is saturated
+        ModelNotReadyError: If the model is still loading
+    """
+    if not check_model_available():
+        return {"error": "Model not loaded", "prediction": "unknown", "confidence": 0.0}
+
+    claim_error = None
+    try:
+        async with inference_executor.admission():
+            # Preprocessing is CPU-bound, keep it off the event loop
+            if test_time_augmentation.should_augment(
+                    inference_batcher.queued_images, inference_batcher.max_batch_size,
+                    inference_batcher.average_batch_ms):
+                processed_image = await inference_executor.run(
+                    _prepare_views, prepare_fn, args, test_time_augmentation.variants
+                )
+            else:
+                processed_image = await inference_executor.run(prepare_fn, *args)
+
+            if processed_image is None:
+                return {"error": "Failed to process drawing", "prediction": "unknown", "confidence": 0.0}
+
+            # Identical model inputs give identical predictions (per model version) - skip the batcher on a hit
+            version = model_registry.choose()
+            cache_key = image_fingerprint(processed_image, version.version)
+            probabilities = prediction_cache.get(cache_key)
+            if probabilities is None:
+                if claim is not None:
+                    try:
+                        claim()
+                    except Exception as e:
+                        claim_error = e
+                        raise
+                try:
+                    probabilities = await inference_batcher.submit(processed_image, version)
+                except Exception:
+                    if release is not None:
+                        release()
+                    raise
+                if len(processed_image) > 1:
+                    probabilities = average_probabilities(probabilities)
+                prediction_cache.put(cache_key, probabilities)
+            version.record_confidence(float(np.max(probabilities)))
+            return build_prediction_result(probabilities, point_count)
+
+    except (InferenceQueueFullError, ModelNotReadyError):
+        raise
+    except Exception as e:
+        if e is claim_error:
+            raise
+        logger.exception("❌ Error in batched prediction: %s", e)
+        return {"error": str(e), "prediction": "unknown", "confidence": 0.0}
+
+
+async def predict_drawing_batched(drawing_data, claim=None, release=None):
+    """
+    Async counterpart of predict_drawing that shares the forward pass with concurrent callers
+
+    Args:
+        drawing_data: List of coordinates [{x: int, y: int}]
+        claim, release: See run_batched_prediction
+
+    Returns:
+        dict: Prediction results with confidence scores (same shape as predict_drawing)
+    """
+    return await run_batched_prediction(
+        prepare_model_input, drawing_data, point_count=len(drawing_data), claim=claim, release=release
+    )
+
+
+async def predict_strokes_batched(points, stroke_offsets, claim=None, release=None):
+    """
+    predict_drawing_batched for the compact format
+
+    Args:
+        points: (N, 2) array of canvas coordinates
+        stroke_offsets: Index of the first point of every stroke
+        claim, release: See run_batched_prediction
+
+    Returns:
+        dict: Prediction results with confidence scores (same shape as predict_drawing)
+    """
+    return await run_batched_prediction(
+        prepare_model_input_from_arrays, points, stroke_offsets,
+        point_count=len(points), claim=claim, release=release
+    )
+
+
+async def predict_session_batched(session, new_points, claim=None, release=None):
+    """
+    Add new points to a StrokeSession and predict on its accumulated canvas
+
+    Args:
+        session: StrokeSession holding the drawing so far
+        new_points: List of coordinates [{x: int, y: int}] added since the last call
+        claim, release: See run_batched_prediction; gated calls and prediction cache
+            hits don't claim
+
+    Returns:
+        dict: Prediction results with confidence scores (same shape as predict_drawing);
+        "gated": True if the ink gate skipped inference and returned the previous result.
+        With the gate on, a pass refused as busy also returns the previous result,
+        with "retry_after" (the new points are on the canvas already and must not be
+        sent again; the next call evaluates them)
+
+    Raises:
+        InferenceQueueFullError, ModelNotReadyError: Busy before the points were added
+    """
+    if ink_gate.enabled and session.last_result is not None:
+        # Drawing the new segments is cheap; preprocessing + inference is what the gate may skip
+        async with inference_executor.admission():
+            await inference_executor.run(session.add_points, new_points)
+        if not ink_gate.should_evaluate(session):
+            return {**session.last_result, "gated": True}
+        try:
+            result = await run_batched_prediction(
+                session.render_model_input, [], point_count=session.point_count, claim=claim, release=release
+            )
+        except (InferenceQueueFullError, ModelNotReadyError) as e:
+            # The ink counters are only reset by mark_evaluated, so the next call re-evaluates
+            return {**session.last_result, "gated": True, "retry_after": e.retry_after}
+        if "error" not in result:
+            session.mark_evaluated(result)
+        return result
+    if not ink_gate.should_evaluate(session):
+        return {**session.last_result, "gated": True}
+
+    result = await run_batched_prediction(
+        session.render_model_input, new_points,
+        point_count=session.point_count + len(new_points), claim=claim, release=release
+    )
+    if "error" not in result:
+        session.mark_evaluated(result)
+    return result
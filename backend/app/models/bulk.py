@@ -0,0 +1,172 @@
+import asyncio
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from app.models.batching import inference_batcher
+from app.models.drawing_model import CLASS_LABELS, prepare_model_input, prepare_model_input_from_arrays
+from app.models.executor import inference_executor, InferenceQueueFullError
+from app.models.stroke_codec import decode_compact_json
+
+# Bulk scoring for /api/recognize-drawings/batch
+#
+# Request and response are NDJSON, one drawing per line:
+#   in:  {"id": "a1", "drawing": [{"x": 10, "y": 20}, ...]}
+#        {"id": "a2", "points": [x0, y0, ...], "stroke_offsets": [0, 17]}
+#   out: {"index": 0, "id": "a1", "prediction": "apple", "confidence": 0.93, "top_predictions": {...}}
+#        {"index": 1, "id": "a2", "error": "..."}
+#
+# The request body is spooled to a temporary file (memory above SPOOL_MAX_BYTES
+# goes to disk) and read back line by line while results stream out, so neither
+# side is ever held in memory as a whole. The forward passes go through the
+# shared micro-batcher like interactive requests, at most one batcher-sized
+# chunk at a time and only once admitted by the inference executor: while the
+# pipeline is saturated bulk jobs back off instead of queueing ahead of the
+# game.
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Preprocessing threads shared by all bulk requests, created on first use
+_bulk_executor = None
+_bulk_workers = 2
+
+
+def configure_bulk(workers=None):
+    """Set the number of bulk preprocessing threads (call once at startup)"""
+    global _bulk_workers
+    if workers is not None:
+        _bulk_workers = max(1, int(workers))
+
+
+def _get_bulk_executor():
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = ThreadPoolExecutor(max_workers=_bulk_workers, thread_name_prefix="quickdraw-bulk")
+    return _bulk_executor
+
+
+async def spool_request_body(request):
+    """Copy a (possibly huge) request body into a SpooledTemporaryFile and rewind it"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def read_records(lines):
+    """Yield (index, record) for every non-empty NDJSON line; record is the error message for bad lines"""
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            record = f"Invalid JSON line: {e}"
+        yield index, record
+        index += 1
+
+
+def prepare_record(item):
+    """One (index, record) to a model input"""
+    _, record = item
+    if isinstance(record, str):
+        raise ValueError(record)
+    if "points" in record:
+        return prepare_model_input_from_arrays(*decode_compact_json(record))
+    drawing = record.get("drawing")
+    if not isinstance(drawing, list) or not drawing:
+        raise ValueError("record needs a non-empty \"drawing\" list or compact \"points\"")
+    return prepare_model_input(drawing)
+
+
+def _prepare_or_error(item):
+    try:
+        processed_image = prepare_record(item)
+    except Exception as e:
+        return None, str(e)
+    if processed_image is None:
+        return None, "Failed to process drawing"
+    return processed_image, None
+
+
+async def _start_batch(loop, executor, records, batch_size):
+    """Read the next batch_size records and start preprocessing them on the bulk threads"""
+    items = await loop.run_in_executor(executor, lambda: list(islice(records, batch_size)))
+    preparing = asyncio.gather(*(loop.run_in_executor(executor, _prepare_or_error, item) for item in items))
+    return items, preparing
+
+
+async def _score_admitted(images):
+    """One forward pass through the micro-batcher, backing off while the pipeline is saturated"""
+    while True:
+        try:
+            async with inference_executor.admission():
+                probabilities = await inference_batcher.submit(images)
+            return np.reshape(probabilities, (len(images), -1))
+        except InferenceQueueFullError as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def _score_batch(prepared):
+    ok = [i for i, (image, _) in enumerate(prepared) if image is not None]
+    if not ok:
+        return {}
+    images = np.concatenate([prepared[i][0] for i in ok], axis=0)
+    # Chunks of the batcher's batch size, so interactive requests get a turn in between
+    chunk = inference_batcher.max_batch_size
+    probabilities = []
+    for start in range(0, len(images), chunk):
+        probabilities.extend(await _score_admitted(images[start:start + chunk]))
+    return dict(zip(ok, probabilities))
+
+
+def format_result(item, probabilities, error):
+    index, record = item
+    result = {"index": index}
+    if isinstance(record, dict) and "id" in record:
+        result["id"] = record["id"]
+    if error is not None:
+        result["error"] = error
+        return result
+
+    top_indices = probabilities.argsort()[-3:][::-1]
+    result["prediction"] = CLASS_LABELS[top_indices[0]]
+    result["confidence"] = float(probabilities[top_indices[0]])
+    result["top_predictions"] = {CLASS_LABELS[i]: float(probabilities[i]) for i in top_indices}
+    return result
+
+
+async def stream_bulk_predictions(lines, batch_size=128):
+    """
+    Score NDJSON drawing lines and yield NDJSON result lines batch by batch
+
+    Reading the input and preprocessing happen on the bulk threads, the next
+    batch while the current one is scored. When the client goes away the
+    generator is cancelled at its next await: the chunk queued in the batcher
+    is skipped and the next batch's preprocessing is abandoned.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_bulk_executor()
+    records = read_records(lines)
+    items, preparing = await _start_batch(loop, executor, records, batch_size)
+    try:
+        while items:
+            prepared = await preparing
+            # Preprocess the next batch while this one runs through the model
+            next_items, preparing = await _start_batch(loop, executor, records, batch_size)
+            probabilities = await _score_batch(prepared)
+            yield "".join(
+                json.dumps(format_result(item, probabilities.get(i), error)) + "\n"
+                for i, (item, (_, error)) in enumerate(zip(items, prepared))
+            )
+            items = next_items
+    finally:
+        preparing.cancel()
@@ -0,0 +1,408 @@
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+from app.models.drawing_model import CLASS_LABELS, drawing_to_arrays, split_stroke_array
+
+logger = logging.getLogger(__name__)
+
+# Drawing capture log: the final drawing of every game round, with its target
+# class and the model's prediction, appended to rotating segment files for
+# benchmark replay and retraining.
+#
+# Segment file (.qdc):
+#   b"QDCAP" version:u8  varint(header length)  header JSON {"classes": [...], "created_at": ...}
+#   then one record after the other:  varint(payload length)  payload
+#
+# Record payload (all integers are LEB128 varints):
+#   timestamp_ms  round_id (length + UTF-8)  target index  prediction index  flags (1 = won)
+#   class count  probabilities as float16 little-endian
+#   stroke count  points per stroke...  zigzag(dx), zigzag(dy) per point
+#
+# Coordinates are rounded to whole canvas pixels and stored as deltas from
+# the previous point (the first one from 0, 0), so a typical point takes two
+# or three bytes. A segment is written as name.qdc.open and renamed to
+# name.qdc once it is complete; readers skip the .open file.
+
+MAGIC = b"QDCAP"
+FORMAT_VERSION = 1
+SEGMENT_SUFFIX = ".qdc"
+OPEN_SUFFIX = ".open"
+
+
+def zigzag(values):
+    """Signed int64 -> uint64 with small magnitudes first (0, -1, 1, -2, ...)"""
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def unzigzag(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+
+def encode_varints(values):
+    """Pack non-negative integers as LEB128 varints without a per-value Python loop"""
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    if not len(values):
+        return b""
+    shifted = values[:, np.newaxis] >> np.arange(0, 64, 7, dtype=np.uint64)
+    lengths = np.maximum(1, (shifted > 0).sum(axis=1))
+    width = int(lengths.max())
+    groups = (shifted[:, :width] & np.uint64(0x7F)).astype(np.uint8)
+    position = np.arange(width)
+    groups[position < lengths[:, np.newaxis] - 1] |= 0x80
+    return groups[position < lengths[:, np.newaxis]].tobytes()
+
+
+def decode_varints(buffer, offset, count):
+    """
+    Read count varints from buffer at offset
+
+    Returns:
+        tuple: (np.uint64 values, offset after the last one)
+
+    Raises:
+        ValueError: If the buffer ends before count varints
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64), offset
+    # A varint takes at most 10 bytes: don't scan the rest of a whole segment for every read
+    data = np.frombuffer(buffer, dtype=np.uint8, count=min(10 * count, len(buffer) - offset), offset=offset)
+    ends = np.flatnonzero(data < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Truncated varint data")
+    used = int(ends[-1]) + 1
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(count), ends - starts + 1)
+    shifts = ((np.arange(used) - starts[owner]) * 7).astype(np.uint64)
+    values = np.zeros(count, dtype=np.uint64)
+    np.add.at(values, owner, (data[:used].astype(np.uint64) & np.uint64(0x7F)) << shifts)
+    return values, offset + used
+
+
+def _varint(value):
+    return encode_varints([value])
+
+
+def _read_varint(buffer, offset):
+    values, offset = decode_varints(buffer, offset, 1)
+    return int(values[0]), offset
+
+
+# The strokes are split the way serving splits them (stroke starts, strokeEnd
+# markers and pen-lift gaps), so a replayed drawing renders like the served one
+
+def strokes_from_points(points, stroke_offsets=None):
+    """Compact format (N, 2) points + stroke start offsets -> list of (K, 2) strokes"""
+    return split_stroke_array(points, stroke_offsets=stroke_offsets)
+
+
+def strokes_from_dicts(drawing):
+    """[{x, y, strokeEnd?}] points -> list of (K, 2) strokes"""
+    if not drawing:
+        return []
+    points, stroke_ends = drawing_to_arrays(drawing)
+    return split_stroke_array(points, stroke_ends=stroke_ends)
+
+
+def encode_record(record, classes=CLASS_LABELS):
+    """
+    Encode one capture record
+
+    Args:
+        record: {"strokes": [(K, 2) arrays], "target", "prediction", "probabilities": (C,) array,
+                 "won", "round_id", "timestamp"}
+
+    Returns:
+        bytes: The length-prefixed record
+    """
+    strokes = [np.round(np.asarray(stroke, dtype=np.float64).reshape(-1, 2)).astype(np.int64)
+               for stroke in record["strokes"]]
+    points = np.concatenate(strokes) if strokes else np.zeros((0, 2), dtype=np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    probabilities = np.asarray(record.get("probabilities", ()), dtype="<f2")
+    round_id = (record.get("round_id") or "").encode()
+
+    payload = b"".join((
+        _varint(int(record.get("timestamp", time.time()) * 1000)),
+        _varint(len(round_id)), round_id,
+        encode_varints([classes.index(record["target"]), classes.index(record["prediction"]),
+                        1 if record.get("won") else 0, len(probabilities)]),
+        probabilities.tobytes(),
+        _varint(len(strokes)),
+        encode_varints([len(stroke) for stroke in strokes]),
+        encode_varints(zigzag(deltas.ravel()))
+    ))
+    return _varint(len(payload)) + payload
+
+
+def decode_record(payload, classes=CLASS_LABELS):
+    """Decode one record payload (without its length prefix) into a record dict"""
+    timestamp_ms, offset = _read_varint(payload, 0)
+    id_length, offset = _read_varint(payload, offset)
+    round_id = bytes(payload[offset:offset + id_length]).decode()
+    offset += id_length
+    (target, prediction, flags, class_count), offset = decode_varints(payload, offset, 4)
+    class_count = int(class_count)
+    probabilities = np.frombuffer(payload, dtype="<f2", count=class_count, offset=offset).astype(np.float32)
+    offset += 2 * class_count
+    stroke_count, offset = _read_varint(payload, offset)
+    lengths, offset = decode_varints(payload, offset, stroke_count)
+    deltas, offset = decode_varints(payload, offset, 2 * int(lengths.sum()))
+    points = np.cumsum(unzigzag(deltas).reshape(-1, 2), axis=0).astype(np.float64)
+    return {
+        "timestamp": timestamp_ms / 1000.0,
+        "round_id": round_id or None,
+        "target": classes[int(target)],
+        "prediction": classes[int(prediction)],
+        "won": bool(flags & 1),
+        "probabilities": probabilities,
+        "strokes": np.split(points, np.cumsum(lengths.astype(np.int64))[:-1]) if stroke_count else []
+    }
+
+
+def segment_header(classes=CLASS_LABELS):
+    header = json.dumps({"classes": list(classes), "created_at": time.time()}).encode()
+    return MAGIC + struct.pack("B", FORMAT_VERSION) + _varint(len(header)) + header
+
+
+def read_segment(path):
+    """
+    Yield the records of one segment file
+
+    A record cut off at the end of the file (e.g. a .open segment of a server
+    that was killed) ends the segment quietly.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a capture segment")
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported capture format version {version}")
+    header_length, offset = _read_varint(data, len(MAGIC) + 1)
+    classes = json.loads(data[offset:offset + header_length])["classes"]
+    offset += header_length
+
+    while offset < len(data):
+        try:
+            length, start = _read_varint(data, offset)
+        except ValueError:
+            return
+        if start + length > len(data):
+            return
+        yield decode_record(memoryview(data)[start:start + length], classes)
+        offset = start + length
+
+
+def segment_paths(paths):
+    """Capture segment files of paths (files or directories), oldest first"""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith(SEGMENT_SUFFIX)
+            ))
+        else:
+            found.append(path)
+    return found
+
+
+def read_capture(paths, won_only=False):
+    """
+    Yield every captured record from segment files or capture directories
+
+    Args:
+        paths: Segment file, capture directory, or a list of them
+        won_only: Only the drawings that won their round (the model recognized the target)
+
+    Yields:
+        dict: timestamp, round_id, target, prediction, won, probabilities (C,) and
+        strokes as (K, 2) canvas coordinate arrays
+    """
+    for path in segment_paths(paths):
+        for record in read_segment(path):
+            if not won_only or record["won"]:
+                yield record
+
+
+class CaptureLog:
+    """
+    Non-blocking capture sink with a background segment writer
+
+    submit() only puts the record on a bounded queue; when the queue is full
+    the record is dropped and counted rather than slowing the request down.
+    The writer thread converts and encodes the drawings, appends them to the
+    current segment and starts a new one once segment_max_bytes are written.
+    With max_segments, the oldest complete segments are deleted.
+    """
+
+    def __init__(self, enabled=False, directory="captures", segment_max_bytes=64 * 1024 * 1024, max_segments=0,
+                 queue_size=1024, flush_interval=1.0):
+        self.enabled = enabled
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_path = None
+        self._segment_index = 0
+
+        self.submitted_total = 0
+        self.dropped_total = 0
+        self.written_total = 0
+        self.bytes_written_total = 0
+        self.segments_total = 0
+        self.errors_total = 0
+
+    def configure(self, enabled=None, directory=None, segment_max_bytes=None, max_segments=None, queue_size=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if directory:
+            self.directory = directory
+        if segment_max_bytes is not None:
+            self.segment_max_bytes = int(segment_max_bytes)
+        if max_segments is not None:
+            self.max_segments = int(max_segments)
+        if queue_size is not None and self._thread is None:
+            self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+
+    def submit(self, record):
+        """
+        Queue a record for the writer without blocking
+
+        Args:
+            record: target, prediction, probabilities, won, round_id and either
+                "drawing" ([{x, y, strokeEnd?}] points) or "points" + "stroke_offsets"
+
+        Returns:
+            bool: False if capture is disabled or the queue is full
+        """
+        if not self.enabled:
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped_total += 1
+            return False
+        with self._lock:
+            self.submitted_total += 1
+        return True
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="quickdraw-capture", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()
+                continue
+            if record is None:
+                self._close_segment()
+                return
+            try:
+                self._write(record)
+            except Exception as e:
+                logger.error("❌ Capture write failed: %s", e)
+                with self._lock:
+                    self.errors_total += 1
+
+    def _write(self, record):
+        if "strokes" not in record:
+            if "drawing" in record:
+                strokes = strokes_from_dicts(record["drawing"])
+            else:
+                strokes = strokes_from_points(record["points"], record.get("stroke_offsets"))
+            record = {**record, "strokes": strokes}
+        if isinstance(record.get("probabilities"), dict):
+            probabilities = record["probabilities"]
+            record = {**record, "probabilities": [probabilities.get(label, 0.0) for label in CLASS_LABELS]}
+        data = encode_record(record)
+
+        if self._file is None:
+            self._open_segment()
+        self._file.write(data)
+        with self._lock:
+            self.written_total += 1
+            self.bytes_written_total += len(data)
+        if self._file.tell() >= self.segment_max_bytes:
+            self._close_segment()
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_index += 1
+        # The pid keeps the segments of several worker processes apart
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_index:04d}{SEGMENT_SUFFIX}"
+        self._file_path = os.path.join(self.directory, name)
+        self._file = open(self._file_path + OPEN_SUFFIX, "wb")
+        self._file.write(segment_header())
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._file_path + OPEN_SUFFIX, self._file_path)
+        self._file = None
+        with self._lock:
+            self.segments_total += 1
+        logger.info("💾 Capture segment written: %s", self._file_path)
+        if self.max_segments:
+            segments = segment_paths(self.directory)
+            for path in segments[:max(0, len(segments) - self.max_segments)]:
+                os.remove(path)
+
+    def close(self, timeout=10.0):
+        """Write out the queued records and complete the current segment (call at shutdown)"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("⚠️  Capture queue still full at shutdown, the last segment stays open")
+            return
+        thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queued": self._queue.qsize(),
+                "submitted_total": self.submitted_total,
+                "dropped_total": self.dropped_total,
+                "written_total": self.written_total,
+                "bytes_written_total": self.bytes_written_total,
+                "segments_total": self.segments_total,
+                "errors_total": self.errors_total
+            }
+
+
+# Shared capture sink fed by the game rounds, configured from main.py
+capture_log = CaptureLog()
+
+
+def configure_capture(enabled=None, directory=None, segment_max_bytes=None, max_segments=None, queue_size=None):
+    """Configure the shared capture log (call once at startup)"""
+    capture_log.configure(
+        enabled=enabled, directory=directory, segment_max_bytes=segment_max_bytes, max_segments=max_segments, queue_size=queue_size
+    )
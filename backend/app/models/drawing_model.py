@@ -1,4 +1,3 @@
-import tensorflow as tf
 import numpy as np
 import os
 from PIL import Image, ImageDraw, ImageFilter
@@ -6,41 +5,188 @@ from scipy.ndimage import gaussian_filter
 import io
 import base64
 import cv2
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.metrics import MODEL_BATCH_SIZE, stage_timer
+from app.models.backends import create_backend, default_backend_path
+from app.models.registry import model_registry
+from app.tuning import thread_tuning
+from app.models.tta import average_probabilities, make_variants, test_time_augmentation
+
+logger = logging.getLogger(__name__)
 
 # Get the absolute path to the improved 64x64 model file (HYBRID APPROACH)
 # Navigate from backend/app/models/ to project root, then to models/
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 MODEL_PATH = os.path.join(PROJECT_ROOT, 'model_training', 'model_trad', 'QuickDraw_CALIBRATED_FINAL_64x64.keras')
 
-# Load the improved 64x64 QuickDraw model for HYBRID approach
-try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-    print(f"✅ Improved 64x64 HYBRID model loaded successfully from {MODEL_PATH}")
-    print(f"📊 Model input shape: {model.input_shape}")
-    print(f"🎯 Expected input: (batch_size, 64, 64, 1)")
-except Exception as e:
-    print(f"❌ Error loading 64x64 HYBRID model: {e}")
-    # Fallback to previous models (64x64 compatible)
-    fallback_paths = [
-        os.path.join(PROJECT_ROOT, 'model_training', 'model_trad', 'QuickDraw_improved_final.keras'),
-        os.path.join(PROJECT_ROOT, 'model_training', 'model_trad', 'QuickDraw_tradDataset.keras'),
-        os.path.join(PROJECT_ROOT, 'model_training', 'models', 'QuickDraw.h5'),
-        os.path.join(PROJECT_ROOT, 'models', 'QuickDraw.h5'),
-        os.path.join(PROJECT_ROOT, 'model_training', 'models', 'QuickDraw.keras')
-    ]
-    
-    model = None
-    for fallback_path in fallback_paths:
+# Fallback models (64x64 compatible), tried in order if MODEL_PATH can't be loaded
+FALLBACK_MODEL_PATHS = [
+    os.path.join(PROJECT_ROOT, 'model_training', 'model_trad', 'QuickDraw_improved_final.keras'),
+    os.path.join(PROJECT_ROOT, 'model_training', 'model_trad', 'QuickDraw_tradDataset.keras'),
+    os.path.join(PROJECT_ROOT, 'model_training', 'models', 'QuickDraw.h5'),
+    os.path.join(PROJECT_ROOT, 'models', 'QuickDraw.h5'),
+    os.path.join(PROJECT_ROOT, 'model_training', 'models', 'QuickDraw.keras')
+]
+
+# The model is loaded lazily by initialize_model() (run in the background at
+# startup) so importing this module doesn't pay for TensorFlow + load_model
+model = None
+model_path = None
+model_status = {"state": "not_loaded", "error": None, "backend": None, "load_seconds": None, "warm_up_seconds": None}
+_model_ready = threading.Event()
+_model_init_lock = threading.Lock()
+
+class ModelNotReadyError(Exception):
+    """Raised when a prediction is requested while the model is still loading"""
+
+    def __init__(self, retry_after=2):
+        super().__init__("Model is still loading, please retry shortly")
+        self.retry_after = retry_after
+
+def _load_backend(backend, path, num_threads):
+    global model, model_path
+    model = create_backend(backend, path, num_threads=num_threads)
+    model_path = path
+    model_status["backend"] = backend
+    return model
+
+def _serve_version(version):
+    # Keep the module-level model in step with the registry's active version
+    global model, model_path
+    model = version.backend
+    model_path = version.path
+    model_status["backend"] = version.backend_name
+
+model_registry.on_activate(_serve_version)
+
+def load_model(backend="keras", path=None, num_threads=None):
+    """
+    Load the improved 64x64 QuickDraw model for HYBRID approach, falling back to older models
+
+    Args:
+        backend: Inference runtime - "keras", "tflite" or "onnx" (see app.models.backends)
+        path: Model file for that runtime; defaults to MODEL_PATH (or its exported .tflite/.onnx sibling)
+        num_threads: CPU threads for the TFLite / ONNX Runtime interpreter
+
+    Returns:
+        The loaded InferenceBackend, or None if no model file could be loaded
+    """
+    if backend != "keras":
+        path = path or default_backend_path(MODEL_PATH, backend)
+        try:
+            _load_backend(backend, path, num_threads)
+            logger.info("✅ %s model loaded successfully from %s", backend, path)
+            logger.info("📊 Model input shape: %s", model.input_shape)
+            return model
+        except Exception as e:
+            # Keep serving with the reference Keras model rather than not at all
+            logger.error("❌ Error loading %s model from %s: %s", backend, path, e)
+            logger.warning("⚠️  Falling back to the Keras model")
+            path = None
+
+    primary_path = path or MODEL_PATH
+    try:
+        _load_backend("keras", primary_path, num_threads)
+        logger.info("✅ Improved 64x64 HYBRID model loaded successfully from %s", primary_path)
+        logger.info("📊 Model input shape: %s", model.input_shape)
+        logger.info("🎯 Expected input: (batch_size, 64, 64, 1)")
+        return model
+    except Exception as e:
+        logger.error("❌ Error loading 64x64 HYBRID model: %s", e)
+
+    for fallback_path in FALLBACK_MODEL_PATHS:
+        if not os.path.exists(fallback_path):
+            continue
         try:
-            model = tf.keras.models.load_model(fallback_path)
-            print(f"✅ Fallback model loaded from {fallback_path}")
-            print(f"⚠️  Using fallback model - performance may be reduced")
-            break
+            _load_backend("keras", fallback_path, num_threads)
+            logger.info("✅ Fallback model loaded from %s", fallback_path)
+            logger.warning("⚠️  Using fallback model - performance may be reduced")
+            return model
         except Exception as e2:
             continue
-    
+
+    logger.error("❌ Could not load any model. Please ensure model files exist.")
+    return None
+
+def warm_up_model(batch_sizes=(1,)):
+    """
+    Run dummy forward passes so graph tracing happens before the first real request
+
+    Args:
+        batch_sizes: Batch sizes to trace (e.g. 1 and the micro-batcher's max batch size)
+    """
     if model is None:
-        print(f"❌ Could not load any model. Please ensure model files exist.")
+        return
+    height, width = model.input_shape[1:3]
+    for batch_size in sorted(set(batch_sizes)):
+        # Straight to the backend so warm-up passes don't show up in the stage metrics
+        model.predict(np.zeros((batch_size, height, width, 1), dtype=np.float32))
+
+def initialize_model(warm_up_batch_sizes=(1,), backend="keras", path=None, num_threads=None):
+    """
+    Load and warm up the model; safe to call more than once (e.g. from a background task)
+
+    Args:
+        warm_up_batch_sizes: Batch sizes to trace before serving
+        backend, path, num_threads: Passed on to load_model()
+
+    Returns:
+        bool: True if a model is loaded and ready to serve
+    """
+    with _model_init_lock:
+        if _model_ready.is_set():
+            return True
+
+        model_status.update(state="loading", error=None)
+        started = time.perf_counter()
+        try:
+            if load_model(backend, path, num_threads) is None:
+                model_status.update(state="failed", error="Model not loaded")
+                return False
+            model_status["load_seconds"] = round(time.perf_counter() - started, 3)
+
+            warm_up_started = time.perf_counter()
+            warm_up_model(warm_up_batch_sizes)
+            model_status["warm_up_seconds"] = round(time.perf_counter() - warm_up_started, 3)
+
+            # Later versions are loaded by the registry with the same settings
+            model_registry.warm_up_batch_sizes = tuple(warm_up_batch_sizes)
+            model_registry.num_threads = num_threads
+            model_registry.activate(model_registry.new_version(
+                model, model_status["backend"], model_path, model_status["load_seconds"],
+                model_status["warm_up_seconds"]
+            ))
+        except Exception as e:
+            logger.exception("❌ Error initializing model: %s", e)
+            model_status.update(state="failed", error=str(e))
+            return False
+
+        model_status["state"] = "ready"
+        _model_ready.set()
+        logger.info("🔥 Model warmed up in %ss (loaded in %ss)", model_status["warm_up_seconds"], model_status["load_seconds"])
+        return True
+
+def is_model_ready():
+    return _model_ready.is_set()
+
+def check_model_available():
+    """
+    Raise ModelNotReadyError while the model is loading
+
+    Returns:
+        bool: False if loading finished without a usable model, True otherwise
+    """
+    if model is not None and is_model_ready():
+        return True
+    if model_status["state"] in ("not_loaded", "loading"):
+        raise ModelNotReadyError()
+    return False
 
 # Class labels for QuickDraw model (15 classes) - Updated to match notebook training
 CLASS_LABELS = [
@@ -48,24 +194,257 @@ CLASS_LABELS = [
     'mountain', 'star', 'tent', 'toothbrush', 'wristwatch'
 ]
 
-def adapt_image_for_training_match(img_array):
+def image_fingerprint(img_array, namespace=None):
+    """Stable hash of an image array (shape + dtype + pixels), optionally scoped to a namespace (e.g. model version)"""
+    img_array = np.ascontiguousarray(img_array)
+    digest = hashlib.blake2b(digest_size=16)
+    if namespace:
+        digest.update(namespace.encode())
+    digest.update(f"{img_array.shape}{img_array.dtype}".encode())
+    digest.update(img_array.tobytes())
+    return digest.digest()
+
+# Stroke-style post-processing of adapt_image_for_training_match, shared with the
+# on-the-fly training augmentation in model_training/training_data.py
+TRAINING_MATCH_BLUR_SIGMA = 0.3   # Reduced from 0.7
+TRAINING_MATCH_CONTRAST = 1.1     # Reduced from 1.3
+TRAINING_MATCH_NOISE_STD = 0.005  # Reduced from 0.02
+
+def adapt_image_for_training_match(img_array, deterministic=False):
     """
     Apply post-processing to match training data characteristics
     OPTIMIZED: Reduced aggressive processing since color fix resolved main issue
+
+    Pass deterministic=True to seed the noise from the image itself, so the same
+    drawing always yields the same model input (and can hit the prediction cache).
     """
     
     # Apply lighter gaussian blur to simulate training data style
-    img_blurred = gaussian_filter(img_array, sigma=0.3)  # Reduced from 0.7
+    img_blurred = gaussian_filter(img_array, sigma=TRAINING_MATCH_BLUR_SIGMA)
     
     # Reduce contrast enhancement since colors are now matched
-    img_contrasted = np.clip(img_blurred * 1.1, 0, 1)  # Reduced from 1.3
+    img_contrasted = np.clip(img_blurred * TRAINING_MATCH_CONTRAST, 0, 1)
     
     # Reduce noise since it may be interfering with recognition
-    noise = np.random.normal(0, 0.005, img_contrasted.shape)  # Reduced from 0.02
+    if deterministic:
+        rng = np.random.default_rng(int.from_bytes(image_fingerprint(img_array)[:8], 'little'))
+        noise = rng.normal(0, TRAINING_MATCH_NOISE_STD, img_contrasted.shape)
+    else:
+        noise = np.random.normal(0, TRAINING_MATCH_NOISE_STD, img_contrasted.shape)
     img_noisy = np.clip(img_contrasted + noise, 0, 1)
     
     return img_noisy
 
+class PredictionCache:
+    """
+    LRU + TTL cache of class probabilities keyed by the fingerprint of the final model input
+
+    Idle polls resend drawings that haven't changed, and many different point
+    lists rasterize to the same thresholded 64x64 tensor, so a hit skips the
+    forward pass entirely. max_entries=0 disables the cache.
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=120):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries=None, ttl_seconds=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max(0, int(max_entries))
+            if ttl_seconds is not None:
+                self.ttl_seconds = float(ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        """Return cached probabilities for key, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, probabilities):
+        if not self.enabled:
+            return
+        probabilities = np.array(probabilities, copy=True)
+        probabilities.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), probabilities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0
+            }
+
+# Shared prediction cache, configured from main.py
+prediction_cache = PredictionCache()
+
+def configure_prediction_cache(max_entries=None, ttl_seconds=None):
+    """Configure the shared prediction cache (call once at startup)"""
+    prediction_cache.configure(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+def fit_to_model_input(processed_image):
+    """
+    Make sure a preprocessed image matches the model input shape
+
+    Args:
+        processed_image: (1, H, W, 1) normalized image
+
+    Returns:
+        np.array: (1, H, W, 1) normalized image with the model's H and W
+    """
+    # CRITICAL: Check model input shape and ensure compatibility
+    expected_shape = model.input_shape[1:3]  # (height, width)
+    actual_shape = processed_image.shape[1:3]  # (height, width)
+
+    logger.debug("🎯 Model expects: %s, Got: %s", expected_shape, actual_shape)
+
+    if actual_shape != expected_shape:
+        logger.warning("⚠️  Shape mismatch! Resizing %s to %s", actual_shape, expected_shape)
+        # Convert back to PIL for resizing (keeping normalized values)
+        img_pil = Image.fromarray((processed_image[0, :, :, 0] * 255).astype(np.uint8))
+        img_resized = img_pil.resize(expected_shape[::-1], Image.Resampling.LANCZOS)  # PIL uses (width, height)
+        processed_image = np.array(img_resized, dtype=np.float32) / 255.0  # Normalize for 64x64 model
+        processed_image = processed_image.reshape(1, expected_shape[0], expected_shape[1], 1)
+        logger.debug("🔄 Resized to %s for model compatibility (normalized values)", processed_image.shape)
+
+    return processed_image
+
+def prepare_model_input(drawing_data):
+    """
+    Run the configured preprocessing and make sure the result matches the model input shape
+
+    Args:
+        drawing_data: List of coordinates [{x: int, y: int}]
+
+    Returns:
+        np.array: (1, H, W, 1) normalized image ready for the model, or None
+    """
+    # Convert drawing coordinates to 64x64 image
+    processed_image = preprocess_drawing_to_image(drawing_data)
+
+    if processed_image is None:
+        return None
+
+    return fit_to_model_input(processed_image)
+
+def prepare_model_input_from_arrays(points, stroke_offsets=None):
+    """
+    prepare_model_input for the compact format: (N, 2) points + stroke start offsets
+
+    Args:
+        points: (N, 2) array of canvas coordinates
+        stroke_offsets: Index of the first point of every stroke
+
+    Returns:
+        np.array: (1, H, W, 1) normalized image ready for the model, or None
+    """
+    processed_image = preprocess_strokes(split_stroke_array(points, stroke_offsets=stroke_offsets))
+
+    if processed_image is None:
+        return None
+
+    return fit_to_model_input(processed_image)
+
+def predict_batch(images, version=None):
+    """
+    Run one forward pass over a batch of preprocessed drawings
+
+    Args:
+        images: np.array of shape (N, H, W, 1), e.g. stacked prepare_model_input() results
+        version: ModelVersion to run (default: the registry's active version)
+
+    Returns:
+        np.array: (N, num_classes) class probabilities
+    """
+    version = version or model_registry.active
+    if version is None:
+        raise RuntimeError("Model not loaded")
+
+    images = np.asarray(images, dtype=np.float32)
+    MODEL_BATCH_SIZE.observe(len(images))
+    with stage_timer("model_forward"):
+        return version.predict(images)
+
+def build_prediction_result(probabilities, point_count):
+    """
+    Turn one row of class probabilities into the prediction result dict
+
+    Args:
+        probabilities: np.array of shape (num_classes,)
+        point_count: Number of drawing points behind the prediction (used for logging)
+
+    Returns:
+        dict: Prediction results with confidence scores
+    """
+    with stage_timer("response_build"):
+        return _build_prediction_result(probabilities, point_count)
+
+def _build_prediction_result(probabilities, point_count):
+    predicted_class_idx = np.argmax(probabilities)
+    confidence = float(probabilities[predicted_class_idx])
+    predicted_label = CLASS_LABELS[predicted_class_idx]
+
+    # Get top 3 predictions
+    top_indices = np.argsort(probabilities)[-3:][::-1]
+    top_predictions = {}
+    for idx in top_indices:
+        top_predictions[CLASS_LABELS[idx]] = float(probabilities[idx])
+
+    # Log prediction details for debugging
+    logger.debug("🤖 HYBRID 64x64 prediction: %s (%.1f%%) from %d points, top 3: %s",
+                 predicted_label, confidence * 100, point_count, list(top_predictions))
+
+    return {
+        "prediction": predicted_label,
+        "confidence": confidence,
+        "top_predictions": top_predictions,
+        "all_probabilities": {CLASS_LABELS[i]: float(probabilities[i]) for i in range(len(CLASS_LABELS))},
+        "model_info": "64x64 HYBRID model with OpenCV preprocessing",
+        "resolution": "64x64",
+        "preprocessing_approach": "HYBRID: Web coordinates + OpenCV (medianBlur + GaussianBlur + OTSU + contour crop)",
+        "downsampling_eliminated": True,
+        "expected_confidence_boost": "40-60% (hybrid approach)",
+        "color_fix_applied": True,
+        "opencv_preprocessing": True,
+        "content_cropping": True,
+        "normalized_values": True,
+        "model_version": "64x64_hybrid"
+    }
+
 def predict_drawing(drawing_data):
     """
     Predict the drawing from 15 QuickDraw classes using 64x64 HYBRID model
@@ -80,191 +459,254 @@ def predict_drawing(drawing_data):
     Returns:
         dict: Prediction results with confidence scores
     """
-    if model is None:
-        return {"error": "Model not loaded", "prediction": "unknown", "confidence": 0.0}
+    try:
+        if not check_model_available():
+            return {"error": "Model not loaded", "prediction": "unknown", "confidence": 0.0}
+    except ModelNotReadyError as e:
+        return {"error": str(e), "prediction": "unknown", "confidence": 0.0}
     
     try:
-        # Convert drawing coordinates to 64x64 image with hybrid preprocessing
-        processed_image = preprocess_drawing_to_image(drawing_data)
+        processed_image = prepare_model_input(drawing_data)
         
         if processed_image is None:
             return {"error": "Failed to process drawing", "prediction": "unknown", "confidence": 0.0}
         
-        # Log image shape for debugging
-        print(f"🔍 Processed image shape: {processed_image.shape}")
-        
-        # CRITICAL: Check model input shape and ensure compatibility
-        expected_shape = model.input_shape[1:3]  # (height, width)
-        actual_shape = processed_image.shape[1:3]  # (height, width)
-        
-        print(f"🎯 Model expects: {expected_shape}, Got: {actual_shape}")
-        
-        if actual_shape != expected_shape:
-            print(f"⚠️  Shape mismatch! Resizing {actual_shape} to {expected_shape}")
-            from PIL import Image
-            # Convert back to PIL for resizing (keeping normalized values)
-            img_pil = Image.fromarray((processed_image[0, :, :, 0] * 255).astype(np.uint8))
-            img_resized = img_pil.resize(expected_shape[::-1], Image.Resampling.LANCZOS)  # PIL uses (width, height)
-            processed_image = np.array(img_resized, dtype=np.float32) / 255.0  # Normalize for 64x64 model
-            processed_image = processed_image.reshape(1, expected_shape[0], expected_shape[1], 1)
-            print(f"🔄 Resized to {processed_image.shape} for model compatibility (normalized values)")
-        else:
-            print(f"✅ Perfect shape match! Using 64x64 directly with HYBRID preprocessing!")
-        
-        # Make prediction
-        prediction_probs = model.predict(processed_image, verbose=0)
-        predicted_class_idx = np.argmax(prediction_probs[0])
-        confidence = float(prediction_probs[0][predicted_class_idx])
-        predicted_label = CLASS_LABELS[predicted_class_idx]
-        
-        # Get top 3 predictions
-        top_indices = np.argsort(prediction_probs[0])[-3:][::-1]
-        top_predictions = {}
-        for idx in top_indices:
-            top_predictions[CLASS_LABELS[idx]] = float(prediction_probs[0][idx])
-        
-        # Log prediction details for debugging
-        print(f"🤖 HYBRID 64x64 Model prediction details:")
-        print(f"   Canvas: 400x400 (square) → 64x64 via HYBRID approach")
-        print(f"   Drawing points: {len(drawing_data)}")
-        print(f"   Prediction: {predicted_label} ({confidence*100:.1f}%)")
-        print(f"   Top 3: {list(top_predictions.keys())[:3]}")
-        print(f"   🚀 HYBRID: OpenCV preprocessing + 64x64 resolution")
-        print(f"   🔧 TECHNIQUES: medianBlur + GaussianBlur + OTSU + contour crop")
-        
-        if confidence > 0.5:
-            print(f"   🎉 EXCELLENT confidence! Hybrid approach working perfectly.")
-        elif confidence > 0.3:
-            print(f"   ✅ Good confidence improvement from hybrid preprocessing.")
-        else:
-            print(f"   ⚠️ Still optimizing - hybrid approach may need fine-tuning.")
-        
-        return {
-            "prediction": predicted_label,
-            "confidence": confidence,
-            "top_predictions": top_predictions,
-            "all_probabilities": {CLASS_LABELS[i]: float(prediction_probs[0][i]) for i in range(len(CLASS_LABELS))},
-            "model_info": "64x64 HYBRID model with OpenCV preprocessing",
-            "resolution": "64x64",
-            "preprocessing_approach": "HYBRID: Web coordinates + OpenCV (medianBlur + GaussianBlur + OTSU + contour crop)",
-            "downsampling_eliminated": True,
-            "expected_confidence_boost": "40-60% (hybrid approach)",
-            "color_fix_applied": True,
-            "opencv_preprocessing": True,
-            "content_cropping": True,
-            "normalized_values": True,
-            "model_version": "64x64_hybrid"
-        }
+        # Optionally score the test-time augmentation views in the same forward pass
+        if test_time_augmentation.should_augment():
+            processed_image = make_variants(processed_image, test_time_augmentation.variants)
+        
+        # Identical model inputs give identical predictions (per model version)
+        version = model_registry.choose()
+        cache_key = image_fingerprint(processed_image, version.version)
+        probabilities = prediction_cache.get(cache_key)
+        if probabilities is None:
+            # Make prediction
+            probabilities = average_probabilities(predict_batch(processed_image, version))
+            prediction_cache.put(cache_key, probabilities)
+        version.record_confidence(float(np.max(probabilities)))
+        return build_prediction_result(probabilities, len(drawing_data))
         
     except Exception as e:
-        print(f"❌ Error in prediction: {e}")
+        logger.exception("❌ Error in prediction: %s", e)
         return {"error": str(e), "prediction": "unknown", "confidence": 0.0}
 
-def preprocess_drawing_to_image(drawing_data, canvas_size=(400, 400), target_size=(64, 64)):
+def _prepare_or_error(prepare_fn, item):
+    try:
+        processed_image = prepare_fn(item)
+    except Exception as e:
+        return None, str(e)
+    if processed_image is None:
+        return None, "Failed to process drawing"
+    return processed_image, None
+
+def predict_drawing_batches(drawings, batch_size=64, executor=None, prepare_fn=prepare_model_input):
     """
-    Convert drawing coordinates to a 64x64 grayscale image using HYBRID APPROACH
-    Combines web coordinate conversion + OpenCV preprocessing from QuickDrawApp.py
-    
-    HYBRID PIPELINE:
-    1. Convert coordinates to canvas image (PIL)
-    2. Apply OpenCV preprocessing (medianBlur + GaussianBlur + OTSU threshold)
-    3. Find contours and extract tight bounding box
-    4. Crop to content + scale to 64x64 (NO DOWNSAMPLING LOSS!)
-    
+    Score many drawings: parallel preprocessing, one forward pass per batch_size drawings
+
+    Drawings are read lazily from the iterable and the next batch is
+    preprocessed while the current one runs through the model, so memory stays
+    bounded by two batches however many drawings there are. The prediction
+    cache is bypassed so bulk jobs don't evict the interactive entries.
+
+    Args:
+        drawings: Iterable of items for prepare_fn (by default [{x, y}] point lists)
+        batch_size: Drawings per forward pass
+        executor: concurrent.futures executor for preprocessing (default: a pool of CPU count threads)
+        prepare_fn: Turns one item into a (1, H, W, 1) model input (or None)
+
+    Yields:
+        list: One (item, probabilities, error) tuple per drawing of the batch, in input order;
+        probabilities is None when error is set
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from itertools import islice
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="quickdraw-bulk")
+
+    drawings = iter(drawings)
+
+    def submit_batch():
+        items = list(islice(drawings, batch_size))
+        return items, [executor.submit(_prepare_or_error, prepare_fn, item) for item in items]
+
+    try:
+        items, futures = submit_batch()
+        while items:
+            prepared = [future.result() for future in futures]
+            # Preprocess the next batch while this one runs through the model
+            next_batch = submit_batch()
+
+            ok = [i for i, (image, _) in enumerate(prepared) if image is not None]
+            probabilities = {}
+            if ok:
+                batch_probabilities = predict_batch(np.concatenate([prepared[i][0] for i in ok], axis=0))
+                probabilities = dict(zip(ok, batch_probabilities))
+
+            yield [(item, probabilities.get(i), error) for i, (item, (_, error)) in enumerate(zip(items, prepared))]
+            items, futures = next_batch
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def predict_drawings(drawings, batch_size=64, executor=None):
+    """
+    Bulk version of predict_drawing for offline scoring (archives, moderation sweeps)
+
+    Args:
+        drawings: Iterable of drawings, each a list of coordinates [{x: int, y: int}]
+        batch_size: Drawings per forward pass
+        executor: concurrent.futures executor for preprocessing (default: a pool of CPU count threads)
+
+    Yields:
+        dict: predict_drawing()'s result for every drawing, in input order
+    """
+    for batch in predict_drawing_batches(drawings, batch_size, executor):
+        for drawing, probabilities, error in batch:
+            if error is not None:
+                yield {"error": error, "prediction": "unknown", "confidence": 0.0}
+            else:
+                yield build_prediction_result(probabilities, len(drawing))
+
+def drawing_to_arrays(drawing_data):
+    """
+    Convert [{x, y, strokeEnd?}] points into arrays for the vectorized stroke code
+
     Args:
         drawing_data: List of coordinate points [{x: int, y: int}]
-        canvas_size: Original canvas size (width, height) - square (400, 400)
-        target_size: Target image size for model (64, 64) - HYBRID SIZE
-    
+
     Returns:
-        np.array: Preprocessed 64x64 image ready for model prediction
+        tuple: (points, stroke_ends) - (N, 2) float64 coordinates and a boolean
+        mask of the strokeEnd marker points
     """
-    try:
-        if not drawing_data or len(drawing_data) == 0:
-            return None
-        
-        # STEP 1: Convert coordinates to canvas image with optimized stroke width
-        canvas_ratio = canvas_size[0] / canvas_size[1]  # 400/400 = 1.0
-        target_ratio = target_size[0] / target_size[1]  # 64/64 = 1.0
-        
-        # Create initial canvas - BLACK background, WHITE strokes (matches training)
-        img = Image.new('L', canvas_size, color=0)  # BLACK background
-        draw = ImageDraw.Draw(img)
-        
-        # Process strokes with improved stroke detection
-        strokes = []
-        current_stroke = []
-        
-        for i, point in enumerate(drawing_data):
-            # Skip stroke end markers
-            if 'strokeEnd' in point:
-                if current_stroke:
-                    strokes.append(current_stroke)
-                    current_stroke = []
-                continue
-            
-            current_stroke.append(point)
-            
-            # Check if this is the end of a stroke (gap detection)
-            if i < len(drawing_data) - 1:
-                next_point = drawing_data[i + 1]
-                if 'strokeEnd' not in next_point:
-                    # Calculate distance between consecutive points
-                    dist = ((next_point['x'] - point['x'])**2 + (next_point['y'] - point['y'])**2)**0.5
-                    
-                    # If distance is too large, consider it a new stroke
-                    if dist > 40:  # Threshold for square canvas
-                        strokes.append(current_stroke)
-                        current_stroke = []
-        
-        # Add final stroke
-        if current_stroke:
-            strokes.append(current_stroke)
-        
-        # HYBRID: Optimized stroke width for 64x64 (balance between detail and processing)
-        line_width = max(6, min(10, int(min(canvas_size) / 50)))  # Optimized for 64x64
-        
-        for stroke in strokes:
-            if len(stroke) > 1:
-                # Draw lines connecting points in this stroke
-                for i in range(len(stroke) - 1):
-                    x1, y1 = int(stroke[i]['x']), int(stroke[i]['y'])
-                    x2, y2 = int(stroke[i + 1]['x']), int(stroke[i + 1]['y'])
-                    draw.line([(x1, y1), (x2, y2)], fill=255, width=line_width)  # WHITE strokes
-            elif len(stroke) == 1:
-                # Single point - draw a small circle
-                x, y = int(stroke[0]['x']), int(stroke[0]['y'])
-                radius = line_width // 2
-                draw.ellipse([(x-radius, y-radius), (x+radius, y+radius)], fill=255)  # WHITE fill
-        
-        # Convert PIL to numpy for OpenCV processing
-        canvas_array = np.array(img, dtype=np.uint8)
-        
-        print(f"🎨 HYBRID APPROACH - Step 1: Canvas created ({canvas_array.shape}) with optimized strokes")
-        
-        # STEP 2: Apply OpenCV preprocessing (adapted from QuickDrawApp.py)
-        
-        # Apply median blur to remove noise (from QuickDrawApp.py line 86)
+    with stage_timer("request_parse"):
+        points = np.array([(point['x'], point['y']) for point in drawing_data], dtype=np.float64).reshape(-1, 2)
+        stroke_ends = np.fromiter(('strokeEnd' in point for point in drawing_data), dtype=bool, count=len(drawing_data))
+    return points, stroke_ends
+
+def split_stroke_array(points, stroke_offsets=None, stroke_ends=None, gap_threshold=40):
+    """
+    Split an (N, 2) point array into strokes without a per-point Python loop
+
+    A stroke ends where the next stroke starts (stroke_offsets), at a strokeEnd
+    marker point (the marker itself is dropped) or when two consecutive points
+    are more than gap_threshold pixels apart.
+
+    Args:
+        points: (N, 2) array of canvas coordinates
+        stroke_offsets: Index of the first point of every stroke (compact format)
+        stroke_ends: Boolean mask of strokeEnd marker points (legacy format)
+        gap_threshold: Distance that counts as a pen lift on the square canvas
+
+    Returns:
+        list: Strokes, each a (K, 2) array of points
+    """
+    with stage_timer("stroke_split"):
+        return _split_stroke_array(points, stroke_offsets, stroke_ends, gap_threshold)
+
+def _split_stroke_array(points, stroke_offsets, stroke_ends, gap_threshold):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n == 0:
+        return []
+
+    # breaks[i] is True when points i and i+1 belong to different strokes
+    deltas = np.diff(points, axis=0)
+    breaks = np.sqrt(deltas[:, 0] ** 2 + deltas[:, 1] ** 2) > gap_threshold  # Threshold for square canvas
+
+    if stroke_offsets is not None and len(stroke_offsets):
+        starts = np.asarray(stroke_offsets, dtype=np.int64)
+        starts = starts[(starts > 0) & (starts < n)]
+        breaks[starts - 1] = True
+
+    keep = slice(None)
+    if stroke_ends is not None:
+        stroke_ends = np.asarray(stroke_ends, dtype=bool)
+        breaks |= stroke_ends[:-1] | stroke_ends[1:]
+        keep = ~stroke_ends
+
+    stroke_ids = np.concatenate(([0], np.cumsum(breaks)))[keep]
+    kept_points = points[keep]
+    if len(kept_points) == 0:
+        return []
+    return np.split(kept_points, np.flatnonzero(np.diff(stroke_ids)) + 1)
+
+def split_strokes(drawing_data, gap_threshold=40):
+    """
+    Split a flat list of points into strokes (strokeEnd markers + gap detection)
+
+    Args:
+        drawing_data: List of coordinate points [{x: int, y: int}]
+        gap_threshold: Distance that counts as a pen lift on the square canvas
+
+    Returns:
+        list: Strokes, each a (K, 2) array of points
+    """
+    points, stroke_ends = drawing_to_arrays(drawing_data)
+    return split_stroke_array(points, stroke_ends=stroke_ends, gap_threshold=gap_threshold)
+
+def get_line_width(canvas_size=(400, 400)):
+    """HYBRID: Optimized stroke width for 64x64 (balance between detail and processing)"""
+    return max(6, min(10, int(min(canvas_size) / 50)))
+
+def draw_strokes(draw, strokes, line_width):
+    """
+    Draw strokes onto a PIL canvas - WHITE strokes on the BLACK background
+
+    Args:
+        draw: PIL ImageDraw for the canvas
+        strokes: Strokes as (K, 2) arrays, e.g. from split_stroke_array
+        line_width: Stroke width in canvas pixels
+    """
+    for stroke in strokes:
+        # Truncate like int() did for the per-point dicts
+        coords = np.asarray(stroke).astype(np.int64)
+        if len(coords) > 1:
+            # One polyline call per stroke instead of one draw.line per segment
+            draw.line(coords.ravel().tolist(), fill=255, width=line_width)  # WHITE strokes
+        elif len(coords) == 1:
+            # Single point - draw a small circle
+            x, y = int(coords[0, 0]), int(coords[0, 1])
+            radius = line_width // 2
+            draw.ellipse([(x-radius, y-radius), (x+radius, y+radius)], fill=255)  # WHITE fill
+
+def preprocess_canvas(canvas_array, target_size=(64, 64)):
+    """
+    HYBRID steps 2-4: OpenCV cleanup, contour crop and scaling of a rasterized canvas
+
+    Args:
+        canvas_array: uint8 canvas with WHITE strokes on BLACK background
+        target_size: Target image size for model (64, 64)
+
+    Returns:
+        np.array: (1, 64, 64, 1) normalized image ready for model prediction
+    """
+    # STEP 2: Apply OpenCV preprocessing (adapted from QuickDrawApp.py)
+    
+    # Apply median blur to remove noise (from QuickDrawApp.py line 86)
+    with stage_timer("median_blur"):
         blurred = cv2.medianBlur(canvas_array, 15)
-        
-        # Apply Gaussian blur for additional smoothing (from QuickDrawApp.py line 87)
+    
+    # Apply Gaussian blur for additional smoothing (from QuickDrawApp.py line 87)
+    with stage_timer("gaussian_blur"):
         blurred = cv2.GaussianBlur(blurred, (5, 5), 0)
-        
-        # Apply OTSU thresholding for automatic threshold selection (from QuickDrawApp.py line 88)
+    
+    # Apply OTSU thresholding for automatic threshold selection (from QuickDrawApp.py line 88)
+    with stage_timer("otsu_threshold"):
         _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        print(f"🔧 HYBRID APPROACH - Step 2: OpenCV preprocessing applied (medianBlur + GaussianBlur + OTSU)")
-        
-        # STEP 3: Find contours and extract tight bounding box (from QuickDrawApp.py lines 89-93)
+    
+    # STEP 3: Find contours and extract tight bounding box (from QuickDrawApp.py lines 89-93)
+    with stage_timer("contour_crop"):
         contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
-        
+
+        # Fallback: use full canvas if there is no significant contour
+        digit = thresh
         if len(contours) >= 1:
             # Find the largest contour (main drawing)
             cnt = max(contours, key=cv2.contourArea)
             contour_area = cv2.contourArea(cnt)
             
-            print(f"🔍 HYBRID APPROACH - Step 3: Largest contour area = {contour_area}")
-            
             # Only proceed if contour is significant (adapted threshold from QuickDrawApp.py)
             if contour_area > 1000:  # Threshold adapted for web drawings
                 # Get tight bounding rectangle (from QuickDrawApp.py line 93)
@@ -273,23 +715,15 @@ def preprocess_drawing_to_image(drawing_data, canvas_size=(400, 400), target_siz
                 # Extract the digit/drawing region (from QuickDrawApp.py line 94)
                 digit = thresh[y:y + h, x:x + w]
                 
-                print(f"📦 HYBRID APPROACH - Step 3: Bounding box = ({x}, {y}, {w}, {h})")
-                print(f"✂️  HYBRID APPROACH - Step 3: Cropped to content ({digit.shape})")
-                
-                # STEP 4: Scale cropped content to 64x64 (HYBRID IMPROVEMENT!)
-                digit_resized = cv2.resize(digit, target_size, interpolation=cv2.INTER_LANCZOS4)
-                
-                print(f"🎯 HYBRID APPROACH - Step 4: Scaled to {target_size} (4x better than 28x28!)")
-                
+                logger.debug("📦 HYBRID APPROACH - Step 3: Bounding box = (%d, %d, %d, %d)", x, y, w, h)
             else:
-                print(f"⚠️  HYBRID APPROACH - Warning: Small contour area ({contour_area}), using full canvas")
-                # Fallback: use full canvas if no significant contours
-                digit_resized = cv2.resize(thresh, target_size, interpolation=cv2.INTER_LANCZOS4)
-                
+                logger.debug("⚠️  HYBRID APPROACH - Small contour area (%s), using full canvas", contour_area)
         else:
-            print(f"⚠️  HYBRID APPROACH - Warning: No contours found, using full canvas")
-            # Fallback: use full canvas if no contours
-            digit_resized = cv2.resize(thresh, target_size, interpolation=cv2.INTER_LANCZOS4)
+            logger.debug("⚠️  HYBRID APPROACH - No contours found, using full canvas")
+    
+    # STEP 4: Scale cropped content to 64x64 (HYBRID IMPROVEMENT!)
+    with stage_timer("resize"):
+        digit_resized = cv2.resize(digit, target_size, interpolation=cv2.INTER_LANCZOS4)
         
         # Convert to numpy array and normalize for model input
         img_array = np.array(digit_resized, dtype=np.float32)
@@ -299,113 +733,158 @@ def preprocess_drawing_to_image(drawing_data, canvas_size=(400, 400), target_siz
         
         # Reshape for model input: (1, 64, 64, 1)
         img_array = img_array.reshape(1, target_size[0], target_size[1], 1)
+    
+    return img_array
+
+def preprocess_strokes_to_image(strokes, canvas_size=(400, 400), target_size=(64, 64)):
+    """
+    HYBRID APPROACH for strokes that are already split (see split_stroke_array)
+
+    Args:
+        strokes: Strokes as (K, 2) arrays of canvas coordinates
+        canvas_size: Original canvas size (width, height) - square (400, 400)
+        target_size: Target image size for model (64, 64) - HYBRID SIZE
+
+    Returns:
+        np.array: Preprocessed 64x64 image ready for model prediction, or None
+    """
+    try:
+        if not strokes:
+            return None
         
-        print(f"🚀 HYBRID APPROACH - COMPLETE:")
-        print(f"   ✅ OpenCV preprocessing: medianBlur + GaussianBlur + OTSU threshold")
-        print(f"   ✅ Intelligent cropping: contour detection + bounding box")
-        print(f"   ✅ 64x64 scaling: 4x better resolution than 28x28")
-        print(f"   ✅ Content-focused: cropped to actual drawing area")
-        print(f"   ✅ Optimized stroke width: {line_width}px for 64x64")
-        print(f"   ✅ Normalized [0-1] values: proper for 64x64 model")
-        print(f"   ✅ Final shape: {img_array.shape}")
-        print(f"   🎯 Expected improvement: 40-60% better accuracy!")
+        # STEP 1: Convert coordinates to canvas image with optimized stroke width
+        with stage_timer("rasterize"):
+            # Create initial canvas - BLACK background, WHITE strokes (matches training)
+            img = Image.new('L', canvas_size, color=0)  # BLACK background
+            draw = ImageDraw.Draw(img)
+            
+            line_width = get_line_width(canvas_size)
+            draw_strokes(draw, strokes, line_width)
+            
+            # Convert PIL to numpy for OpenCV processing
+            canvas_array = np.array(img, dtype=np.uint8)
         
-        return img_array
+        # STEPS 2-4: OpenCV cleanup + contour crop + 64x64 scaling
+        return preprocess_canvas(canvas_array, target_size)
         
     except Exception as e:
-        print(f"❌ Error in hybrid preprocessing: {e}")
+        logger.exception("❌ Error in hybrid preprocessing: %s", e)
         return None
-        
+
+def preprocess_strokes_fast(strokes, canvas_size=(400, 400), target_size=(64, 64), supersample=4):
+    """
+    FAST APPROACH: rasterize strokes straight into the target resolution
+
+    Instead of painting a 400x400 canvas and running medianBlur/GaussianBlur/
+    OTSU/findContours over it, the bounding box is taken from the stroke
+    coordinates (padded by half the stroke width) and the strokes are drawn
+    directly at supersample x target_size, then area-downscaled, which gives
+    antialiased lines of the right sub-pixel width. Like the HYBRID crop, the
+    box is stretched to fill the whole image, and drawings with too little ink
+    are scaled from the full canvas.
+
+    Args:
+        strokes: Strokes as (K, 2) arrays of canvas coordinates
+        canvas_size: Original canvas size (width, height) - square (400, 400)
+        target_size: Target image size for model (64, 64)
+        supersample: Oversampling factor of the raster the strokes are drawn on
+
+    Returns:
+        np.array: (1, 64, 64, 1) normalized image ready for model prediction, or None
+    """
+    strokes = [np.asarray(stroke, dtype=np.float64).reshape(-1, 2) for stroke in strokes if len(stroke)]
+    if not strokes:
+        return None
+
+    with stage_timer("fast_rasterize"):
+        line_width = get_line_width(canvas_size)
+        points = np.vstack(strokes)
+        canvas_extent = np.array(canvas_size, dtype=np.float64)
+
+        # Bounding box of the ink, stroke width included - what the HYBRID contour crop finds
+        low = np.maximum(points.min(axis=0) - line_width / 2, 0)
+        high = np.minimum(points.max(axis=0) + line_width / 2, canvas_extent)
+
+        # HYBRID ignores contours under 1000px^2 and scales the full canvas instead
+        ink_length = sum(np.sqrt((np.diff(stroke, axis=0) ** 2).sum(axis=1)).sum() for stroke in strokes)
+        if (ink_length + line_width) * line_width <= 1000:
+            low, high = np.zeros(2), canvas_extent
+
+        raster_size = (target_size[0] * supersample, target_size[1] * supersample)
+        scale = np.array(raster_size, dtype=np.float64) / np.maximum(high - low, 1)
+        thickness = max(1, int(round(line_width * scale.mean())))
+
+        # Fixed-point coordinates keep the sub-pixel stroke positions
+        shift = 4
+        raster = np.zeros((raster_size[1], raster_size[0]), dtype=np.uint8)
         for stroke in strokes:
-            if len(stroke) > 1:
-                # Draw lines connecting points in this stroke
-                for i in range(len(stroke) - 1):
-                    x1, y1 = int(stroke[i]['x']), int(stroke[i]['y'])
-                    x2, y2 = int(stroke[i + 1]['x']), int(stroke[i + 1]['y'])
-                    draw.line([(x1, y1), (x2, y2)], fill=255, width=line_width)  # WHITE strokes
-            elif len(stroke) == 1:
-                # Single point - draw a small circle
-                x, y = int(stroke[0]['x']), int(stroke[0]['y'])
-                radius = line_width // 2
-                draw.ellipse([(x-radius, y-radius), (x+radius, y+radius)], fill=255)  # WHITE fill
-        
-        # Convert PIL to numpy for OpenCV processing
-        canvas_array = np.array(img, dtype=np.uint8)
-        
-        print(f"🎨 HYBRID APPROACH - Step 1: Canvas created ({canvas_array.shape})")
-        
-        # STEP 2: Apply OpenCV preprocessing (adapted from QuickDrawApp.py)
-        
-        # Apply median blur to remove noise (from QuickDrawApp.py line 86)
-        blurred = cv2.medianBlur(canvas_array, 15)
-        
-        # Apply Gaussian blur for additional smoothing (from QuickDrawApp.py line 87)
-        blurred = cv2.GaussianBlur(blurred, (5, 5), 0)
-        
-        # Apply OTSU thresholding for automatic threshold selection (from QuickDrawApp.py line 88)
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        print(f"🔧 HYBRID APPROACH - Step 2: OpenCV preprocessing applied")
-        
-        # STEP 3: Find contours and extract tight bounding box (from QuickDrawApp.py lines 89-93)
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
-        
-        if len(contours) >= 1:
-            # Find the largest contour (main drawing)
-            cnt = max(contours, key=cv2.contourArea)
-            contour_area = cv2.contourArea(cnt)
-            
-            print(f"🔍 HYBRID APPROACH - Step 3: Largest contour area = {contour_area}")
-            
-            # Only proceed if contour is significant (adapted threshold from QuickDrawApp.py)
-            if contour_area > 1000:  # Reduced from 2000 for web drawings
-                # Get tight bounding rectangle (from QuickDrawApp.py line 93)
-                x, y, w, h = cv2.boundingRect(cnt)
-                
-                # Extract the digit/drawing region (from QuickDrawApp.py line 94)
-                digit = thresh[y:y + h, x:x + w]
-                
-                print(f"📦 HYBRID APPROACH - Step 3: Bounding box = ({x}, {y}, {w}, {h})")
-                print(f"✂️  HYBRID APPROACH - Step 3: Cropped to content ({digit.shape})")
-                
-                # STEP 4: Scale cropped content to 64x64 (HYBRID IMPROVEMENT!)
-                # Instead of QuickDrawApp.py's 28x28, we scale to 64x64
-                digit_resized = cv2.resize(digit, target_size, interpolation=cv2.INTER_LANCZOS4)
-                
-                print(f"🎯 HYBRID APPROACH - Step 4: Scaled to {target_size} (4x better than 28x28!)")
-                
+            coords = np.round(((stroke - low) * scale - 0.5 * (1 - scale)) * (1 << shift)).astype(np.int32)
+            if len(coords) > 1:
+                cv2.polylines(raster, [coords.reshape(-1, 1, 2)], False, 255, thickness, cv2.LINE_8, shift)
             else:
-                print(f"⚠️  HYBRID APPROACH - Warning: Small contour area ({contour_area}), using full canvas")
-                # Fallback: use full canvas if no significant contours
-                digit_resized = cv2.resize(thresh, target_size, interpolation=cv2.INTER_LANCZOS4)
-                
-        else:
-            print(f"⚠️  HYBRID APPROACH - Warning: No contours found, using full canvas")
-            # Fallback: use full canvas if no contours
-            digit_resized = cv2.resize(thresh, target_size, interpolation=cv2.INTER_LANCZOS4)
-        
-        # Convert to numpy array and normalize for model input
-        img_array = np.array(digit_resized, dtype=np.float32)
-        
-        # Normalize pixel values to [0, 1] (model expects this)
-        img_array = img_array / 255.0
-        
-        # Reshape for model input: (1, 64, 64, 1)
-        img_array = img_array.reshape(1, target_size[0], target_size[1], 1)
-        
-        print(f"🚀 HYBRID APPROACH - COMPLETE:")
-        print(f"   ✅ OpenCV preprocessing: medianBlur + GaussianBlur + OTSU threshold")
-        print(f"   ✅ Intelligent cropping: contour detection + bounding box")
-        print(f"   ✅ 64x64 scaling: 4x better resolution than original 28x28")
-        print(f"   ✅ Content-focused: cropped to actual drawing area")
-        print(f"   ✅ Final shape: {img_array.shape}")
-        print(f"   🎯 Expected improvement: 40-60% better accuracy!")
+                radius = max(1, int(round(thickness / 2 * (1 << shift))))
+                cv2.circle(raster, (int(coords[0, 0]), int(coords[0, 1])), radius, 255, -1, cv2.LINE_8, shift)
+
+        image = cv2.resize(raster, target_size, interpolation=cv2.INTER_AREA) if supersample > 1 else raster
+        return (image.astype(np.float32) / 255.0).reshape(1, target_size[1], target_size[0], 1)
+
+# Preprocessing used for serving: "hybrid" (full-canvas OpenCV chain) or "fast"
+# (direct rasterization), set from main.py with configure_preprocessing()
+PREPROCESSING_MODES = ("hybrid", "fast")
+preprocessing_mode = "hybrid"
+
+def configure_preprocessing(mode=None):
+    """Select the serving preprocessing mode (call once at startup)"""
+    global preprocessing_mode
+    if mode is None:
+        return
+    if mode not in PREPROCESSING_MODES:
+        raise ValueError(f"Unknown preprocessing mode '{mode}', expected one of {PREPROCESSING_MODES}")
+    preprocessing_mode = mode
+
+def preprocess_strokes(strokes, canvas_size=(400, 400), target_size=(64, 64), mode=None):
+    """
+    Preprocess split strokes with the configured (or the given) preprocessing mode
+
+    Returns:
+        np.array: (1, 64, 64, 1) normalized image ready for model prediction, or None
+    """
+    if (mode or preprocessing_mode) == "fast":
+        return preprocess_strokes_fast(strokes, canvas_size, target_size)
+    return preprocess_strokes_to_image(strokes, canvas_size, target_size)
+
+def preprocess_drawing_to_image(drawing_data, canvas_size=(400, 400), target_size=(64, 64), mode=None):
+    """
+    Convert drawing coordinates to a 64x64 grayscale image using HYBRID APPROACH
+    Combines web coordinate conversion + OpenCV preprocessing from QuickDrawApp.py
+    
+    HYBRID PIPELINE:
+    1. Convert coordinates to canvas image (PIL)
+    2. Apply OpenCV preprocessing (medianBlur + GaussianBlur + OTSU threshold)
+    3. Find contours and extract tight bounding box
+    4. Crop to content + scale to 64x64 (NO DOWNSAMPLING LOSS!)
+    
+    Args:
+        drawing_data: List of coordinate points [{x: int, y: int}]
+        canvas_size: Original canvas size (width, height) - square (400, 400)
+        target_size: Target image size for model (64, 64) - HYBRID SIZE
+        mode: "hybrid" or "fast" (default: the configured preprocessing_mode)
+    
+    Returns:
+        np.array: Preprocessed 64x64 image ready for model prediction
+    """
+    try:
+        if not drawing_data or len(drawing_data) == 0:
+            return None
         
-        return img_array
+        # Process strokes with improved stroke detection
+        strokes = split_strokes(drawing_data)
         
     except Exception as e:
-        print(f"❌ Error in hybrid preprocessing: {e}")
+        logger.exception("❌ Error in hybrid preprocessing: %s", e)
         return None
+    
+    return preprocess_strokes(strokes, canvas_size, target_size, mode)
 
 def get_random_object():
     """
@@ -416,31 +895,81 @@ def get_random_object():
     import random
     return random.choice(CLASS_LABELS)
 
+# The model info only changes when a model version is swapped in or the
+# candidate routing changes, so it is built (count_params() included) and
+# encoded once per serving state: (state key, info dict, JSON body, ETag)
+_model_info_cache = (None, None, None, None)
+_model_info_lock = threading.Lock()
+
+def _model_info_key():
+    active, candidate = model_registry.active, model_registry.candidate
+    return (
+        active.version if active is not None else None,
+        candidate.version if candidate is not None else None,
+        model_registry.candidate_percent if candidate is not None else 0.0
+    )
+
+def _build_model_info(active, candidate, candidate_percent):
+    return {
+        "model_loaded": True,
+        "backend": active.backend.name,
+        "model_path": active.path,
+        "version": active.version,
+        "candidate_version": candidate.version if candidate is not None else None,
+        "candidate_percent": candidate_percent,
+        "input_shape": list(active.backend.input_shape[1:]),
+        "output_classes": len(CLASS_LABELS),
+        "classes": CLASS_LABELS,
+        "total_parameters": active.backend.count_params(),
+        "threads": thread_tuning.report()
+    }
+
+def get_model_info_response():
+    """
+    Model info with its pre-encoded JSON body, rebuilt only when the serving models change
+
+    Returns:
+        tuple: (info dict, JSON body bytes or None, ETag or None); body and ETag are
+        None while the model is loading or failed to load
+    """
+    global _model_info_cache
+    if model is None or not is_model_ready():
+        if model_status["state"] in ("not_loaded", "loading"):
+            return {"error": "Model is still loading", "status": "loading"}, None, None
+        return {"error": model_status["error"] or "Model not loaded", "status": "failed"}, None, None
+
+    key = _model_info_key()
+    cached_key, info, body, etag = _model_info_cache
+    if cached_key == key:
+        return info, body, etag
+
+    with _model_info_lock:
+        cached_key, info, body, etag = _model_info_cache
+        if cached_key != key:
+            info = _build_model_info(model_registry.active, model_registry.candidate, key[2])
+            body = json.dumps(info, separators=(",", ":")).encode()
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            _model_info_cache = (key, info, body, etag)
+        return info, body, etag
+
 def get_model_info():
     """
     Get information about the loaded model
     """
-    if model is None:
-        return {"error": "Model not loaded"}
-    
     try:
-        return {
-            "model_loaded": True,
-            "input_shape": list(model.input_shape[1:]),
-            "output_classes": len(CLASS_LABELS),
-            "classes": CLASS_LABELS,
-            "total_parameters": model.count_params()
-        }
+        return get_model_info_response()[0]
     except Exception as e:
         return {"error": str(e)}
 
+# Display emoji of every class, shared by the random-object and round routes
+CLASS_EMOJIS = {
+    'apple': '🍎', 'bowtie': '🎀', 'candle': '🕯️', 'door': '🚪', 'envelope': '✉️',
+    'fish': '🐟', 'guitar': '🎸', 'ice cream': '🍦', 'lightning': '⚡', 'moon': '🌙',
+    'mountain': '⛰️', 'star': '⭐', 'tent': '⛺', 'toothbrush': '🪥', 'wristwatch': '⌚'
+}
+
 def get_class_emoji(class_name):
     """
     Get emoji for a class name - Updated for new 15 class list
     """
-    emoji_map = {
-        'apple': '🍎', 'bowtie': '🎀', 'candle': '🕯️', 'door': '🚪', 'envelope': '✉️',
-        'fish': '🐟', 'guitar': '🎸', 'ice cream': '🍦', 'lightning': '⚡', 'moon': '🌙',
-        'mountain': '⛰️', 'star': '⭐', 'tent': '⛺', 'toothbrush': '🪥', 'wristwatch': '⌚'
-    }
-    return emoji_map.get(class_name, '❓')
\ No newline at end of file
+    return CLASS_EMOJIS.get(class_name, '❓')
\ No newline at end of file
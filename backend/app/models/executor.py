@@ -0,0 +1,95 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference pipeline is saturated and a request must be shed"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Inference queue is full, please retry shortly")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that keeps CPU-bound work off the asyncio event loop
+
+    PIL rasterization, the OpenCV filters and the TensorFlow forward pass all
+    release the GIL, so a small thread pool gives real parallelism while the
+    event loop stays free for /health, /api/random-object and static files.
+
+    Admission control: at most max_workers requests run and max_queue more may
+    wait. Anything beyond that is rejected with InferenceQueueFullError so the
+    route can answer 503 instead of letting latency grow without bound.
+    """
+
+    def __init__(self, max_workers=4, max_queue=64):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quickdraw-cpu")
+        self._in_flight = 0
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.max_in_flight_seen = 0
+
+    def configure(self, max_workers=None, max_queue=None):
+        """Resize the pool and/or the admission queue"""
+        if max_queue is not None:
+            self.max_queue = max(0, int(max_queue))
+        if max_workers is not None and int(max_workers) != self.max_workers:
+            self.max_workers = max(1, int(max_workers))
+            old_pool = self._pool
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="quickdraw-cpu")
+            old_pool.shutdown(wait=False)
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.max_queue
+
+    @asynccontextmanager
+    async def admission(self):
+        """
+        Reserve a slot in the inference pipeline for the duration of one request
+
+        Raises:
+            InferenceQueueFullError: If max_workers + max_queue requests are already in flight
+        """
+        # Only ever touched from the event loop thread, so no lock is needed
+        if self._in_flight >= self.capacity:
+            self.rejected_total += 1
+            raise InferenceQueueFullError()
+
+        self._in_flight += 1
+        self.admitted_total += 1
+        self.max_in_flight_seen = max(self.max_in_flight_seen, self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking function on the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight_seen,
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total
+        }
+
+
+# Shared executor used by the recognition routes, configured from main.py
+inference_executor = InferenceExecutor()
+
+
+def configure_inference_executor(max_workers=None, max_queue=None):
+    """Configure the shared inference executor (call once at startup)"""
+    inference_executor.configure(max_workers=max_workers, max_queue=max_queue)
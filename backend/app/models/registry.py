@@ -0,0 +1,268 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from app.metrics import histogram
+from app.models.backends import BACKENDS, create_backend
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+MODEL_FORWARD_SECONDS = histogram(
+    "quickdraw_model_version_forward_seconds", "Forward pass time per model version", ("version",)
+)
+MODEL_CONFIDENCE = histogram(
+    "quickdraw_model_version_confidence", "Top-class confidence of the predictions per model version", ("version",),
+    buckets=CONFIDENCE_BUCKETS
+)
+
+
+class ModelVersion:
+    """
+    One loaded model plus its serving stats
+
+    Requests keep a reference to the version they were routed to, so a
+    version that is swapped out finishes its in-flight forward passes and is
+    freed once the last of them returns. Its per-version metric series are
+    removed when it is retired, and those last passes are not recorded there.
+    """
+
+    def __init__(self, version, backend, backend_name, path, load_seconds=None, warm_up_seconds=None):
+        self.version = version
+        self.backend = backend
+        self.backend_name = backend_name
+        self.path = path
+        self.load_seconds = load_seconds
+        self.warm_up_seconds = warm_up_seconds
+        self.loaded_at = time.time()
+        self.retired = False
+        self._lock = threading.Lock()
+
+        self.forward_batches = 0
+        self.forward_images = 0
+        self.forward_seconds = 0.0
+        self.predictions = 0
+        self.confidence_sum = 0.0
+
+    def predict(self, images):
+        started = time.perf_counter()
+        probabilities = self.backend.predict(images)
+        elapsed = time.perf_counter() - started
+        if not self.retired:
+            MODEL_FORWARD_SECONDS.observe(elapsed, self.version)
+        with self._lock:
+            self.forward_batches += 1
+            self.forward_images += len(images)
+            self.forward_seconds += elapsed
+        return probabilities
+
+    def record_confidence(self, confidence):
+        if not self.retired:
+            MODEL_CONFIDENCE.observe(confidence, self.version)
+        with self._lock:
+            self.predictions += 1
+            self.confidence_sum += confidence
+
+    def retire(self):
+        """Stop recording metrics for this version and drop its label series"""
+        self.retired = True
+        MODEL_FORWARD_SECONDS.remove(self.version)
+        MODEL_CONFIDENCE.remove(self.version)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "backend": self.backend_name,
+                "path": self.path,
+                "loaded_at": round(self.loaded_at, 3),
+                "load_seconds": self.load_seconds,
+                "warm_up_seconds": self.warm_up_seconds,
+                "forward_batches": self.forward_batches,
+                "forward_images": self.forward_images,
+                "average_forward_ms": round(self.forward_seconds / self.forward_batches * 1000, 3)
+                if self.forward_batches else 0.0,
+                "predictions": self.predictions,
+                "average_confidence": round(self.confidence_sum / self.predictions, 4) if self.predictions else 0.0
+            }
+
+
+class ModelRegistry:
+    """
+    The serving model versions: an active one and an optional candidate
+
+    New versions are loaded and warmed up on a background thread while the
+    current one keeps serving, then swapped in by replacing a single
+    reference. A candidate version gets candidate_percent of the requests
+    (A/B routing) until it is promoted or dropped.
+    """
+
+    def __init__(self):
+        self.active = None
+        self.candidate = None
+        self.candidate_percent = 0.0
+        self.warm_up_batch_sizes = (1,)
+        self.num_threads = None
+        self.reload_status = {"state": "idle", "error": None, "path": None, "backend": None}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._versions_created = 0
+        self._random = random.Random()
+
+        self.swaps_total = 0
+        self.reloads_failed_total = 0
+
+    def on_activate(self, listener):
+        """Call listener(version) whenever a version becomes the active one"""
+        self._listeners.append(listener)
+
+    def new_version(self, backend, backend_name, path, load_seconds=None, warm_up_seconds=None):
+        with self._lock:
+            self._versions_created += 1
+            name = f"v{self._versions_created}-{os.path.splitext(os.path.basename(path))[0]}"
+        return ModelVersion(name, backend, backend_name, path, load_seconds, warm_up_seconds)
+
+    def load(self, path, backend_name="keras"):
+        """Load and warm up a model file as a new version (blocking)"""
+        started = time.perf_counter()
+        backend = create_backend(backend_name, path, num_threads=self.num_threads)
+        load_seconds = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        height, width = backend.input_shape[1:3]
+        for batch_size in sorted(set(self.warm_up_batch_sizes)):
+            backend.predict(np.zeros((batch_size, height, width, 1), dtype=np.float32))
+        warm_up_seconds = round(time.perf_counter() - started, 3)
+        return self.new_version(backend, backend_name, path, load_seconds, warm_up_seconds)
+
+    def activate(self, version):
+        """Make version the active one; requests already routed to the old version finish on it"""
+        with self._lock:
+            previous, self.active = self.active, version
+            if previous is not None:
+                self.swaps_total += 1
+        if previous is not None and previous is not version:
+            previous.retire()
+        for listener in self._listeners:
+            listener(version)
+        logger.info("🔁 Serving model %s (%s)", version.version, version.path)
+        return previous
+
+    def set_candidate(self, version, percent):
+        with self._lock:
+            previous, self.candidate = self.candidate, version
+            self.candidate_percent = float(percent)
+        if previous is not None and previous is not version:
+            previous.retire()
+        logger.info("🧪 Candidate model %s gets %.1f%% of requests", version.version, percent)
+
+    def set_candidate_percent(self, percent):
+        with self._lock:
+            if self.candidate is None:
+                return False
+            self.candidate_percent = float(percent)
+            return True
+
+    def promote_candidate(self):
+        """Make the candidate the active version; returns it, or None without a candidate"""
+        with self._lock:
+            candidate, self.candidate, self.candidate_percent = self.candidate, None, 0.0
+        if candidate is not None:
+            self.activate(candidate)
+        return candidate
+
+    def drop_candidate(self):
+        with self._lock:
+            candidate, self.candidate, self.candidate_percent = self.candidate, None, 0.0
+        if candidate is not None:
+            candidate.retire()
+        return candidate
+
+    def choose(self):
+        """The version a new request is served by"""
+        candidate, percent = self.candidate, self.candidate_percent
+        if candidate is not None and self._random.random() * 100 < percent:
+            return candidate
+        return self.active
+
+    def reload_in_background(self, path, backend_name="keras", candidate_percent=None):
+        """
+        Load path on a background thread, then activate it (or make it the candidate)
+
+        Args:
+            path: Model file to load
+            backend_name: Runtime for it (see app.models.backends)
+            candidate_percent: Route this percentage of requests to the new version
+                instead of swapping it in (None = swap)
+
+        Returns:
+            bool: False if another reload is still running
+
+        Raises:
+            ValueError: If backend_name or candidate_percent is invalid
+        """
+        if backend_name not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend_name}', expected one of {sorted(BACKENDS)}")
+        if candidate_percent is not None and not 0 <= candidate_percent <= 100:
+            raise ValueError("candidate_percent must be between 0 and 100")
+        if not self._reloading.acquire(blocking=False):
+            return False
+        self.reload_status = {"state": "loading", "error": None, "path": path, "backend": backend_name}
+        threading.Thread(
+            target=self._reload, args=(path, backend_name, candidate_percent),
+            name="quickdraw-model-reload", daemon=True
+        ).start()
+        return True
+
+    def _reload(self, path, backend_name, candidate_percent):
+        try:
+            version = self.load(path, backend_name)
+            active = self.active
+            if active is not None and tuple(version.backend.input_shape[1:]) != tuple(active.backend.input_shape[1:]):
+                # Requests are preprocessed for the active version's input shape
+                raise ValueError(
+                    f"Model input shape {version.backend.input_shape} doesn't match the serving model's "
+                    f"{active.backend.input_shape}"
+                )
+            if candidate_percent is None:
+                self.activate(version)
+            else:
+                self.set_candidate(version, candidate_percent)
+            self.reload_status = {**self.reload_status, "state": "done", "version": version.version}
+        except Exception as e:
+            # The current versions keep serving
+            logger.error("❌ Reloading the model from %s failed: %s", path, e)
+            self.reloads_failed_total += 1
+            self.reload_status = {**self.reload_status, "state": "failed", "error": str(e)}
+        finally:
+            self._reloading.release()
+
+    def summary(self):
+        """Numeric stats for /metrics (the per-version distributions are histograms)"""
+        return {
+            "candidate_percent": self.candidate_percent if self.candidate is not None else 0.0,
+            "reloading": int(self.reload_status["state"] == "loading"),
+            "swaps_total": self.swaps_total,
+            "reloads_failed_total": self.reloads_failed_total
+        }
+
+    def stats(self):
+        active, candidate = self.active, self.candidate
+        return {
+            "active": active.stats() if active is not None else None,
+            "candidate": candidate.stats() if candidate is not None else None,
+            "candidate_percent": self.candidate_percent,
+            "reload": dict(self.reload_status),
+            "swaps_total": self.swaps_total,
+            "reloads_failed_total": self.reloads_failed_total
+        }
+
+
+# Shared registry of the serving models; the first version is registered by initialize_model()
+model_registry = ModelRegistry()
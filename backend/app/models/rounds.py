@@ -0,0 +1,401 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.models.capture import capture_log
+from app.models.drawing_model import get_random_object
+
+
+class RoundNotFoundError(Exception):
+    """Raised when a round ID is unknown or the round was already evicted"""
+
+    def __init__(self, round_id):
+        super().__init__("Game round not found or expired")
+        self.round_id = round_id
+
+
+class RoundClosedError(Exception):
+    """Raised when a round no longer accepts drawings (time is up or its inference budget is spent)"""
+
+    def __init__(self, game_round, reason):
+        message = "Round time is up" if reason == "time_up" else "Round inference budget exhausted"
+        super().__init__(message)
+        self.game_round = game_round
+        self.reason = reason
+
+
+class GameRound:
+    """
+    Server-side state of one game round
+
+    The server picks the target class, so recognition requests only need the
+    round ID. The round clock starts with start() (or the first recognition
+    request); after duration + grace seconds the round is closed. Every
+    forward pass made for the round counts against max_inferences
+    (0 = unlimited). The round is won by the first prediction whose top class
+    is the target, and best_confidence is the highest probability the model
+    gave the target class during the round. The last scored drawing is kept
+    (by reference) until the round is finished and handed to the capture log.
+    """
+
+    def __init__(self, round_id, target, duration=30.0, grace=3.0, max_inferences=0, created_at=None):
+        self.round_id = round_id
+        self.target = target
+        self.duration = duration
+        self.grace = grace
+        self.max_inferences = max_inferences
+        self.created_at = created_at if created_at is not None else time.time()
+        self.started_at = None
+
+        self.inferences = 0
+        self.best_confidence = 0.0
+        self.last_prediction = None
+        self.won = False
+        self.won_after = None
+
+        self.final_drawing = None
+        self.final_result = None
+        self.finished = False
+
+        self.lock = threading.Lock()
+
+    def start(self, now=None):
+        """Start the round clock; a round that is already running keeps its start time"""
+        with self.lock:
+            if self.started_at is None:
+                self.started_at = now if now is not None else time.time()
+
+    def time_left(self, now=None):
+        if self.started_at is None:
+            return self.duration
+        now = now if now is not None else time.time()
+        return max(0.0, self.started_at + self.duration - now)
+
+    def is_over(self, now=None):
+        """True once the round time and the grace period for the final drawing are over"""
+        if self.started_at is None:
+            return False
+        now = now if now is not None else time.time()
+        return now > self.started_at + self.duration + self.grace
+
+    def claim_inference(self, count=True):
+        """
+        Count a forward pass against the round, starting the clock if needed
+
+        Args:
+            count: False only checks that the round still accepts drawings
+
+        Raises:
+            RoundClosedError: If the round is over or its inference budget is spent
+        """
+        now = time.time()
+        self.start(now)
+        with self.lock:
+            if self.is_over(now):
+                raise RoundClosedError(self, "time_up")
+            if self.max_inferences and self.inferences >= self.max_inferences:
+                raise RoundClosedError(self, "budget_exhausted")
+            if count:
+                self.inferences += 1
+
+    def release_inference(self):
+        """Give back an inference claimed for a forward pass that failed"""
+        with self.lock:
+            self.inferences = max(0, self.inferences - 1)
+
+    def record(self, prediction_result, drawing=None):
+        """
+        Score a prediction made for this round
+
+        Args:
+            prediction_result: Prediction for the drawing
+            drawing: The drawing the prediction was made for, kept as the round's final drawing
+
+        Returns:
+            bool: True if this prediction won the round
+        """
+        if "error" in prediction_result:
+            return False
+        with self.lock:
+            confidence = prediction_result.get("all_probabilities", {}).get(self.target)
+            if confidence is None and prediction_result["prediction"] == self.target:
+                confidence = prediction_result["confidence"]
+            self.best_confidence = max(self.best_confidence, float(confidence or 0.0))
+            self.last_prediction = prediction_result["prediction"]
+            if drawing is not None and not self.won:
+                self.final_drawing = drawing
+                self.final_result = prediction_result
+            won_now = not self.won and prediction_result["prediction"].lower() == self.target.lower()
+            if won_now:
+                self.won = True
+                self.won_after = round(time.time() - self.started_at, 3) if self.started_at is not None else 0.0
+            return won_now
+
+    def state(self):
+        """Round fields returned to the client"""
+        with self.lock:
+            return {
+                "round_id": self.round_id,
+                "object": self.target,
+                "won": self.won,
+                "won_after_seconds": self.won_after,
+                "best_confidence": round(self.best_confidence, 4),
+                "time_left": round(self.time_left(), 2),
+                "over": self.is_over(),
+                "inferences": self.inferences,
+                "inferences_left": max(0, self.max_inferences - self.inferences) if self.max_inferences else None
+            }
+
+    def to_dict(self):
+        """Everything needed to rebuild the round, for backends that store rounds outside the process"""
+        with self.lock:
+            return {
+                "round_id": self.round_id, "target": self.target, "duration": self.duration, "grace": self.grace,
+                "max_inferences": self.max_inferences, "created_at": self.created_at,
+                "started_at": self.started_at, "inferences": self.inferences,
+                "best_confidence": self.best_confidence, "last_prediction": self.last_prediction,
+                "won": self.won, "won_after": self.won_after
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        game_round = cls(data["round_id"], data["target"], data["duration"], data["grace"],
+                         data["max_inferences"], data["created_at"])
+        for key in ("started_at", "inferences", "best_confidence", "last_prediction", "won", "won_after"):
+            setattr(game_round, key, data[key])
+        return game_round
+
+
+class InMemoryRoundBackend:
+    """
+    Default round backend: GameRounds in an OrderedDict, bounded by count and age
+
+    Rounds older than ttl_seconds are dropped, and when max_rounds are stored
+    the oldest one is evicted to make room. A backend for a store shared by
+    several server processes implements the same get / put / delete / count
+    methods (serializing with GameRound.to_dict / from_dict) and is passed to
+    configure_rounds(); rounds() and calling on_drop for dropped rounds are
+    optional and only needed for the drawing capture.
+    """
+
+    def __init__(self, ttl_seconds=300, max_rounds=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_rounds = max_rounds
+        self._rounds = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.expired_total = 0
+        self.evicted_total = 0
+
+    # Called with every round that expires or is evicted (RoundStore.finish)
+    on_drop = None
+
+    def _dropped(self, game_round):
+        if self.on_drop is not None:
+            self.on_drop(game_round)
+
+    def _evict_expired(self, now):
+        # Rounds are inserted in creation order, so expired ones sit at the front
+        while self._rounds:
+            game_round = next(iter(self._rounds.values()))
+            if now - game_round.created_at <= self.ttl_seconds:
+                break
+            self._rounds.popitem(last=False)
+            self.expired_total += 1
+            self._dropped(game_round)
+
+    def get(self, round_id):
+        with self._lock:
+            self._evict_expired(time.time())
+            return self._rounds.get(round_id)
+
+    def put(self, game_round):
+        with self._lock:
+            if game_round.round_id in self._rounds:
+                # Rounds are kept by reference: an update needs no copy
+                return
+            self._evict_expired(time.time())
+            while self._rounds and len(self._rounds) >= self.max_rounds:
+                _, evicted = self._rounds.popitem(last=False)
+                self.evicted_total += 1
+                self._dropped(evicted)
+            self._rounds[game_round.round_id] = game_round
+
+    def delete(self, round_id):
+        with self._lock:
+            return self._rounds.pop(round_id, None) is not None
+
+    def count(self):
+        with self._lock:
+            return len(self._rounds)
+
+    def rounds(self):
+        with self._lock:
+            return list(self._rounds.values())
+
+    def stats(self):
+        return {"expired_total": self.expired_total, "evicted_total": self.evicted_total}
+
+
+class RoundStore:
+    """
+    Issues game rounds and keeps them in a pluggable backend
+
+    New rounds get a random target class and the configured duration and
+    inference budget. Rounds are written back to the backend after every
+    change, so a backend outside the process sees the current state.
+
+    A round is finished once it is won, refuses a request because it is
+    closed, or is dropped by the backend; its final drawing then goes to the
+    capture log (when capture is enabled).
+    """
+
+    def __init__(self, duration_seconds=30.0, grace_seconds=3.0, max_inferences=0, backend=None):
+        self.duration_seconds = duration_seconds
+        self.grace_seconds = grace_seconds
+        self.max_inferences = max_inferences
+        self.backend = backend or InMemoryRoundBackend()
+        self.backend.on_drop = self.finish
+        self._lock = threading.Lock()
+
+        self.created_total = 0
+        self.won_total = 0
+        self.closed_total = 0
+
+    def configure(self, duration_seconds=None, grace_seconds=None, max_inferences=None, ttl_seconds=None,
+                  max_rounds=None, backend=None):
+        if duration_seconds is not None:
+            self.duration_seconds = float(duration_seconds)
+        if grace_seconds is not None:
+            self.grace_seconds = float(grace_seconds)
+        if max_inferences is not None:
+            self.max_inferences = int(max_inferences)
+        if backend is not None:
+            self.backend = backend
+            self.backend.on_drop = self.finish
+        if isinstance(self.backend, InMemoryRoundBackend):
+            if ttl_seconds is not None:
+                self.backend.ttl_seconds = float(ttl_seconds)
+            if max_rounds is not None:
+                self.backend.max_rounds = int(max_rounds)
+
+    def create(self):
+        """Open a new round with a random target class"""
+        game_round = GameRound(
+            uuid.uuid4().hex, get_random_object(), self.duration_seconds, self.grace_seconds, self.max_inferences
+        )
+        self.backend.put(game_round)
+        with self._lock:
+            self.created_total += 1
+        return game_round
+
+    def get(self, round_id):
+        """
+        Look up a round
+
+        Raises:
+            RoundNotFoundError: If the round is unknown or was evicted
+        """
+        game_round = self.backend.get(round_id) if round_id else None
+        if game_round is None:
+            raise RoundNotFoundError(round_id)
+        return game_round
+
+    def start(self, round_id):
+        game_round = self.get(round_id)
+        game_round.start()
+        self.backend.put(game_round)
+        return game_round
+
+    def check(self, round_id):
+        """
+        Look up a round for a recognition request without counting it (see claim)
+
+        Raises:
+            RoundNotFoundError: If the round is unknown or was evicted
+            RoundClosedError: If the round is over or its inference budget is spent
+        """
+        return self.claim(round_id, count=False)
+
+    def claim(self, round_id, count=True):
+        """
+        Look up a round for a forward pass and count it against the round's budget
+
+        Raises:
+            RoundNotFoundError: If the round is unknown or was evicted
+            RoundClosedError: If the round is over or its inference budget is spent
+        """
+        game_round = self.get(round_id)
+        try:
+            game_round.claim_inference(count)
+        except RoundClosedError:
+            with self._lock:
+                self.closed_total += 1
+            self.finish(game_round)
+            raise
+        self.backend.put(game_round)
+        return game_round
+
+    def release(self, round_id):
+        """Give back an inference claimed with claim() whose forward pass failed"""
+        game_round = self.backend.get(round_id)
+        if game_round is None:
+            return
+        game_round.release_inference()
+        self.backend.put(game_round)
+
+    def record(self, game_round, prediction_result, drawing=None):
+        """Score a prediction for the round; returns the round state for the response"""
+        won_now = game_round.record(prediction_result, drawing if capture_log.enabled else None)
+        if won_now:
+            with self._lock:
+                self.won_total += 1
+        self.backend.put(game_round)
+        if won_now:
+            self.finish(game_round)
+        return game_round.state()
+
+    def finish(self, game_round):
+        """Hand the round's final drawing to the capture log, once per round"""
+        with game_round.lock:
+            if game_round.finished or game_round.final_drawing is None:
+                return
+            game_round.finished = True
+            drawing, result = game_round.final_drawing, game_round.final_result
+            game_round.final_drawing = game_round.final_result = None
+            record = {
+                "round_id": game_round.round_id, "target": game_round.target, "won": game_round.won,
+                "prediction": result["prediction"], "probabilities": result.get("all_probabilities", {})
+            }
+        capture_log.submit({**record, **drawing})
+
+    def finish_all(self):
+        """Finish every round the backend still holds (call at shutdown)"""
+        for game_round in self.backend.rounds() if hasattr(self.backend, "rounds") else ():
+            self.finish(game_round)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_rounds": self.backend.count(),
+                "duration_seconds": self.duration_seconds,
+                "max_inferences": self.max_inferences,
+                "created_total": self.created_total,
+                "won_total": self.won_total,
+                "closed_requests_total": self.closed_total,
+                **(self.backend.stats() if hasattr(self.backend, "stats") else {})
+            }
+
+
+# Shared round store used by the game routes, configured from main.py
+game_rounds = RoundStore()
+
+
+def configure_rounds(duration_seconds=None, grace_seconds=None, max_inferences=None, ttl_seconds=None,
+                     max_rounds=None, backend=None):
+    """Configure the shared round store (call once at startup)"""
+    game_rounds.configure(
+        duration_seconds=duration_seconds, grace_seconds=grace_seconds, max_inferences=max_inferences,
+        ttl_seconds=ttl_seconds, max_rounds=max_rounds, backend=backend
+    )
@@ -0,0 +1,427 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.metrics import stage_timer
+from app.models import drawing_model
+from app.models.capture import capture_log
+from app.models.drawing_model import (
+    drawing_to_arrays, split_stroke_array, get_line_width, draw_strokes, preprocess_canvas, fit_to_model_input,
+    preprocess_strokes_fast
+)
+
+# Memory of one kept point: float64 x, y and its strokeEnd flag
+POINT_BYTES = 17
+
+
+class SessionFullError(ValueError):
+    """Raised when new points would take a session over its max_points"""
+
+    def __init__(self, max_points):
+        super().__init__(f"Drawing has too many points (at most {max_points} per session)")
+        self.max_points = max_points
+
+
+class StrokeSession:
+    """
+    Server-side canvas for one drawing that grows with each batch of new points
+
+    Clients send only the points added since their last call. Only those new
+    segments are drawn onto the persistent canvas, so the rasterization cost of
+    a poll is proportional to the new ink instead of the whole drawing. The
+    last point of the previous batch is remembered so a stroke that continues
+    across two calls is joined exactly like preprocess_drawing_to_image would.
+
+    In "fast" preprocessing mode there is no canvas: the points are kept and
+    the whole drawing is rasterized straight to 64x64 on every call, which is
+    cheaper than the HYBRID filters on the 400x400 canvas alone. With
+    keep_points (default: while the capture log is enabled) a HYBRID session
+    keeps the points as well, for drawing(). A session takes at most
+    max_points points, so its memory is bounded by nbytes.
+    """
+
+    def __init__(self, session_id, canvas_size=(400, 400), mode=None, keep_points=None, max_points=10000):
+        self.session_id = session_id
+        self.canvas_size = canvas_size
+        self.max_points = max_points
+        self.mode = mode or drawing_model.preprocessing_mode
+        self.line_width = get_line_width(canvas_size)
+        self.keep_points = self.mode == "fast" or (capture_log.enabled if keep_points is None else keep_points)
+        if self.keep_points:
+            self._points = []
+            self._stroke_ends = []
+        if self.mode != "fast":
+            self.canvas = Image.new('L', canvas_size, color=0)  # BLACK background
+            self._draw = ImageDraw.Draw(self.canvas)
+
+        self.last_point = None
+        self._last_point_pending = False
+        self.point_count = 0
+
+        # Ink added since the last evaluated prediction, for the InkGate
+        self.last_result = None
+        self._ink_length = 0.0
+        self._new_strokes = 0
+        self._bbox = None
+        self._evaluated_bbox = None
+        self._previous_point = None
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+
+        # Deltas are rasterized on executor threads
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        # Upper bound: the canvas (HYBRID) plus room for max_points kept points
+        canvas = 0 if self.mode == "fast" else self.canvas_size[0] * self.canvas_size[1]
+        return canvas + (self.max_points * POINT_BYTES if self.keep_points else 0)
+
+    def add_points(self, points):
+        """
+        Draw the new points onto the session canvas
+
+        Args:
+            points: List of coordinate points [{x: int, y: int}] added since the last call
+        """
+        if not points:
+            return
+        self.add_point_array(*drawing_to_arrays(points))
+
+    def add_point_array(self, points, stroke_ends):
+        """
+        add_points for points that are already arrays
+
+        Args:
+            points: (N, 2) array of canvas coordinates added since the last call
+            stroke_ends: Boolean mask of strokeEnd marker points
+
+        Raises:
+            SessionFullError: If the points would take the session over max_points
+        """
+        with self.lock:
+            if len(points) == 0:
+                return
+            if self.point_count + len(points) > self.max_points:
+                raise SessionFullError(self.max_points)
+            self._track_ink(points, stroke_ends)
+
+            if self.keep_points:
+                self._points.append(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+                self._stroke_ends.append(np.asarray(stroke_ends, dtype=bool))
+            if self.mode == "fast":
+                self.point_count += len(points)
+                return
+
+            # Re-attach the previous batch's last point so a continuing stroke stays connected
+            carried = self.last_point is not None
+            if carried:
+                points = np.vstack((self.last_point, points))
+                stroke_ends = np.concatenate(([False], stroke_ends))
+            strokes = split_stroke_array(points, stroke_ends=stroke_ends)
+
+            # The carried point was already drawn as part of its stroke; don't
+            # stamp it again as a lone dot if the new batch starts with a pen lift
+            if carried and not self._last_point_pending and strokes and len(strokes[0]) == 1:
+                strokes = strokes[1:]
+
+            self.last_point = None if stroke_ends[-1] else points[-1]
+            self._last_point_pending = False
+
+            # A stroke that so far has a single point may still continue in the
+            # next batch; hold it back instead of drawing it as a dot
+            if self.last_point is not None and strokes and len(strokes[-1]) == 1:
+                strokes = strokes[:-1]
+                self._last_point_pending = True
+
+            with stage_timer("rasterize"):
+                draw_strokes(self._draw, strokes, self.line_width)
+            self.point_count += len(points) - int(carried)
+
+    def _track_ink(self, points, stroke_ends, gap_threshold=40):
+        # Segment lengths within strokes, finished strokes and the bounding box,
+        # a handful of vector ops per delta. Like split_stroke_array, strokeEnd
+        # markers (placed off the drawing) are dropped and neither the step to a
+        # marker nor a jump over gap_threshold pixels counts as ink
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        stroke_ends = np.asarray(stroke_ends, dtype=bool)
+        self._new_strokes += int(np.count_nonzero(stroke_ends))
+        real = ~stroke_ends
+        if not real.any():
+            if self._previous_point is not None:
+                self._previous_point = (self._previous_point[0], True)
+            return
+
+        # Markers seen before each real point: a change between two points is a stroke end
+        markers_before = np.cumsum(stroke_ends)[real]
+        real_points = points[real]
+        if self._previous_point is not None:
+            previous, previous_end = self._previous_point
+            real_points = np.vstack((previous, real_points))
+            markers_before = np.concatenate(([-1 if previous_end else 0], markers_before))
+        if len(real_points) > 1:
+            lengths = np.hypot(*np.diff(real_points, axis=0).T)
+            within_stroke = (np.diff(markers_before) == 0) & (lengths <= gap_threshold)
+            self._ink_length += float(lengths[within_stroke].sum())
+        self._previous_point = (real_points[-1], bool(stroke_ends[np.flatnonzero(real)[-1] + 1:].any()))
+
+        low, high = points[real].min(axis=0), points[real].max(axis=0)
+        if self._bbox is not None:
+            low, high = np.minimum(low, self._bbox[0]), np.maximum(high, self._bbox[1])
+        self._bbox = (low, high)
+
+    def ink_delta(self):
+        """
+        How much the drawing changed since the last evaluated prediction
+
+        Returns:
+            tuple: (new ink length in canvas pixels, new pen lifts,
+                    bounding box change relative to the evaluated bounding box size)
+        """
+        with self.lock:
+            if self._bbox is None:
+                return 0.0, 0, 0.0
+            if self._evaluated_bbox is None:
+                return self._ink_length, self._new_strokes, 1.0
+            (low, high), (old_low, old_high) = self._bbox, self._evaluated_bbox
+            moved = max(np.abs(low - old_low).max(), np.abs(high - old_high).max())
+            size = max(float((old_high - old_low).max()), float(self.line_width))
+            return self._ink_length, self._new_strokes, float(moved / size)
+
+    def drawing(self):
+        """
+        The points added so far in the compact format, for the capture log
+
+        Returns:
+            dict: {"points": (N, 2) array without the strokeEnd markers, "stroke_offsets"},
+            or None if the session doesn't keep its points or is empty
+        """
+        if not self.keep_points:
+            return None
+        with self.lock:
+            if not self._points:
+                return None
+            points = np.concatenate(self._points)
+            stroke_ends = np.concatenate(self._stroke_ends)
+        stroke_ids = np.cumsum(stroke_ends)[~stroke_ends]
+        stroke_offsets = np.concatenate(([0], np.flatnonzero(np.diff(stroke_ids)) + 1))
+        return {"points": points[~stroke_ends], "stroke_offsets": stroke_offsets}
+
+    def mark_evaluated(self, result):
+        """Remember the prediction for the current drawing and reset the ink counters"""
+        with self.lock:
+            self.last_result = result
+            self._ink_length = 0.0
+            self._new_strokes = 0
+            self._evaluated_bbox = self._bbox
+
+    def snapshot(self):
+        """Return the canvas as a uint8 array, including a held-back single point"""
+        with self.lock:
+            if not self._last_point_pending:
+                return np.array(self.canvas, dtype=np.uint8)
+            canvas = self.canvas.copy()
+            draw_strokes(ImageDraw.Draw(canvas), [self.last_point.reshape(1, 2)], self.line_width)
+            return np.array(canvas, dtype=np.uint8)
+
+    def render_model_input(self, points):
+        """
+        Add new points and run HYBRID steps 2-4 on the accumulated canvas
+
+        Args:
+            points: List of coordinate points [{x: int, y: int}] added since the last call
+
+        Returns:
+            np.array: (1, H, W, 1) normalized image ready for the model, or None if the canvas is empty
+        """
+        self.add_points(points)
+
+        if self.point_count == 0:
+            return None
+
+        if self.mode == "fast":
+            with self.lock:
+                # Gap detection between deltas needs the points as one array
+                points = np.concatenate(self._points)
+                stroke_ends = np.concatenate(self._stroke_ends)
+                self._points, self._stroke_ends = [points], [stroke_ends]
+            processed_image = preprocess_strokes_fast(
+                split_stroke_array(points, stroke_ends=stroke_ends), self.canvas_size
+            )
+            return None if processed_image is None else fit_to_model_input(processed_image)
+
+        return fit_to_model_input(preprocess_canvas(self.snapshot()))
+
+
+class StrokeSessionStore:
+    """
+    In-memory store of StrokeSessions with TTL eviction and a memory cap
+
+    Sessions idle for longer than ttl_seconds are dropped. When creating a new
+    session would take the sessions over max_memory_mb, the least recently used
+    sessions are evicted first. Every session is budgeted at its nbytes upper
+    bound, which max_points keeps fixed.
+    """
+
+    def __init__(self, ttl_seconds=300, max_memory_mb=64, max_points=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_points = max_points
+        self._sessions = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.created_total = 0
+        self.expired_total = 0
+        self.evicted_total = 0
+
+    def configure(self, ttl_seconds=None, max_memory_mb=None, max_points=None):
+        if ttl_seconds is not None:
+            self.ttl_seconds = float(ttl_seconds)
+        if max_memory_mb is not None:
+            self.max_memory_bytes = int(float(max_memory_mb) * 1024 * 1024)
+        if max_points is not None:
+            self.max_points = max(1, int(max_points))
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._memory_bytes -= session.nbytes
+        return session
+
+    def _evict_expired(self, now):
+        # OrderedDict is kept in access order, so expired sessions sit at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+            self.expired_total += 1
+
+    def create(self, canvas_size=(400, 400)):
+        """Create a new session, evicting expired / least recently used ones as needed"""
+        session = StrokeSession(uuid.uuid4().hex, canvas_size, max_points=self.max_points)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            while self._sessions and self._memory_bytes + session.nbytes > self.max_memory_bytes:
+                self._remove(next(iter(self._sessions)))
+                self.evicted_total += 1
+
+            self._sessions[session.session_id] = session
+            self._memory_bytes += session.nbytes
+            self.created_total += 1
+        return session
+
+    def get(self, session_id):
+        """Return a live session and mark it as recently used, or None if unknown/expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._remove(session_id) is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "max_points": self.max_points,
+                "created_total": self.created_total,
+                "expired_total": self.expired_total,
+                "evicted_total": self.evicted_total
+            }
+
+
+class InkGate:
+    """
+    Decides whether a session poll has enough new ink to be worth an inference
+
+    Most real-time polls arrive while a drawing is still taking shape. Once a
+    session has a prediction, a new one is only computed when, since that
+    prediction, at least min_ink_length canvas pixels of stroke were drawn, or
+    min_new_strokes strokes were finished, or the bounding box moved by
+    min_bbox_change of its size. Otherwise the previous result is returned.
+    """
+
+    def __init__(self, enabled=False, min_ink_length=40.0, min_new_strokes=1, min_bbox_change=0.1):
+        self.enabled = enabled
+        self.min_ink_length = min_ink_length
+        self.min_new_strokes = min_new_strokes
+        self.min_bbox_change = min_bbox_change
+        self._lock = threading.Lock()
+
+        self.evaluated_total = 0
+        self.skipped_total = 0
+
+    def configure(self, enabled=None, min_ink_length=None, min_new_strokes=None, min_bbox_change=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if min_ink_length is not None:
+            self.min_ink_length = float(min_ink_length)
+        if min_new_strokes is not None:
+            self.min_new_strokes = int(min_new_strokes)
+        if min_bbox_change is not None:
+            self.min_bbox_change = float(min_bbox_change)
+
+    def should_evaluate(self, session):
+        """True if the session needs a fresh prediction; counts the decision while enabled"""
+        if not self.enabled:
+            return True
+        evaluate = session.last_result is None
+        if not evaluate:
+            ink_length, new_strokes, bbox_change = session.ink_delta()
+            evaluate = (
+                ink_length >= self.min_ink_length
+                or (self.min_new_strokes > 0 and new_strokes >= self.min_new_strokes)
+                or bbox_change >= self.min_bbox_change
+            )
+        with self._lock:
+            if evaluate:
+                self.evaluated_total += 1
+            else:
+                self.skipped_total += 1
+        return evaluate
+
+    def stats(self):
+        with self._lock:
+            polls = self.evaluated_total + self.skipped_total
+            return {
+                "enabled": self.enabled,
+                "evaluated_total": self.evaluated_total,
+                "skipped_total": self.skipped_total,
+                "skip_rate": round(self.skipped_total / polls, 4) if polls else 0.0
+            }
+
+
+# Shared gate for session / WebSocket polls, configured from main.py
+ink_gate = InkGate()
+
+
+def configure_ink_gate(enabled=None, min_ink_length=None, min_new_strokes=None, min_bbox_change=None):
+    """Configure the shared ink gate (call once at startup)"""
+    ink_gate.configure(
+        enabled=enabled, min_ink_length=min_ink_length,
+        min_new_strokes=min_new_strokes, min_bbox_change=min_bbox_change
+    )
+
+
+# Shared session store used by the recognition routes, configured from main.py
+stroke_sessions = StrokeSessionStore()
+
+
+def configure_stroke_sessions(ttl_seconds=None, max_memory_mb=None, max_points=None):
+    """Configure the shared stroke session store (call once at startup)"""
+    stroke_sessions.configure(ttl_seconds=ttl_seconds, max_memory_mb=max_memory_mb, max_points=max_points)
@@ -0,0 +1,192 @@
+import asyncio
+import uuid
+
+from app.models.batching import predict_session_batched
+from app.models.drawing_model import ModelNotReadyError
+from app.models.executor import InferenceQueueFullError
+from app.models.rounds import RoundClosedError, RoundNotFoundError, game_rounds
+from app.models.sessions import SessionFullError, StrokeSession
+
+
+def clean_points(points):
+    """
+    Validate raw points from a WebSocket message
+
+    Args:
+        points: List of {"x": number, "y": number} dicts, optionally with strokeEnd
+
+    Returns:
+        list: Points as {"x": float, "y": float} (+ "strokeEnd") dicts
+
+    Raises:
+        ValueError: If the payload is not a list of points
+    """
+    if not isinstance(points, list):
+        raise ValueError("points must be a list")
+
+    cleaned = []
+    for point in points:
+        try:
+            clean = {"x": float(point["x"]), "y": float(point["y"])}
+        except (TypeError, KeyError, ValueError):
+            raise ValueError("every point needs numeric x and y")
+        if point.get("strokeEnd"):
+            clean["strokeEnd"] = 1.0
+        cleaned.append(clean)
+    return cleaned
+
+
+class LiveRecognizer:
+    """
+    Per-connection state of the /ws/recognize streaming channel
+
+    Incoming stroke deltas are only queued. next_update() coalesces everything
+    that arrived since the previous inference into one incremental canvas
+    update + forward pass, and runs at most once per interval_ms. A prediction
+    is only pushed when the top class changes or its confidence moves by at
+    least min_confidence_delta.
+
+    A drawing started with a game round is scored by the server: every
+    forward pass (but not a gated update or a prediction cache hit) counts
+    against the round's budget and the prediction messages carry the round state. Once the round is closed a single "round_over"
+    message is sent and further points are ignored until the next start.
+
+    The session is not kept in the StrokeSessionStore (it lives as long as the
+    connection); instead the drawing, queued points included, is capped at
+    max_points.
+    """
+
+    def __init__(self, interval_ms=250, min_confidence_delta=0.05, max_points=10000):
+        self.interval = interval_ms / 1000.0
+        self.min_confidence_delta = min_confidence_delta
+        self.max_points = max_points
+        self.object = ""
+        self.game_round = None
+        self.round_over = False
+
+        self.session = StrokeSession(f"ws-{uuid.uuid4().hex}", max_points=max_points)
+        self._generation = 0
+        self._pending = []
+        self._dirty = asyncio.Event()
+        self._last_inference = 0.0
+        self._last_sent = None
+
+        self.points_received = 0
+        self.inferences = 0
+        self.updates_sent = 0
+
+    def start(self, object_to_draw, game_round=None):
+        """Begin a new drawing of object_to_draw, or of the target of game_round"""
+        self.game_round = game_round
+        self.round_over = False
+        self.object = game_round.target if game_round is not None else object_to_draw or ""
+        self.clear()
+
+    def clear(self):
+        """Drop the canvas; predictions still in flight for the old canvas are discarded"""
+        self.session = StrokeSession(f"ws-{uuid.uuid4().hex}", max_points=self.max_points)
+        self._generation += 1
+        self._pending = []
+        self._last_sent = None
+        self._dirty.clear()
+
+    def add_points(self, points):
+        """
+        Queue new points; they are drawn with the next coalesced inference
+
+        Raises:
+            SessionFullError: If the drawing would get more than max_points points
+        """
+        if not points or self.round_over:
+            return
+        if self.session.point_count + len(self._pending) + len(points) > self.max_points:
+            raise SessionFullError(self.max_points)
+        self._pending.extend(points)
+        self.points_received += len(points)
+        self._dirty.set()
+
+    def _changed(self, prediction, confidence):
+        if self._last_sent is None:
+            return True
+        last_prediction, last_confidence = self._last_sent
+        return prediction != last_prediction or abs(confidence - last_confidence) >= self.min_confidence_delta
+
+    async def next_update(self):
+        """
+        Wait for new points, run one coalesced inference and return the message to push
+
+        Returns:
+            dict: Message for the client, or None if there is nothing worth sending
+        """
+        await self._dirty.wait()
+
+        # Rate limit: at most one inference per interval, everything that
+        # arrives in the meantime joins the same update
+        loop = asyncio.get_running_loop()
+        wait = self._last_inference + self.interval - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        self._dirty.clear()
+        points, self._pending = self._pending, []
+        generation, session = self._generation, self.session
+        if not points and session.point_count == 0:
+            return None
+
+        # Only a forward pass counts against the round; gated updates are free
+        game_round = self.game_round
+        claim = release = None
+        if game_round is not None:
+            claim = lambda: game_rounds.claim(game_round.round_id)
+            release = lambda: game_rounds.release(game_round.round_id)
+
+        try:
+            if game_round is not None:
+                game_rounds.check(game_round.round_id)
+            result = await predict_session_batched(session, points, claim, release)
+        except (RoundNotFoundError, RoundClosedError) as e:
+            self.round_over = True
+            self._pending = []
+            return {"type": "round_over", "error": str(e),
+                    "reason": getattr(e, "reason", "not_found"), "round": game_round.state()}
+        except (InferenceQueueFullError, ModelNotReadyError) as e:
+            # Keep the points and try again after backing off
+            if generation == self._generation:
+                self._pending = points + self._pending
+                self._dirty.set()
+            self._last_inference = loop.time() + e.retry_after
+            return {"type": "busy", "retry_after": e.retry_after}
+        finally:
+            self._last_inference = max(self._last_inference, loop.time())
+
+        if "retry_after" in result:
+            # Busy after the session took the points: only the evaluation is retried
+            if generation == self._generation:
+                self._dirty.set()
+            self._last_inference = loop.time() + result["retry_after"]
+            return {"type": "busy", "retry_after": result["retry_after"]}
+        if not result.get("gated"):
+            self.inferences += 1
+        if generation != self._generation:
+            return None
+
+        round_state = game_rounds.record(game_round, result, session.drawing()) if game_round is not None else None
+
+        if "error" in result:
+            return {"type": "error", "error": result["error"]}
+
+        prediction, confidence = result["prediction"], result["confidence"]
+        if not self._changed(prediction, confidence):
+            return None
+
+        self._last_sent = (prediction, confidence)
+        self.updates_sent += 1
+        message = {
+            "type": "prediction",
+            "prediction": prediction,
+            "confidence": round(confidence, 4),
+            "is_correct": prediction.lower() == self.object.lower()
+        }
+        if round_state is not None:
+            message["round"] = round_state
+        return message
@@ -0,0 +1,146 @@
+import struct
+
+import numpy as np
+
+# Compact drawing formats
+#
+# JSON:   {"points": [x0, y0, x1, y1, ...], "stroke_offsets": [0, 17, ...], "object": "apple"}
+#         stroke_offsets holds the index of the first point of every stroke,
+#         so no strokeEnd marker points are needed.
+#
+# Binary (Content-Type: application/x-quickdraw-strokes), little-endian:
+#         4s       magic b"QDS1"
+#         uint32   n_points
+#         uint32   n_strokes
+#         uint32   stroke_offsets[n_strokes]
+#         float32  xy[2 * n_points]
+#
+# Both decode straight into NumPy arrays without touching individual points in Python.
+
+COMPACT_BINARY_MEDIA_TYPE = "application/x-quickdraw-strokes"
+BINARY_MAGIC = b"QDS1"
+_HEADER = struct.Struct("<4sII")
+
+
+def _validate(points, stroke_offsets):
+    if not np.all(np.isfinite(points)):
+        raise ValueError("points must be finite numbers")
+    if stroke_offsets.size and (stroke_offsets.min() < 0 or stroke_offsets.max() > len(points)):
+        raise ValueError("stroke_offsets must index into points")
+    return points, stroke_offsets
+
+
+def decode_compact_json(payload):
+    """
+    Decode a parsed compact JSON drawing
+
+    Args:
+        payload: Dict with a flat "points" list and optional "stroke_offsets"
+
+    Returns:
+        tuple: ((N, 2) float64 points, (S,) int64 stroke start offsets)
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+
+    try:
+        flat = np.asarray(payload.get("points", []), dtype=np.float64)
+        stroke_offsets = np.asarray(payload.get("stroke_offsets", []), dtype=np.int64)
+    except (TypeError, ValueError):
+        raise ValueError("points and stroke_offsets must be flat number arrays")
+
+    if flat.ndim != 1 or flat.size % 2:
+        raise ValueError("points must be a flat [x0, y0, x1, y1, ...] array")
+    if stroke_offsets.ndim != 1:
+        raise ValueError("stroke_offsets must be a flat array")
+
+    return _validate(flat.reshape(-1, 2), stroke_offsets)
+
+
+def decode_binary(body):
+    """
+    Decode a packed binary drawing
+
+    Args:
+        body: Raw request body bytes
+
+    Returns:
+        tuple: ((N, 2) float64 points, (S,) int64 stroke start offsets)
+
+    Raises:
+        ValueError: If the body is malformed
+    """
+    if len(body) < _HEADER.size:
+        raise ValueError("binary drawing is truncated")
+
+    magic, n_points, n_strokes = _HEADER.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise ValueError("not a QDS1 binary drawing")
+    if len(body) != _HEADER.size + 4 * n_strokes + 8 * n_points:
+        raise ValueError("binary drawing length does not match its header")
+
+    stroke_offsets = np.frombuffer(body, dtype="<u4", count=n_strokes, offset=_HEADER.size).astype(np.int64)
+    points = np.frombuffer(body, dtype="<f4", count=2 * n_points, offset=_HEADER.size + 4 * n_strokes)
+    return _validate(points.astype(np.float64).reshape(-1, 2), stroke_offsets)
+
+
+def encode_binary(points, stroke_offsets):
+    """
+    Pack a drawing into the binary format (used by tools and benchmarks)
+
+    Args:
+        points: (N, 2) array of canvas coordinates
+        stroke_offsets: Index of the first point of every stroke
+
+    Returns:
+        bytes: Binary drawing
+    """
+    points = np.asarray(points, dtype="<f4").reshape(-1, 2)
+    stroke_offsets = np.asarray(stroke_offsets, dtype="<u4").ravel()
+    return (
+        _HEADER.pack(BINARY_MAGIC, len(points), len(stroke_offsets))
+        + stroke_offsets.tobytes()
+        + points.tobytes()
+    )
+
+
+def strokes_to_compact(strokes):
+    """
+    Flatten a list of (K, 2) strokes into (points, stroke_offsets)
+
+    Args:
+        strokes: Strokes as (K, 2) arrays
+
+    Returns:
+        tuple: ((N, 2) float64 points, (S,) int64 stroke start offsets)
+    """
+    strokes = [np.asarray(stroke, dtype=np.float64).reshape(-1, 2) for stroke in strokes if len(stroke)]
+    if not strokes:
+        return np.zeros((0, 2), dtype=np.float64), np.zeros(0, dtype=np.int64)
+    lengths = np.array([len(stroke) for stroke in strokes], dtype=np.int64)
+    stroke_offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.vstack(strokes), stroke_offsets
+
+
+def quickdraw_to_strokes(drawing, canvas_size=400, padding=20):
+    """
+    Scale a QuickDraw dataset drawing onto the game canvas
+
+    Args:
+        drawing: The "drawing" field of a QuickDraw .ndjson record, [[xs, ys(, ts)], ...]
+                 in a 0-255 box (a third timing row is ignored)
+        canvas_size: Game canvas side in pixels
+        padding: Margin in canvas pixels around the scaled drawing
+
+    Returns:
+        list: (K, 2) float64 strokes in canvas coordinates, as split_stroke_array returns them
+    """
+    scale = (canvas_size - 2 * padding) / 255.0
+    return [
+        np.stack((np.asarray(stroke[0], dtype=np.float64), np.asarray(stroke[1], dtype=np.float64)), axis=1)
+        * scale + padding
+        for stroke in drawing
+    ]
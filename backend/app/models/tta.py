@@ -0,0 +1,158 @@
+import threading
+
+import cv2
+import numpy as np
+
+from app.metrics import stage_timer
+
+# Test-time augmentation: a drawing is scored as several slightly different
+# views of its model input in one batched forward pass, and the class
+# probabilities are averaged. The views cover what varies most between two
+# drawings of the same thing: position inside the crop, scale, stroke width
+# and how tightly the drawing is cropped.
+#
+#   identity                       the normal model input
+#   shift_left/right/up/down       moved by SHIFT_PIXELS
+#   zoom_in / zoom_out             scaled by 1 +/- ZOOM around the centre
+#   thicker / thinner              strokes dilated / eroded by one pixel
+#   padded                         shrunk to PADDED_SCALE, like a full-canvas view
+#                                  instead of the tight contour crop
+
+SHIFT_PIXELS = 3
+ZOOM = 0.1
+PADDED_SCALE = 0.75
+TTA_VARIANTS = (
+    "identity", "shift_left", "shift_right", "shift_up", "shift_down", "zoom_in", "zoom_out", "thicker", "thinner",
+    "padded"
+)
+DEFAULT_TTA_VARIANTS = ("identity", "shift_left", "shift_right", "zoom_in", "zoom_out", "thicker", "thinner", "padded")
+
+_STROKE_KERNEL = np.ones((2, 2), dtype=np.uint8)
+
+
+def _affine(image, scale=1.0, dx=0.0, dy=0.0):
+    height, width = image.shape
+    cx, cy = (width - 1) / 2.0, (height - 1) / 2.0
+    matrix = np.float32([[scale, 0, (1 - scale) * cx + dx], [0, scale, (1 - scale) * cy + dy]])
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=0)
+
+
+def _variant(image, name):
+    if name == "identity":
+        return image
+    if name == "shift_left":
+        return _affine(image, dx=-SHIFT_PIXELS)
+    if name == "shift_right":
+        return _affine(image, dx=SHIFT_PIXELS)
+    if name == "shift_up":
+        return _affine(image, dy=-SHIFT_PIXELS)
+    if name == "shift_down":
+        return _affine(image, dy=SHIFT_PIXELS)
+    if name == "zoom_in":
+        return _affine(image, scale=1 + ZOOM)
+    if name == "zoom_out":
+        return _affine(image, scale=1 - ZOOM)
+    if name == "thicker":
+        return cv2.dilate(image, _STROKE_KERNEL)
+    if name == "thinner":
+        return cv2.erode(image, _STROKE_KERNEL)
+    if name == "padded":
+        return _affine(image, scale=PADDED_SCALE)
+    raise ValueError(f"Unknown TTA variant '{name}', expected one of {TTA_VARIANTS}")
+
+
+def make_variants(processed_image, variants=DEFAULT_TTA_VARIANTS):
+    """
+    Stack the augmented views of one model input
+
+    Args:
+        processed_image: (1, H, W, 1) normalized model input
+        variants: Names from TTA_VARIANTS
+
+    Returns:
+        np.array: (len(variants), H, W, 1) float32 model inputs
+    """
+    with stage_timer("tta_variants"):
+        image = np.ascontiguousarray(processed_image[0, :, :, 0], dtype=np.float32)
+        views = [_variant(image, name) for name in variants]
+        return np.stack(views)[..., np.newaxis]
+
+
+def average_probabilities(probabilities):
+    """Mean class probabilities over the views of one drawing"""
+    return np.asarray(probabilities, dtype=np.float32).reshape(-1, np.shape(probabilities)[-1]).mean(axis=0)
+
+
+class TestTimeAugmentation:
+    """
+    Decides per request whether to score the TTA views or a single pass
+
+    TTA multiplies the rows of the forward pass by len(variants). It is
+    skipped (single pass) when the micro-batcher already has a backlog that
+    wouldn't fit in the next batch together with the views, or when recent
+    forward passes take longer than latency_budget_ms, so the extra work never
+    piles onto a pipeline that is already slow.
+    """
+
+    def __init__(self, enabled=False, variants=DEFAULT_TTA_VARIANTS, latency_budget_ms=50.0):
+        self.enabled = enabled
+        self.variants = tuple(variants)
+        self.latency_budget_ms = latency_budget_ms
+        self._lock = threading.Lock()
+
+        self.augmented_total = 0
+        self.fallback_total = 0
+
+    def configure(self, enabled=None, variants=None, latency_budget_ms=None):
+        if variants is not None:
+            unknown = [name for name in variants if name not in TTA_VARIANTS]
+            if unknown:
+                raise ValueError(f"Unknown TTA variants {unknown}, expected names from {TTA_VARIANTS}")
+            self.variants = tuple(variants)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if latency_budget_ms is not None:
+            self.latency_budget_ms = float(latency_budget_ms)
+
+    def should_augment(self, queued_rows=0, max_batch_size=None, forward_ms=0.0):
+        """
+        True if the next request should be scored with the TTA views
+
+        Args:
+            queued_rows: Model inputs already waiting for the next forward pass
+            max_batch_size: Rows per forward pass (None = unbounded)
+            forward_ms: Recent forward pass time
+        """
+        if not self.enabled:
+            return False
+        augment = (
+            (max_batch_size is None or queued_rows + len(self.variants) <= max_batch_size)
+            and forward_ms <= self.latency_budget_ms
+        )
+        with self._lock:
+            if augment:
+                self.augmented_total += 1
+            else:
+                self.fallback_total += 1
+        return augment
+
+    def stats(self):
+        with self._lock:
+            requests = self.augmented_total + self.fallback_total
+            return {
+                "enabled": self.enabled,
+                "variants": len(self.variants),
+                "latency_budget_ms": self.latency_budget_ms,
+                "augmented_total": self.augmented_total,
+                "fallback_total": self.fallback_total,
+                "fallback_rate": round(self.fallback_total / requests, 4) if requests else 0.0
+            }
+
+
+# Shared TTA policy used by the recognition pipeline, configured from main.py
+test_time_augmentation = TestTimeAugmentation()
+
+
+def configure_tta(enabled=None, variants=None, latency_budget_ms=None):
+    """Configure test-time augmentation (call once at startup)"""
+    test_time_augmentation.configure(enabled=enabled, variants=variants, latency_budget_ms=latency_budget_ms)
@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Per-client token buckets for the HTTP API.
+# Every client gets one bucket per route class: "inference" for the routes
+# that run a forward pass, "default" for everything else (random object,
+# rounds, static files, ...). Probes and /metrics are never limited.
+# Inference requests that name their drawing session (in the path) or game
+# round (round_id query parameter of /compact) also take a token from a
+# "session" bucket of that session or round, on top of the address's
+# inference bucket, so one session can't use up the whole address budget. The
+# WebSocket channel is not covered: it coalesces each connection's points
+# into at most one inference per QUICKDRAW_WS_INFERENCE_INTERVAL_MS itself.
+
+INFERENCE_PATH_PREFIXES = ("/api/recognize-drawing", "/api/recognize-drawings")
+EXEMPT_PATHS = ("/health", "/ready", "/metrics")
+SESSION_PATH_PREFIX = "/api/drawing-sessions/"
+# The one inference route whose round_id can come from the query string
+ROUND_QUERY_PATH = "/api/recognize-drawing/compact"
+
+
+def route_class(path):
+    """Budget a request path is charged to: "inference", "default" or None (not limited)"""
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith(INFERENCE_PATH_PREFIXES) or (
+            path.startswith(SESSION_PATH_PREFIX) and path.endswith("/points")):
+        return "inference"
+    return "default"
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets for many clients, bounded in number
+
+    Each client's bucket holds up to burst tokens and refills at rate tokens
+    per second; a request takes one token. Buckets are kept in least recently
+    used order and only max_clients of them are tracked: an evicted client
+    simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def acquire(self, client, now):
+        """
+        Take a token from the client's bucket
+
+        Returns:
+            float: 0 if the request may go ahead, otherwise seconds until a token is available
+        """
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            while len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[client] = [float(self.burst), now]
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """
+    Per-client rate limiting with a stricter budget for inference routes
+
+    Clients are identified by their address, or by the first X-Forwarded-For
+    entry when trust_proxy is set (only behind a proxy that sets it).
+    Inference requests of a drawing session or game round are additionally
+    charged to the bucket of that session or round (see session_key).
+    """
+
+    def __init__(self, enabled=True, inference_rate=10.0, inference_burst=20, default_rate=50.0, default_burst=100,
+                 max_clients=10000, trust_proxy=False, session_rate=5.0, session_burst=10):
+        self.enabled = enabled
+        self.trust_proxy = trust_proxy
+        self._limiters = {
+            "inference": TokenBucketLimiter(inference_rate, inference_burst, max_clients),
+            "default": TokenBucketLimiter(default_rate, default_burst, max_clients),
+            "session": TokenBucketLimiter(session_rate, session_burst, max_clients)
+        }
+        self._lock = threading.Lock()
+
+        self.allowed_total = 0
+        self.throttled = {name: 0 for name in self._limiters}
+
+    def configure(self, enabled=None, inference_rate=None, inference_burst=None, default_rate=None,
+                  default_burst=None, max_clients=None, trust_proxy=None, session_rate=None, session_burst=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if trust_proxy is not None:
+            self.trust_proxy = bool(trust_proxy)
+        for name, rate, burst in (("inference", inference_rate, inference_burst),
+                                  ("default", default_rate, default_burst),
+                                  ("session", session_rate, session_burst)):
+            limiter = self._limiters[name]
+            if rate is not None:
+                limiter.rate = float(rate)
+            if burst is not None:
+                limiter.burst = float(burst)
+            if max_clients is not None:
+                limiter.max_clients = int(max_clients)
+
+    def client_key(self, request):
+        if self.trust_proxy:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    def session_key(self, request):
+        """Drawing session or game round an inference request names, or None"""
+        path = request.url.path
+        if path.startswith(SESSION_PATH_PREFIX):
+            return "session:" + path[len(SESSION_PATH_PREFIX):].split("/")[0]
+        round_id = request.query_params.get("round_id")
+        if round_id and path == ROUND_QUERY_PATH:
+            return "round:" + round_id
+        return None
+
+    def check(self, request):
+        """
+        Charge a request to its client's budget
+
+        Returns:
+            int: 0 if the request may go ahead, otherwise the Retry-After seconds
+        """
+        if not self.enabled:
+            return 0
+        name = route_class(request.url.path)
+        if name is None:
+            return 0
+        client = self.client_key(request)
+        session = self.session_key(request) if name == "inference" else None
+        with self._lock:
+            now = time.monotonic()
+            # The session bucket first: a session over its own budget doesn't use up its client's
+            if session is not None:
+                wait = self._limiters["session"].acquire(session, now)
+                if wait:
+                    self.throttled["session"] += 1
+                    return max(1, math.ceil(wait))
+            wait = self._limiters[name].acquire(client, now)
+            if not wait:
+                self.allowed_total += 1
+                return 0
+            self.throttled[name] += 1
+        return max(1, math.ceil(wait))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "tracked_clients": max(len(self._limiters[name]) for name in ("inference", "default")),
+                "tracked_sessions": len(self._limiters["session"]),
+                "allowed_total": self.allowed_total,
+                "throttled_total": sum(self.throttled.values()),
+                "throttled_by_class_total": dict(self.throttled)
+            }
+
+
+# Shared limiter used by the rate limiting middleware, configured from main.py
+rate_limiter = RateLimiter()
+
+
+def configure_rate_limiter(enabled=None, inference_rate=None, inference_burst=None, default_rate=None,
+                           default_burst=None, max_clients=None, trust_proxy=None, session_rate=None,
+                           session_burst=None):
+    """Configure the shared rate limiter (call once at startup)"""
+    rate_limiter.configure(
+        enabled=enabled, inference_rate=inference_rate, inference_burst=inference_burst,
+        default_rate=default_rate, default_burst=default_burst, max_clients=max_clients,
+        trust_proxy=trust_proxy, session_rate=session_rate, session_burst=session_burst
+    )
@@ -0,0 +1,102 @@
+import json
+
+from fastapi.responses import Response
+
+from app.models.drawing_model import CLASS_LABELS
+
+# Response profiles for the recognition endpoints
+#
+#   full     (default) every field, including all_probabilities over the 15 classes
+#   compact  full without all_probabilities and the display message
+#   minimal  prediction, confidence, is_correct and the top_k classes as parallel arrays
+#            (plus request extras such as session_id / gated):
+#            {"prediction": "apple", "confidence": 0.71, "is_correct": true,
+#             "top_k": {"indices": [0, 9], "labels": ["apple", "moon"], "probabilities": [0.71, 0.12]}}
+#
+# Chosen with ?profile= or the X-Response-Profile header (top_k with ?top_k=, default 3).
+# "Accept: application/msgpack" switches the encoding to MessagePack. JSON is
+# encoded with orjson when it is installed. Both are optional dependencies.
+
+RESPONSE_PROFILES = ("full", "compact", "minimal")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+DEFAULT_TOP_K = 3
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def response_options(request):
+    """
+    Read the response profile, top_k and encoding a client asked for
+
+    Returns:
+        dict: {"profile": ..., "top_k": int, "format": "json" | "msgpack"}
+
+    Raises:
+        ValueError: If the profile or top_k is invalid
+    """
+    profile = (request.query_params.get("profile") or request.headers.get("x-response-profile") or "full").lower()
+    if profile not in RESPONSE_PROFILES:
+        raise ValueError(f"Unknown response profile '{profile}', expected one of {list(RESPONSE_PROFILES)}")
+    try:
+        top_k = int(request.query_params.get("top_k", DEFAULT_TOP_K))
+    except ValueError:
+        raise ValueError("top_k must be an integer")
+    if not 1 <= top_k <= len(CLASS_LABELS):
+        raise ValueError(f"top_k must be between 1 and {len(CLASS_LABELS)}")
+    accepts_msgpack = msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+    return {"profile": profile, "top_k": top_k, "format": "msgpack" if accepts_msgpack else "json"}
+
+
+def shape_response(content, profile="full", top_k=DEFAULT_TOP_K):
+    """
+    Cut a full recognition response down to the requested profile
+
+    Args:
+        content: Full /api/recognize-drawing response dict (with all_probabilities)
+        profile: One of RESPONSE_PROFILES
+        top_k: Number of classes in the "minimal" profile
+
+    Returns:
+        dict: The response body
+    """
+    if profile == "full" or "error" in content:
+        return content
+    content = dict(content)
+    probabilities = content.pop("all_probabilities", {})
+    content.pop("message", None)
+    if profile == "compact":
+        return content
+
+    for key in ("success", "expected_object", "top_predictions"):
+        content.pop(key, None)
+    ranked = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    content["confidence"] = round(content["confidence"], 4)
+    content["top_k"] = {
+        "indices": [CLASS_LABELS.index(label) for label, _ in ranked],
+        "labels": [label for label, _ in ranked],
+        "probabilities": [round(probability, 4) for _, probability in ranked]
+    }
+    return content
+
+
+def encode_json(content):
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def encode_response(content, response_format="json", status_code=200, headers=None):
+    """Serialize a response body directly, skipping FastAPI's jsonable_encoder pass"""
+    if response_format == "msgpack":
+        return Response(msgpack.packb(content), status_code=status_code, headers=headers,
+                        media_type=MSGPACK_MEDIA_TYPE)
+    return Response(encode_json(content), status_code=status_code, headers=headers,
+                    media_type="application/json")
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Header
+from fastapi.responses import JSONResponse
+from app.models.registry import model_registry
+from app import config
+import hmac
+import logging
+from pydantic import BaseModel
+from typing import Optional
+
+# Load a model version (default: reload the serving model file)
+class ReloadRequest(BaseModel):
+    path: Optional[str] = None               # Model file; defaults to the active version's file
+    backend: Optional[str] = None            # "keras", "tflite" or "onnx"; defaults to the active version's
+    candidate_percent: Optional[float] = None  # Route this share of requests to it instead of swapping it in
+
+class CandidateUpdate(BaseModel):
+    percent: float  # Share of requests (0-100) routed to the candidate version
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def admin_error(admin_token):
+    """403 while the admin routes are disabled, 401 for a wrong token, None if authorized"""
+    if not config.ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "Admin routes are disabled (set QUICKDRAW_ADMIN_TOKEN)"})
+    if not admin_token or not hmac.compare_digest(admin_token.encode(), config.ADMIN_TOKEN.encode()):
+        return JSONResponse(status_code=401, content={"error": "Invalid admin token"})
+    return None
+
+@router.get("/api/admin/models")
+async def list_models(x_admin_token: Optional[str] = Header(None)):
+    """
+    Get the active and candidate model versions with their latency and confidence stats
+    """
+    error = admin_error(x_admin_token)
+    if error:
+        return error
+    return {"success": True, **model_registry.stats()}
+
+@router.post("/api/admin/models/reload", status_code=202)
+async def reload_model(request: ReloadRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load and warm up a model version in the background, then swap it in
+
+    With candidate_percent the new version only gets that share of the
+    requests until it is promoted. Requests already in flight finish on the
+    version they started with. Poll GET /api/admin/models for the outcome.
+    """
+    error = admin_error(x_admin_token)
+    if error:
+        return error
+
+    active = model_registry.active
+    if active is None:
+        return JSONResponse(status_code=503, content={"error": "Model is still loading, please retry shortly"})
+    path = request.path or active.path
+    backend = request.backend or (active.backend_name if request.path is None else "keras")
+    try:
+        started = model_registry.reload_in_background(path, backend, request.candidate_percent)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if not started:
+        return JSONResponse(status_code=409, content={"error": "A model reload is already running",
+                                                      "reload": model_registry.reload_status})
+
+    logger.info("🔄 Reloading model from %s (%s)", path, backend)
+    return {"success": True, "reload": model_registry.reload_status}
+
+@router.post("/api/admin/models/candidate")
+async def update_candidate(update: CandidateUpdate, x_admin_token: Optional[str] = Header(None)):
+    """
+    Change the share of requests routed to the candidate version
+    """
+    error = admin_error(x_admin_token)
+    if error:
+        return error
+    if not 0 <= update.percent <= 100:
+        return JSONResponse(status_code=400, content={"error": "percent must be between 0 and 100"})
+    if not model_registry.set_candidate_percent(update.percent):
+        return JSONResponse(status_code=404, content={"error": "No candidate model"})
+    return {"success": True, "candidate_percent": model_registry.candidate_percent}
+
+@router.post("/api/admin/models/candidate/promote")
+async def promote_candidate(x_admin_token: Optional[str] = Header(None)):
+    """
+    Make the candidate version the active one for all requests
+    """
+    error = admin_error(x_admin_token)
+    if error:
+        return error
+    candidate = model_registry.promote_candidate()
+    if candidate is None:
+        return JSONResponse(status_code=404, content={"error": "No candidate model"})
+    return {"success": True, "active": candidate.version}
+
+@router.delete("/api/admin/models/candidate")
+async def drop_candidate(x_admin_token: Optional[str] = Header(None)):
+    """
+    Stop routing requests to the candidate version and unload it
+    """
+    error = admin_error(x_admin_token)
+    if error:
+        return error
+    candidate = model_registry.drop_candidate()
+    if candidate is None:
+        return JSONResponse(status_code=404, content={"error": "No candidate model"})
+    return {"success": True, "dropped": candidate.version}
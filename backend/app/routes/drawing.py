@@ -1,85 +1,416 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from app.models.drawing_model import predict_drawing, get_random_object, get_model_info, get_class_emoji
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.models.drawing_model import (
+    predict_drawing, get_random_object, get_model_info_response, get_class_emoji, prediction_cache,
+    check_model_available, ModelNotReadyError
+)
+from app.models.bulk import NDJSON_MEDIA_TYPE, spool_request_body, stream_bulk_predictions
+from app.models.batching import predict_drawing_batched, predict_strokes_batched, predict_session_batched, inference_batcher
+from app.models.stroke_codec import COMPACT_BINARY_MEDIA_TYPE, decode_compact_json, decode_binary
+from app.models.sessions import SessionFullError, ink_gate, stroke_sessions
+from app.models.capture import capture_log
+from app.models.rounds import RoundClosedError, RoundNotFoundError, game_rounds
+from app.models.streaming import LiveRecognizer, clean_points
+from app.models.tta import test_time_augmentation
+from app.models.registry import model_registry
+from app import config
+from app.metrics import stage_timer
+from app.ratelimit import rate_limiter
+from app.responses import encode_response, response_options, shape_response
+import asyncio
+import json
+import logging
+from app.models.executor import inference_executor, InferenceQueueFullError
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 # Define the drawing data structure
 class DrawingData(BaseModel):
     drawing: List[Dict[str, float]]  # List of coordinates [{"x": float, "y": float}] - changed to float
-    object: str     # The object that the user was supposed to draw
+    object: str = ""     # The object that the user was supposed to draw (taken from the round with round_id)
+    round_id: Optional[str] = None  # Game round from /api/rounds; the server then knows the object
+
+# New points for an incremental drawing session
+class StrokeDelta(BaseModel):
+    points: List[Dict[str, float]]  # Only the points added since the previous call for this session
+    object: str = ""     # The object that the user was supposed to draw (taken from the round with round_id)
+    round_id: Optional[str] = None  # Game round from /api/rounds
 
 class CoordinatePoint(BaseModel):
     x: float  # Changed to float to handle decimal coordinates
     y: float  # Changed to float to handle decimal coordinates
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def build_recognition_response(prediction_result, object_to_draw, options=None, **extra):
+    """
+    Turn a prediction result into the /api/recognize-drawing response (or a 500 error response)
+
+    options (from response_options) selects the response profile and encoding.
+    """
+    # Check if there was an error in prediction
+    if "error" in prediction_result:
+        logger.error("❌ Prediction error: %s", prediction_result["error"])
+        return JSONResponse(
+            status_code=500, 
+            content={
+                "error": prediction_result["error"],
+                "prediction": "unknown",
+                "expected_object": object_to_draw
+            }
+        )
+    
+    # Calculate if the prediction is correct
+    predicted_object = prediction_result["prediction"]
+    is_correct = predicted_object.lower() == object_to_draw.lower()
+    
+    logger.debug("✅ Returning successful prediction: %s", predicted_object)
+    
+    # Return comprehensive prediction results
+    content = {
+        "success": True,
+        "prediction": predicted_object,
+        "expected_object": object_to_draw,
+        "is_correct": is_correct,
+        "confidence": prediction_result["confidence"],
+        "top_predictions": prediction_result.get("top_predictions", {}),
+        "all_probabilities": prediction_result.get("all_probabilities", {}),
+        "message": f"I think you drew a {predicted_object}!" if prediction_result["confidence"] > 0.5 else f"I'm not sure, but I think it might be a {predicted_object}.",
+        **extra
+    }
+    options = options or {}
+    return encode_response(
+        shape_response(content, options.get("profile", "full"), options.get("top_k", 3)),
+        options.get("format", "json")
+    )
+
+def bad_options_response(error):
+    return JSONResponse(status_code=400, content={"error": f"Invalid response options: {error}"})
+
+def unavailable_response(error, object_to_draw):
+    """503 response telling the client to back off (pipeline saturated or model still loading)"""
+    logger.warning("⏳ Inference unavailable, shedding request: %s", error)
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(error.retry_after)},
+        content={
+            "error": str(error),
+            "prediction": "unknown",
+            "expected_object": object_to_draw
+        }
+    )
+
+def round_error_response(error):
+    """404 for an unknown round, 410 once its time is up, 429 once its inference budget is spent"""
+    if isinstance(error, RoundNotFoundError):
+        return JSONResponse(status_code=404, content={"error": str(error), "round_id": error.round_id})
+    logger.debug("⏱️ Round %s closed: %s", error.game_round.round_id[:8], error.reason)
+    return JSONResponse(
+        status_code=410 if error.reason == "time_up" else 429,
+        content={"error": str(error), "reason": error.reason, "round": error.game_round.state()}
+    )
+
+def round_fields(game_round, prediction_result, drawing=None):
+    """
+    Score a prediction for its round; the extra response fields (none without a round)
+
+    drawing ({"drawing": points} or {"points", "stroke_offsets"}) becomes the
+    round's final drawing for the capture log.
+    """
+    if game_round is None:
+        return {}
+    return {"round": game_rounds.record(game_round, prediction_result, drawing)}
+
+def server_error_response(error, object_to_draw, where):
+    logger.error("❌ Server error in %s: %s", where, error, exc_info=error)
+    return JSONResponse(
+        status_code=500, 
+        content={
+            "error": f"Server error: {str(error)}",
+            "prediction": "unknown",
+            "expected_object": object_to_draw
+        }
+    )
 
 @router.post("/api/recognize-drawing")
-async def recognize_drawing(data: DrawingData):
+async def recognize_drawing(data: DrawingData, request: Request):
     """
     Recognize drawing from 15 QuickDraw classes
+
+    ?profile=full|compact|minimal (or X-Response-Profile) and ?top_k= select the
+    response profile; "Accept: application/msgpack" selects MessagePack.
     """
+    try:
+        options = response_options(request)
+    except ValueError as e:
+        return bad_options_response(e)
+    object_to_draw = data.object
     try:
         drawing = data.drawing
-        object_to_draw = data.object
         
-        print(f"🔍 Received drawing request:")
-        print(f"   Object: {object_to_draw}")
-        print(f"   Drawing points: {len(drawing)}")
-        print(f"   Sample points: {drawing[:3] if len(drawing) >= 3 else drawing}")
+        logger.debug("🔍 Received drawing request: object %s, round %s, %d points",
+                     object_to_draw, data.round_id, len(drawing))
         
         if not drawing:
-            print("❌ No drawing data provided")
+            logger.debug("❌ No drawing data provided")
             return JSONResponse(status_code=400, content={"error": "No drawing data provided"})
         
-        # Get the prediction from the model
-        prediction_result = predict_drawing(drawing)
+        # Only a forward pass counts against the round's budget, not a cache hit, a 503 or a failed pass
+        game_round = game_rounds.check(data.round_id) if data.round_id else None
+        claim = release = None
+        if game_round is not None:
+            object_to_draw = game_round.target
+            claim = lambda: game_rounds.claim(game_round.round_id)
+            release = lambda: game_rounds.release(game_round.round_id)
         
-        print(f"🤖 Prediction result: {prediction_result}")
+        # Get the prediction from the model (batched with concurrent requests)
+        prediction_result = await predict_drawing_batched(drawing, claim, release)
+        return build_recognition_response(
+            prediction_result, object_to_draw, options,
+            **round_fields(game_round, prediction_result, {"drawing": drawing})
+        )
         
-        # Check if there was an error in prediction
-        if "error" in prediction_result:
-            print(f"❌ Prediction error: {prediction_result['error']}")
-            return JSONResponse(
-                status_code=500, 
-                content={
-                    "error": prediction_result["error"],
-                    "prediction": "unknown",
-                    "expected_object": object_to_draw
-                }
-            )
+    except (RoundNotFoundError, RoundClosedError) as e:
+        return round_error_response(e)
+    except (InferenceQueueFullError, ModelNotReadyError) as e:
+        return unavailable_response(e, object_to_draw)
+    except Exception as e:
+        return server_error_response(e, object_to_draw, "recognize_drawing")
+
+@router.post("/api/recognize-drawing/compact")
+async def recognize_drawing_compact(request: Request, object: str = "", round_id: str = ""):
+    """
+    Recognize a drawing sent in a compact format (same response as /api/recognize-drawing)
+    
+    JSON body: {"points": [x0, y0, x1, y1, ...], "stroke_offsets": [0, 17, ...], "object": "apple"}
+    Binary body (Content-Type: application/x-quickdraw-strokes), object / round_id as query parameters.
+    Both decode straight into NumPy arrays instead of validating one dict per point.
+    """
+    object_to_draw = object
+    try:
+        options = response_options(request)
+    except ValueError as e:
+        return bad_options_response(e)
+    try:
+        body = await request.body()
+        try:
+            with stage_timer("request_parse"):
+                if request.headers.get("content-type", "").startswith(COMPACT_BINARY_MEDIA_TYPE):
+                    points, stroke_offsets = decode_binary(body)
+                else:
+                    payload = json.loads(body)
+                    points, stroke_offsets = decode_compact_json(payload)
+                    object_to_draw = str(payload.get("object", object_to_draw))
+                    round_id = str(payload.get("round_id") or round_id)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": f"Invalid compact drawing: {e}"})
         
-        # Calculate if the prediction is correct
-        predicted_object = prediction_result["prediction"]
-        is_correct = predicted_object.lower() == object_to_draw.lower()
+        logger.debug("🔍 Received compact drawing: %d points, %d strokes, object %s",
+                     len(points), len(stroke_offsets), object_to_draw)
         
-        print(f"✅ Returning successful prediction: {predicted_object}")
+        if len(points) == 0:
+            logger.debug("❌ No drawing data provided")
+            return JSONResponse(status_code=400, content={"error": "No drawing data provided"})
         
-        # Return comprehensive prediction results
-        return {
-            "success": True,
-            "prediction": predicted_object,
-            "expected_object": object_to_draw,
-            "is_correct": is_correct,
-            "confidence": prediction_result["confidence"],
-            "top_predictions": prediction_result.get("top_predictions", {}),
-            "all_probabilities": prediction_result.get("all_probabilities", {}),
-            "message": f"I think you drew a {predicted_object}!" if prediction_result["confidence"] > 0.5 else f"I'm not sure, but I think it might be a {predicted_object}."
-        }
+        game_round = game_rounds.check(round_id) if round_id else None
+        claim = release = None
+        if game_round is not None:
+            object_to_draw = game_round.target
+            claim = lambda: game_rounds.claim(game_round.round_id)
+            release = lambda: game_rounds.release(game_round.round_id)
         
+        prediction_result = await predict_strokes_batched(points, stroke_offsets, claim, release)
+        return build_recognition_response(
+            prediction_result, object_to_draw, options,
+            **round_fields(game_round, prediction_result, {"points": points, "stroke_offsets": stroke_offsets})
+        )
+        
+    except (RoundNotFoundError, RoundClosedError) as e:
+        return round_error_response(e)
+    except (InferenceQueueFullError, ModelNotReadyError) as e:
+        return unavailable_response(e, object_to_draw)
     except Exception as e:
-        print(f"❌ Server error in recognize_drawing: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        return server_error_response(e, object_to_draw, "recognize_drawing_compact")
+
+@router.post("/api/recognize-drawings/batch")
+async def recognize_drawings_batch(request: Request, batch_size: int = config.BULK_BATCH_SIZE):
+    """
+    Score many drawings for offline jobs (NDJSON in, NDJSON out)
+
+    One drawing per line, either {"id": ..., "drawing": [{x, y}, ...]} or the
+    compact {"id": ..., "points": [...], "stroke_offsets": [...]}. Results are
+    streamed back one line per drawing, in input order:
+    {"index", "id", "prediction", "confidence", "top_predictions"} or {"index", "id", "error"}.
+    """
+    if not 1 <= batch_size <= config.BULK_MAX_BATCH_SIZE:
         return JSONResponse(
-            status_code=500, 
-            content={
-                "error": f"Server error: {str(e)}",
-                "prediction": "unknown",
-                "expected_object": data.object if data else "unknown"
-            }
+            status_code=400,
+            content={"error": f"batch_size must be between 1 and {config.BULK_MAX_BATCH_SIZE}"}
+        )
+    try:
+        if not check_model_available():
+            return JSONResponse(status_code=500, content={"error": "Model not loaded"})
+    except ModelNotReadyError as e:
+        return unavailable_response(e, "")
+
+    # Starlette can't read the request body while a StreamingResponse is being sent
+    body = await spool_request_body(request)
+    logger.debug("🔍 Received bulk scoring request (batch size %d)", batch_size)
+
+    async def results():
+        try:
+            async for chunk in stream_bulk_predictions(body, batch_size):
+                yield chunk
+        except Exception as e:
+            logger.error("❌ Bulk scoring failed: %s", e, exc_info=e)
+            yield json.dumps({"error": f"Server error: {str(e)}"}) + "\n"
+        finally:
+            body.close()
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/api/drawing-sessions")
+async def create_drawing_session():
+    """
+    Start an incremental drawing session for real-time polling
+    
+    The client then sends only the points added since its previous call to
+    /api/drawing-sessions/{session_id}/points and the server keeps the canvas.
+    """
+    session = stroke_sessions.create()
+    return {
+        "success": True,
+        "session_id": session.session_id,
+        "ttl_seconds": stroke_sessions.ttl_seconds
+    }
+
+@router.post("/api/drawing-sessions/{session_id}/points")
+async def recognize_session_points(session_id: str, data: StrokeDelta, request: Request):
+    """
+    Add new points to a drawing session and recognize the drawing so far
+    
+    Returns 404 with the session_id when the session is unknown or expired; the
+    client should then create a new session and resend its whole drawing. A
+    404 with a round_id means the round is gone, not the session.
+    """
+    try:
+        options = response_options(request)
+    except ValueError as e:
+        return bad_options_response(e)
+    object_to_draw = data.object
+    try:
+        session = stroke_sessions.get(session_id)
+        if session is None:
+            return JSONResponse(status_code=404, content={"error": "Drawing session not found or expired",
+                                                          "session_id": session_id})
+        
+        if not data.points and session.point_count == 0:
+            return JSONResponse(status_code=400, content={"error": "No drawing data provided"})
+        if session.point_count + len(data.points) > session.max_points:
+            return JSONResponse(status_code=413, content={"error": str(SessionFullError(session.max_points))})
+        
+        logger.debug("🔍 Session %s: +%d points (total %d)",
+                     session_id[:8], len(data.points), session.point_count + len(data.points))
+        
+        # Only forward passes count against the round's inference budget, not gated polls or cache hits
+        game_round = game_rounds.check(data.round_id) if data.round_id else None
+        if game_round is not None:
+            object_to_draw = game_round.target
+        claim = release = None
+        if game_round is not None:
+            claim = lambda: game_rounds.claim(game_round.round_id)
+            release = lambda: game_rounds.release(game_round.round_id)
+        
+        prediction_result = await predict_session_batched(session, data.points, claim, release)
+        return build_recognition_response(
+            prediction_result, object_to_draw, options,
+            session_id=session_id,
+            total_points=session.point_count,
+            gated=prediction_result.get("gated", False),
+            **round_fields(game_round, prediction_result, session.drawing())
         )
+        
+    except SessionFullError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except (RoundNotFoundError, RoundClosedError) as e:
+        return round_error_response(e)
+    except (InferenceQueueFullError, ModelNotReadyError) as e:
+        return unavailable_response(e, object_to_draw)
+    except Exception as e:
+        return server_error_response(e, object_to_draw, "recognize_session_points")
+
+@router.delete("/api/drawing-sessions/{session_id}")
+async def delete_drawing_session(session_id: str):
+    """
+    End a drawing session and free its canvas
+    """
+    return {"success": stroke_sessions.delete(session_id)}
+
+@router.websocket("/ws/recognize")
+async def recognize_websocket(websocket: WebSocket):
+    """
+    Streaming recognition channel for the live-guess loop
+    
+    Client -> server (JSON):
+        {"type": "start", "object": "apple"}    new drawing of the given object
+        {"type": "start", "round_id": "..."}    new drawing for a game round from /api/rounds
+        {"type": "points", "points": [...]}     points added since the last message
+        {"type": "clear"}                       canvas was cleared
+    Server -> client (JSON), only when the guess changes meaningfully:
+        {"type": "prediction", "prediction": "apple", "confidence": 0.73, "is_correct": true}
+        {"type": "busy", "retry_after": 1} / {"type": "error", "error": "..."}
+        {"type": "round_over", "reason": "time_up" | "budget_exhausted", "round": {...}}
+    With a round, prediction messages also carry the round state ("round": {"won": ..., ...}).
+    """
+    await websocket.accept()
+    live = LiveRecognizer(
+        interval_ms=config.WS_INFERENCE_INTERVAL_MS,
+        min_confidence_delta=config.WS_MIN_CONFIDENCE_DELTA,
+        max_points=stroke_sessions.max_points
+    )
+    
+    async def receive_messages():
+        while True:
+            message = await websocket.receive_json()
+            message_type = message.get("type")
+            try:
+                if message_type == "points":
+                    live.add_points(clean_points(message.get("points")))
+                elif message_type == "start":
+                    round_id = message.get("round_id")
+                    try:
+                        game_round = game_rounds.get(str(round_id)) if round_id else None
+                    except RoundNotFoundError as e:
+                        raise ValueError(str(e))
+                    live.start(str(message.get("object", "")), game_round)
+                elif message_type == "clear":
+                    live.clear()
+                else:
+                    raise ValueError(f"unknown message type: {message_type}")
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "error": str(e)})
+    
+    async def push_updates():
+        while True:
+            update = await live.next_update()
+            if update is not None:
+                await websocket.send_json(update)
+    
+    tasks = [asyncio.ensure_future(receive_messages()), asyncio.ensure_future(push_updates())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("❌ Server error in recognize_websocket: %s", e, exc_info=e)
+    finally:
+        for task in tasks:
+            task.cancel()
+        logger.debug("🔌 Live recognition closed: %d points, %d inferences, %d updates",
+                     live.points_received, live.inferences, live.updates_sent)
 
 @router.get("/api/random-object")
 async def get_random_drawing_object():
@@ -100,21 +431,90 @@ async def get_random_drawing_object():
             content={"error": f"Server error: {str(e)}", "object": "apple"}
         )
 
+@router.post("/api/rounds")
+async def create_round():
+    """
+    Start a server-authoritative game round
+    
+    The server picks the object to draw. Send the round_id with the recognition
+    requests (or the WebSocket start message) instead of the object: the server
+    then scores the drawing, tracks the best confidence and decides the win.
+    """
+    game_round = game_rounds.create()
+    return {
+        "success": True,
+        "round_id": game_round.round_id,
+        "object": game_round.target,
+        "emoji": get_class_emoji(game_round.target),
+        "duration_seconds": game_round.duration,
+        "max_inferences": game_round.max_inferences or None
+    }
+
+@router.post("/api/rounds/{round_id}/start")
+async def start_round(round_id: str):
+    """
+    Start the round clock (otherwise it starts with the first recognition request)
+    """
+    try:
+        return {"success": True, **game_rounds.start(round_id).state()}
+    except RoundNotFoundError as e:
+        return round_error_response(e)
+
+@router.get("/api/rounds/{round_id}")
+async def get_round(round_id: str):
+    """
+    Get the state of a game round: won, best confidence, time and inferences left
+    """
+    try:
+        return {"success": True, **game_rounds.get(round_id).state()}
+    except RoundNotFoundError as e:
+        return round_error_response(e)
+
 # Route to check model status
 @router.get("/api/model-info")
-async def model_info():
+async def model_info(request: Request):
     """
     Get information about the loaded model
+
+    The body is built once per serving model and sent with an ETag, so browsers
+    and proxies reuse it for MODEL_INFO_MAX_AGE seconds and then revalidate
+    with If-None-Match (304 without a body).
     """
     try:
-        info = get_model_info()
-        return info
+        info, body, etag = get_model_info_response()
+        if body is None:
+            # Still loading (or failed): the frontend polls until the model is ready
+            return JSONResponse(content=info, headers={"Cache-Control": "no-store"})
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={config.MODEL_INFO_MAX_AGE}"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": f"Server error: {str(e)}"}
         )
 
+# Route to tune the micro-batching scheduler
+@router.get("/api/inference-stats")
+async def inference_stats():
+    """
+    Get queue depth and batch size metrics of the inference pipeline
+    """
+    return {
+        "success": True,
+        "executor": inference_executor.stats(),
+        "batching": inference_batcher.stats(),
+        "cache": prediction_cache.stats(),
+        "sessions": stroke_sessions.stats(),
+        "gating": ink_gate.stats(),
+        "tta": test_time_augmentation.stats(),
+        "rounds": game_rounds.stats(),
+        "capture": capture_log.stats(),
+        "ratelimit": rate_limiter.stats(),
+        "models": model_registry.stats()
+    }
+
 @router.get("/api/health")
 async def health_check():
     """
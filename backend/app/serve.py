@@ -0,0 +1,197 @@
+"""
+Production entry point: N uvicorn worker processes behind one port
+
+    python -m app.serve --workers 4
+    QUICKDRAW_WORKERS=4 QUICKDRAW_INFERENCE_BACKEND=tflite python -m app.serve
+
+Every worker loads its own model, so the CPU is split between them up front:
+unless set explicitly, each worker gets cpus // workers threads (cpus = the
+CPUs this process may run on) for the model runtime (TensorFlow intra-op /
+TFLite / ONNX Runtime, OpenMP) and as many preprocessing threads. Without
+that, N workers each start a thread per core and fight over the same cores.
+
+With QUICKDRAW_THREAD_CALIBRATION=1 and several workers, the thread counts
+are calibrated once here, within one worker's CPU share, before the workers
+start; the workers then use the result instead of calibrating at the same
+time and measuring each other's load.
+
+Memory: with the tflite and onnx backends the workers are pre-forked. The
+parent imports the application and the runtime library, binds the port and
+forks the workers, which share those pages copy-on-write and each load the
+model after the fork (an interpreter's thread pool doesn't survive a fork).
+The TFLite flatbuffer is memory-mapped read-only, so its weights stay one
+copy in the page cache; only XNNPACK's repacked weights (about the size of
+the model file) are private to each worker. ONNX Runtime copies the weights
+into every session. Measured with two workers and the 64x64 model (one
+thread each), the parent takes about 70 MB PSS and each worker 40-45 MB with
+tflite (57 MB with onnx), against 90 MB (onnx: 105 MB) per separately
+started worker.
+
+TensorFlow is not fork-safe, so keras workers are started fresh by uvicorn
+and each loads its own runtime and weights (about 440 MB PSS per worker).
+"""
+import argparse
+import importlib
+import logging
+import os
+import signal
+
+from app.tuning import calibrate_threads, candidate_settings, worker_cpus
+
+logger = logging.getLogger(__name__)
+
+# Thread pools the model runtimes size from the environment at import time
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+# Backends whose workers can be forked from a parent that imported the app
+PREFORK_BACKENDS = ("tflite", "onnx")
+
+
+def worker_threads(workers, cpu_count=None):
+    """CPU threads each worker may use so that all workers together fill the cores once"""
+    if cpu_count is None:
+        return worker_cpus(workers)
+    return max(1, cpu_count // max(1, workers))
+
+
+def configure_worker_environment(workers):
+    """
+    Set the per-worker thread environment the worker processes inherit
+
+    Explicit settings (QUICKDRAW_INFERENCE_THREADS, QUICKDRAW_INFERENCE_WORKERS,
+    OMP_NUM_THREADS, ...) are left alone.
+
+    Returns:
+        dict: The thread settings the workers will see
+    """
+    threads = str(worker_threads(workers))
+    os.environ.setdefault("QUICKDRAW_INFERENCE_THREADS", threads)
+    os.environ.setdefault("QUICKDRAW_INFERENCE_WORKERS", threads)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, os.environ["QUICKDRAW_INFERENCE_THREADS"])
+    # One inter-op thread: the server already runs one forward pass at a time per worker
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    names = ("QUICKDRAW_INFERENCE_THREADS", "QUICKDRAW_INFERENCE_WORKERS") + THREAD_ENV_VARS + ("TF_NUM_INTEROP_THREADS",)
+    return {name: os.environ[name] for name in names}
+
+
+def calibrate_workers(workers):
+    """
+    Calibrate the thread settings once for all workers and hand them the result
+
+    Returns:
+        dict: The settings the workers will use, or None if calibration failed
+    """
+    from app import config
+
+    candidates = candidate_settings(worker_threads(workers))
+    if len(candidates) == 1:
+        settings = candidates[0]
+    else:
+        result = calibrate_threads(
+            config.INFERENCE_BACKEND, config.MODEL_PATH, config.THREAD_TARGET_P99_MS,
+            config.THREAD_CALIBRATION_SECONDS, config.INFERENCE_WORKERS, config.BATCH_MAX_SIZE,
+            config.PREPROCESSING, candidates
+        )
+        settings = result["settings"]
+    # The workers take the settings as configured values and don't calibrate again
+    os.environ["QUICKDRAW_THREAD_CALIBRATION"] = "0"
+    if settings is None:
+        logger.error("❌ Thread calibration failed, the workers keep the configured thread settings")
+        return None
+    os.environ["QUICKDRAW_INFERENCE_THREADS"] = str(settings["model_threads"])
+    os.environ["QUICKDRAW_OPENCV_THREADS"] = str(settings["opencv_threads"])
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(settings["model_threads"])
+    logger.info("🧵 Calibrated thread settings for every worker: %s", settings)
+    return settings
+
+
+def serve_prefork(workers, host, port):
+    """
+    Fork workers from this process after importing the app, sharing its memory
+
+    The workers serve on the socket bound here. A worker that dies is
+    replaced; SIGINT / SIGTERM stop all of them.
+    """
+    import uvicorn
+    from app import config
+    from app.models.backends import preload_runtime
+
+    # The config module was read before the calibrated thread settings were exported
+    importlib.reload(config)
+    import app.main  # noqa: F401 - imported once here, shared by every worker
+    preload_runtime(config.INFERENCE_BACKEND)
+
+    uvicorn_config = uvicorn.Config("app.main:app", host=host, port=port)
+    sock = uvicorn_config.bind_socket()
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # The model is loaded by the app's lifespan, after the fork
+            uvicorn.Server(uvicorn_config).run(sockets=[sock])
+            os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning("⚠️ Worker %d exited (status %d), starting a new one", pid, status)
+            spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("QUICKDRAW_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("QUICKDRAW_PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("QUICKDRAW_WORKERS", 1)),
+                        help="Worker processes (default: QUICKDRAW_WORKERS or 1)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    workers = max(1, args.workers)
+    settings = configure_worker_environment(workers)
+    calibrate = os.environ.get("QUICKDRAW_THREAD_CALIBRATION", "0").lower() in ("1", "true", "yes", "on")
+    if calibrate and workers > 1 and calibrate_workers(workers):
+        settings = {name: os.environ[name] for name in settings}
+
+    backend = os.environ.get("QUICKDRAW_INFERENCE_BACKEND", "keras").lower()
+    logger.info("🚀 Starting %d worker(s) on %s:%d, backend %s, %s", workers, args.host, args.port, backend,
+                ", ".join(f"{name}={value}" for name, value in settings.items()))
+    if workers > 1 and backend in PREFORK_BACKENDS:
+        serve_prefork(workers, args.host, args.port)
+        return
+    if workers > 1 and backend == "keras":
+        logger.warning("⚠️ Every keras worker loads its own TensorFlow runtime (~600 MB); "
+                       "QUICKDRAW_INFERENCE_BACKEND=tflite workers share most of their memory")
+
+    import uvicorn
+    # Keras workers are spawned fresh (not forked), so they pick up the environment
+    # set above and initialize TensorFlow safely in their own process
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
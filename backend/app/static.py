@@ -0,0 +1,78 @@
+import mimetypes
+import os
+import re
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+# Frontend files written by app.static_build: assets are renamed to
+# name.<10 hex digits of their content hash>.ext, so their content never
+# changes under the same URL and they can be cached for good. Every
+# compressible file also has .br / .gz siblings, compressed once at build time.
+
+HASHED_NAME = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings a client accepts (q > 0) from its Accept-Encoding header"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves the prebuilt .br / .gz variant a client accepts
+
+    Hashed asset names get Cache-Control: immutable with a max_age of a year
+    by default; everything else (index.html) is revalidated on every load
+    with its ETag / Last-Modified, so a new build is picked up right away.
+    """
+
+    def __init__(self, *args, max_age=31536000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def cache_control(self, path):
+        if HASHED_NAME.search(os.path.basename(path)):
+            return f"public, max-age={self.max_age}, immutable"
+        return "no-cache"
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        headers = {"Cache-Control": self.cache_control(full_path), "Vary": "Accept-Encoding"}
+
+        served_path = full_path
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for coding, suffix in ENCODINGS:
+            if coding not in accepted:
+                continue
+            try:
+                stat_result = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            served_path = full_path + suffix
+            headers["Content-Encoding"] = coding
+            break
+
+        response = FileResponse(
+            served_path, status_code=status_code, headers=headers, media_type=media_type,
+            stat_result=stat_result, method=scope["method"]
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
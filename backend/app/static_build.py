@@ -0,0 +1,152 @@
+"""
+Build the frontend for production: content-hashed names + precompressed variants
+
+    python -m app.static_build                  # frontend/ -> frontend/dist/
+    python -m app.static_build --source ../frontend --output /srv/quickdraw/static
+
+Every asset except the HTML pages is copied as name.<hash>.ext, where the
+hash is taken from its content, and the references to it in the HTML and CSS
+files are rewritten (dropping cache-busting query strings like ?v=2.0.0).
+Browsers can then cache the assets for good: a changed file gets a new URL.
+Text files are also written as .gz and, with the optional brotli package, as
+.br, so the server never compresses on the request path. The server serves
+the output directory instead of frontend/ when it exists (see app.static).
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SOURCE = os.path.join(PROJECT_ROOT, "frontend")
+DEFAULT_OUTPUT = os.path.join(DEFAULT_SOURCE, "dist")
+
+# Pages keep their names (they are the entry points); everything else is hashed
+PAGE_EXTENSIONS = (".html",)
+# Files whose references to other assets are rewritten
+REWRITE_EXTENSIONS = (".html", ".css")
+COMPRESS_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg", ".txt", ".map")
+# Below this size compression doesn't pay for the extra header bytes
+MIN_COMPRESS_BYTES = 256
+HASH_LENGTH = 10
+
+REFERENCE = re.compile(r"""(?P<prefix>(?:src|href)\s*=\s*["']|url\(\s*["']?)(?P<url>[^"')\s]+)""")
+
+
+def hashed_name(relative_path, content):
+    """name.ext -> name.<content hash>.ext"""
+    stem, ext = posixpath.splitext(relative_path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def rewrite_references(text, relative_path, names):
+    """Point the src / href / url() references of a file at the hashed asset names"""
+    base = posixpath.dirname(relative_path)
+
+    def replace(match):
+        url = match.group("url")
+        if re.match(r"^[a-z][a-z0-9+.-]*:|^//|^#|^/", url, re.IGNORECASE):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(base, url.split("?")[0].split("#")[0]))
+        if target not in names:
+            return match.group(0)
+        return match.group("prefix") + posixpath.relpath(names[target], base or ".")
+
+    return REFERENCE.sub(replace, text)
+
+
+def compress(path, content):
+    """
+    Write the .gz (and .br) variants of a file if they are smaller
+
+    Returns:
+        list: Encodings written
+    """
+    written = []
+    if len(content) < MIN_COMPRESS_BYTES:
+        return written
+    variants = [("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", ".br", lambda data: brotli.compress(data, quality=11)))
+    for coding, suffix, compress_fn in variants:
+        compressed = compress_fn(content)
+        if len(compressed) < len(content):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            written.append(coding)
+    return written
+
+
+def build(source=DEFAULT_SOURCE, output=DEFAULT_OUTPUT):
+    """
+    Build the frontend in source into output (replacing it)
+
+    Returns:
+        dict: Manifest {source path: built path} of every file
+    """
+    files = {}
+    for root, dirs, filenames in os.walk(source):
+        # Never pick up a previous build that lives inside the sources
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.abspath(output)]
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            files[os.path.relpath(full_path, source).replace(os.sep, "/")] = full_path
+
+    # Hash the referenced assets first (CSS before the pages that link it), so
+    # every file's references point at final names before its own hash is taken
+    order = sorted(files, key=lambda path: (
+        path.endswith(PAGE_EXTENSIONS), path.endswith(REWRITE_EXTENSIONS), path
+    ))
+    names, contents = {}, {}
+    for relative_path in order:
+        with open(files[relative_path], "rb") as f:
+            content = f.read()
+        if relative_path.endswith(REWRITE_EXTENSIONS):
+            content = rewrite_references(content.decode("utf-8"), relative_path, names).encode("utf-8")
+        names[relative_path] = (
+            relative_path if relative_path.endswith(PAGE_EXTENSIONS) else hashed_name(relative_path, content)
+        )
+        contents[relative_path] = content
+
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    for relative_path, built_path in names.items():
+        path = os.path.join(output, *built_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(contents[relative_path])
+        encodings = compress(path, contents[relative_path]) if built_path.endswith(COMPRESS_EXTENSIONS) else []
+        logger.info("📦 %s -> %s %s", relative_path, built_path, "+".join(encodings))
+
+    with open(os.path.join(output, "manifest.json"), "w") as f:
+        json.dump(names, f, indent=2, sort_keys=True)
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the frontend with hashed, precompressed assets")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Frontend sources (default: frontend/)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Build directory (default: frontend/dist/)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if brotli is None:
+        logger.warning("⚠️  brotli is not installed, writing gzip variants only")
+    names = build(os.path.abspath(args.source), os.path.abspath(args.output))
+    logger.info("✅ Built %d files into %s", len(names), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Thread and CPU affinity tuning for the inference pipeline
+
+On a shared CPU node the model runtime's intra-op thread pool, OpenCV's own
+worker threads (the HYBRID blur / threshold / contour chain) and the
+preprocessing executor all compete for the same cores. The right split
+depends on the machine, so it can be measured at startup:
+
+    python -m app.tuning calibrate              # print the best settings as environment variables
+    QUICKDRAW_THREAD_CALIBRATION=1 uvicorn ...  # calibrate before the model is loaded
+
+Every candidate (model threads x OpenCV threads) is benchmarked in a fresh
+subprocess, because TensorFlow fixes its thread pools the first time it
+runs an op. The subprocess drives a closed-loop load shaped like the server:
+preprocessing on the inference executor's threads, one forward pass at a
+time over whatever requests are queued. The candidate with the highest
+throughput whose p99 latency stays within the target wins; if none does,
+the one with the lowest p99. The inter-op pool stays at one thread, as the
+server never runs two forward passes at once.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANVAS_SIZE = 400
+
+
+def parse_cpu_list(spec):
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        cpus.update(range(int(low), int(high or low) + 1))
+    return cpus
+
+
+def available_cpus():
+    """CPUs this process may run on (its affinity mask where the OS has one)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_cpus(workers=1):
+    """CPUs one of workers server processes may use: its share of this process's CPUs"""
+    return max(1, available_cpus() // max(1, workers))
+
+
+def apply_cpu_affinity(spec):
+    """
+    Pin this process (and the threads and workers it starts later) to a CPU list
+
+    Returns:
+        list: The CPUs the process now runs on, or None if the OS can't pin processes
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("⚠️  CPU affinity is not supported on this platform, ignoring QUICKDRAW_CPU_AFFINITY")
+        return None
+    os.sched_setaffinity(0, parse_cpu_list(spec))
+    return sorted(os.sched_getaffinity(0))
+
+
+def apply_thread_settings(settings):
+    """
+    Apply model / OpenCV thread counts to this process before the model is loaded
+
+    Args:
+        settings: {"model_threads": int or None, "opencv_threads": int or None}
+
+    Returns:
+        int: Thread count to pass to the model backend (None = runtime default)
+    """
+    model_threads = settings.get("model_threads")
+    if model_threads:
+        for name in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+            os.environ[name] = str(model_threads)
+        os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    if settings.get("opencv_threads") is not None:
+        cv2.setNumThreads(int(settings["opencv_threads"]))
+    return model_threads
+
+
+def candidate_settings(cpus=None):
+    """The thread combinations worth measuring on a machine with cpus cores"""
+    cpus = cpus or available_cpus()
+    model_threads = sorted({1, 2, max(1, cpus // 2), cpus} & set(range(1, cpus + 1)))
+    opencv_threads = sorted({1, cpus})
+    return [{"model_threads": m, "opencv_threads": o} for m in model_threads for o in opencv_threads]
+
+
+def choose_settings(results, target_p99_ms):
+    """
+    Best measured candidate: highest throughput within the p99 target, else lowest p99
+
+    Args:
+        results: Measurements as returned by measure_settings (failed runs have "error")
+        target_p99_ms: Latency target for the p99 of a request
+
+    Returns:
+        dict: The winning measurement, or None if every run failed
+    """
+    measured = [result for result in results if "error" not in result]
+    within_target = [result for result in measured if result["p99_ms"] <= target_p99_ms]
+    if within_target:
+        return max(within_target, key=lambda result: result["throughput_rps"])
+    return min(measured, key=lambda result: result["p99_ms"], default=None)
+
+
+def _scribbles(count, seed=0):
+    """Random-walk drawings with a realistic spread of stroke and point counts"""
+    rng = np.random.default_rng(seed)
+    drawings = []
+    for _ in range(count):
+        strokes = []
+        for _ in range(rng.integers(1, 8)):
+            steps = rng.normal(0, 6, size=(rng.integers(2, 60), 2))
+            start = rng.uniform(60, CANVAS_SIZE - 60, size=2)
+            strokes.append(np.clip(start + np.cumsum(steps, axis=0), 0, CANVAS_SIZE - 1))
+        drawings.append(strokes)
+    return drawings
+
+
+def run_load(backend, duration=3.0, concurrency=4, max_batch_size=32, preprocessing="hybrid"):
+    """
+    Closed-loop load in this process: concurrency clients, one model thread
+
+    Each client preprocesses a drawing and queues it; the model thread runs
+    one forward pass over everything queued (up to max_batch_size).
+
+    Returns:
+        dict: requests, throughput_rps, p50_ms and p99_ms
+    """
+    from app.models.drawing_model import preprocess_strokes
+
+    drawings = _scribbles(64)
+    pending = queue.Queue()
+    stop, model_stop = threading.Event(), threading.Event()
+    latencies, lock = [], threading.Lock()
+
+    def model_loop():
+        while not model_stop.is_set():
+            try:
+                batch = [pending.get(timeout=0.05)]
+            except queue.Empty:
+                continue
+            while len(batch) < max_batch_size:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            backend.predict(np.concatenate([image for image, _ in batch], axis=0))
+            for _, done in batch:
+                done.set()
+
+    def client(index):
+        i = index
+        while not stop.is_set():
+            started = time.perf_counter()
+            image = preprocess_strokes(drawings[i % len(drawings)], mode=preprocessing)
+            done = threading.Event()
+            pending.put((image, done))
+            done.wait()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+            i += concurrency
+
+    # Warm-up: trace the batch sizes the load will use
+    for batch_size in (1, concurrency):
+        backend.predict(np.zeros((batch_size,) + tuple(backend.input_shape[1:]), dtype=np.float32))
+
+    model_thread = threading.Thread(target=model_loop, daemon=True)
+    clients = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    model_thread.start()
+    for thread in clients:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    # Let the clients finish their last request before the model thread stops
+    for thread in clients:
+        thread.join(timeout=30)
+    model_stop.set()
+    model_thread.join(timeout=5)
+
+    if not latencies:
+        raise RuntimeError("No request completed during the measurement")
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3)
+    }
+
+
+def measure_settings(settings, backend_name, path=None, duration=3.0, concurrency=4, max_batch_size=32,
+                     preprocessing="hybrid", timeout=120):
+    """
+    Benchmark one thread setting in a fresh subprocess
+
+    Returns:
+        dict: The settings plus run_load()'s measurements, or plus "error" if the run failed
+    """
+    command = [
+        sys.executable, "-m", "app.tuning", "measure",
+        "--backend", backend_name, "--duration", str(duration), "--concurrency", str(concurrency),
+        "--max-batch-size", str(max_batch_size), "--preprocessing", preprocessing,
+        "--model-threads", str(settings["model_threads"]), "--opencv-threads", str(settings["opencv_threads"])
+    ]
+    if path:
+        command += ["--path", path]
+    try:
+        completed = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                               f"exit code {completed.returncode}")
+        return {**settings, **json.loads(completed.stdout.strip().splitlines()[-1])}
+    except Exception as e:
+        return {**settings, "error": str(e)}
+
+
+def calibrate_threads(backend_name, path=None, target_p99_ms=100.0, duration=3.0, concurrency=4,
+                      max_batch_size=32, preprocessing="hybrid", candidates=None):
+    """
+    Measure every candidate setting and pick the best one for this machine
+
+    Args:
+        backend_name, path: Model to load in the measuring subprocesses
+        target_p99_ms: Latency target for the p99 of a request
+        duration: Seconds of load per candidate
+        concurrency: Concurrent clients (e.g. the inference executor's worker count)
+        max_batch_size: Micro-batch limit of the model thread
+        preprocessing: Preprocessing mode the server uses
+        candidates: Settings to measure (default: candidate_settings())
+
+    Returns:
+        dict: {"settings": winning settings or None, "results": [...], "target_p99_ms", "seconds"}
+    """
+    started = time.perf_counter()
+    candidates = candidates or candidate_settings()
+    results = []
+    for settings in candidates:
+        result = measure_settings(settings, backend_name, path, duration, concurrency, max_batch_size, preprocessing)
+        if "error" in result:
+            logger.warning("⚠️  Thread calibration run %s failed: %s", settings, result["error"])
+        else:
+            logger.info("⏱️ model_threads=%d opencv_threads=%d: %.1f req/s, p99 %.1f ms",
+                        result["model_threads"], result["opencv_threads"], result["throughput_rps"], result["p99_ms"])
+        results.append(result)
+
+    best = choose_settings(results, target_p99_ms)
+    return {
+        "settings": {key: best[key] for key in ("model_threads", "opencv_threads")} if best else None,
+        "results": results,
+        "target_p99_ms": target_p99_ms,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+class ThreadTuning:
+    """The thread / affinity settings this process serves with, as reported by /api/model-info"""
+
+    def __init__(self):
+        self.source = "default"
+        self.settings = {"model_threads": None, "opencv_threads": None}
+        self.cpu_affinity = None
+        self.calibration = None
+
+    def pin(self, cpu_affinity):
+        """
+        Pin the process to a CPU list; call from the main thread before any worker thread starts
+
+        Linux applies the mask to the calling thread, and threads and subprocesses
+        started afterwards inherit it.
+        """
+        if cpu_affinity:
+            self.cpu_affinity = apply_cpu_affinity(cpu_affinity)
+
+    def configure(self, model_threads=None, opencv_threads=None, calibrate=False, backend_name="keras", path=None,
+                  target_p99_ms=100.0, duration=3.0, concurrency=4, max_batch_size=32, preprocessing="hybrid"):
+        """
+        Calibrate if asked, then apply the thread settings (call before the model is loaded)
+
+        Returns:
+            int: Thread count for the model backend (None = runtime default)
+        """
+        settings = {"model_threads": model_threads, "opencv_threads": opencv_threads}
+        self.source = "configured" if model_threads or opencv_threads is not None else "default"
+        if calibrate:
+            candidates = candidate_settings()
+            if len(candidates) == 1:
+                logger.info("⏱️ One CPU available, skipping thread calibration")
+                settings = candidates[0]
+                self.source = "single_cpu"
+            else:
+                self.calibration = calibrate_threads(
+                    backend_name, path, target_p99_ms, duration, concurrency, max_batch_size, preprocessing,
+                    candidates
+                )
+                if self.calibration["settings"] is not None:
+                    settings = self.calibration["settings"]
+                    self.source = "calibrated"
+                    logger.info("🧵 Calibrated thread settings: %s (in %ss)", settings, self.calibration["seconds"])
+                else:
+                    logger.error("❌ Thread calibration failed, keeping the configured thread settings")
+
+        self.settings = settings
+        return apply_thread_settings(settings)
+
+    def report(self):
+        return {
+            "source": self.source,
+            **self.settings,
+            "interop_threads": 1 if self.settings.get("model_threads") else None,
+            "cpus": available_cpus(),
+            "cpu_affinity": self.cpu_affinity,
+            "calibration": self.calibration
+        }
+
+
+# Thread settings of this process, configured from main.py before the model loads
+thread_tuning = ThreadTuning()
+
+
+def _measure(args):
+    apply_thread_settings({"model_threads": args.model_threads, "opencv_threads": args.opencv_threads})
+    from app.models.backends import create_backend, default_backend_path
+    from app.models.drawing_model import MODEL_PATH
+
+    path = args.path or (MODEL_PATH if args.backend == "keras" else default_backend_path(MODEL_PATH, args.backend))
+    backend = create_backend(args.backend, path, num_threads=args.model_threads)
+    result = run_load(backend, args.duration, args.concurrency, args.max_batch_size, args.preprocessing)
+    print(json.dumps(result))
+
+
+def _calibrate(args):
+    from app import config
+
+    result = calibrate_threads(
+        config.INFERENCE_BACKEND, config.MODEL_PATH, args.target_p99_ms, args.duration,
+        config.INFERENCE_WORKERS, config.BATCH_MAX_SIZE, config.PREPROCESSING,
+        candidate_settings(worker_cpus(args.workers))
+    )
+    print(json.dumps(result, indent=2))
+    if result["settings"]:
+        print(f"QUICKDRAW_INFERENCE_THREADS={result['settings']['model_threads']} "
+              f"QUICKDRAW_OPENCV_THREADS={result['settings']['opencv_threads']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = commands.add_parser("calibrate", help="Measure every candidate and print the best settings")
+    calibrate.add_argument("--target-p99-ms", type=float, default=100.0)
+    calibrate.add_argument("--duration", type=float, default=3.0, help="Seconds of load per candidate")
+    calibrate.add_argument("--workers", type=int, default=int(os.environ.get("QUICKDRAW_WORKERS", 1)),
+                           help="Server worker processes: thread counts are capped at one worker's CPU share")
+
+    measure = commands.add_parser("measure", help="Measure one setting in this process (used by calibrate)")
+    measure.add_argument("--backend", default="keras")
+    measure.add_argument("--path")
+    measure.add_argument("--model-threads", type=int, required=True)
+    measure.add_argument("--opencv-threads", type=int, required=True)
+    measure.add_argument("--duration", type=float, default=3.0)
+    measure.add_argument("--concurrency", type=int, default=4)
+    measure.add_argument("--max-batch-size", type=int, default=32)
+    measure.add_argument("--preprocessing", default="hybrid")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    if args.command == "measure":
+        _measure(args)
+    else:
+        _calibrate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from app.models.capture import (
+    CaptureLog, decode_record, decode_varints, encode_record, encode_varints, read_capture, read_segment,
+    strokes_from_dicts, unzigzag, zigzag
+)
+from app.models.drawing_model import CLASS_LABELS
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 32, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64)
+    data = encode_varints(values)
+    decoded, offset = decode_varints(data, 0, len(values))
+    assert decoded.tolist() == values.tolist()
+    assert offset == len(data)
+
+
+def test_varints_single_byte_for_small_values():
+    assert encode_varints([0, 1, 127]) == b"\x00\x01\x7f"
+    assert encode_varints([128]) == b"\x80\x01"
+
+
+def test_decode_varints_at_offset_leaves_the_rest():
+    data = b"junk" + encode_varints([5, 1000]) + encode_varints([7])
+    values, offset = decode_varints(data, 4, 2)
+    assert values.tolist() == [5, 1000]
+    assert decode_varints(data, offset, 1)[0].tolist() == [7]
+
+
+def test_decode_varints_truncated():
+    with pytest.raises(ValueError):
+        decode_varints(encode_varints([1, 2]), 0, 3)
+    with pytest.raises(ValueError):
+        decode_varints(b"\x80\x80", 0, 1)
+
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2, 2, -(2 ** 40), 2 ** 40], dtype=np.int64)
+    assert zigzag(values).tolist() == [0, 1, 2, 3, 4, 2 ** 41 - 1, 2 ** 41]
+    assert unzigzag(zigzag(values)).tolist() == values.tolist()
+
+
+def _record(**overrides):
+    probabilities = np.zeros(len(CLASS_LABELS), dtype=np.float32)
+    probabilities[1] = 0.75
+    probabilities[0] = 0.25
+    record = {
+        "strokes": [np.array([[10, 20], [15, 22], [30, 40]]), np.array([[200, 5]]), np.array([[0, 399], [399, 0]])],
+        "target": CLASS_LABELS[1],
+        "prediction": CLASS_LABELS[0],
+        "probabilities": probabilities,
+        "won": True,
+        "round_id": "round-1",
+        "timestamp": 1700000000.123
+    }
+    record.update(overrides)
+    return record
+
+
+def _read_payload(data):
+    length, offset = decode_varints(data, 0, 1)
+    assert offset + int(length[0]) == len(data)
+    return data[offset:]
+
+
+def test_record_round_trip():
+    record = _record()
+    decoded = decode_record(_read_payload(encode_record(record)))
+
+    assert decoded["timestamp"] == pytest.approx(record["timestamp"], abs=1e-3)
+    assert decoded["round_id"] == "round-1"
+    assert decoded["target"] == record["target"]
+    assert decoded["prediction"] == record["prediction"]
+    assert decoded["won"] is True
+    np.testing.assert_allclose(decoded["probabilities"], record["probabilities"], atol=1e-3)
+    assert len(decoded["strokes"]) == len(record["strokes"])
+    for stroke, original in zip(decoded["strokes"], record["strokes"]):
+        np.testing.assert_array_equal(stroke, original)
+
+
+def test_record_rounds_coordinates_to_pixels():
+    decoded = decode_record(_read_payload(encode_record(_record(strokes=[np.array([[10.4, 20.6], [11.5, 19.2]])]))))
+    np.testing.assert_array_equal(decoded["strokes"][0], [[10, 21], [12, 19]])
+
+
+def test_record_without_strokes():
+    decoded = decode_record(_read_payload(encode_record(_record(strokes=[], won=False, round_id=None))))
+    assert decoded["strokes"] == []
+    assert decoded["won"] is False
+    assert decoded["round_id"] is None
+
+
+def test_strokes_from_dicts_splits_like_serving():
+    drawing = [
+        {"x": 0, "y": 0}, {"x": 10, "y": 0}, {"x": -1, "y": -1, "strokeEnd": True},
+        {"x": 100, "y": 100}, {"x": 110, "y": 100},
+        {"x": 300, "y": 300}  # more than 40 px away: a pen lift
+    ]
+    strokes = strokes_from_dicts(drawing)
+    assert [stroke.tolist() for stroke in strokes] == [[[0, 0], [10, 0]], [[100, 100], [110, 100]], [[300, 300]]]
+
+
+def test_capture_log_writes_readable_segments(tmp_path):
+    log = CaptureLog(enabled=True, directory=str(tmp_path), flush_interval=0.05)
+    drawing = [{"x": 0, "y": 0}, {"x": 10, "y": 5}, {"x": 0, "y": 0, "strokeEnd": True}, {"x": 50, "y": 50}]
+    served = _record()
+    del served["strokes"]
+    assert log.submit({**served, "drawing": drawing})
+    assert log.submit({**served, "won": False, "points": np.array([[1, 1], [2, 2], [3, 3]]), "stroke_offsets": [0, 2]})
+    log.close()
+
+    records = list(read_capture(str(tmp_path)))
+    assert log.stats()["written_total"] == 2
+    assert [stroke.tolist() for stroke in records[0]["strokes"]] == [[[0, 0], [10, 5]], [[50, 50]]]
+    assert [stroke.tolist() for stroke in records[1]["strokes"]] == [[[1, 1], [2, 2]], [[3, 3]]]
+    assert [record["won"] for record in read_capture(str(tmp_path), won_only=True)] == [True]
+
+
+def test_truncated_segment_ends_quietly(tmp_path):
+    log = CaptureLog(enabled=True, directory=str(tmp_path))
+    for _ in range(3):
+        log.submit(_record())
+    log.close()
+    (path,) = tmp_path.iterdir()
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+    assert len(list(read_segment(str(path)))) == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from app.models.sessions import InkGate, SessionFullError, StrokeSession
+
+MARKER = {"x": -1, "y": -1, "strokeEnd": True}
+
+# Two 10 px strokes, the second one starting 100 px away
+DRAWING = [{"x": 0, "y": 0}, {"x": 6, "y": 8}, MARKER, {"x": 100, "y": 100}, {"x": 110, "y": 100}, MARKER]
+
+
+def _session(**kwargs):
+    return StrokeSession("test", mode="fast", **kwargs)
+
+
+@pytest.mark.parametrize("cuts", [(), (1,), (2,), (3,), (1, 2, 3, 4, 5), (2, 3)])
+def test_ink_length_does_not_depend_on_how_points_are_batched(cuts):
+    session = _session()
+    for batch in np.split(np.array(DRAWING, dtype=object), cuts):
+        session.add_points(list(batch))
+    ink_length, new_strokes, _ = session.ink_delta()
+    assert ink_length == pytest.approx(20.0)
+    assert new_strokes == 2
+
+
+def test_pen_lift_gaps_are_not_ink():
+    session = _session()
+    session.add_points([{"x": 0, "y": 0}, {"x": 10, "y": 0}, {"x": 200, "y": 0}, {"x": 205, "y": 0}])
+    assert session.ink_delta()[0] == pytest.approx(15.0)
+
+
+def test_markers_are_not_in_the_bounding_box():
+    session = _session()
+    session.add_points([{"x": 100, "y": 100}, {"x": 110, "y": 100}, MARKER])
+    session.mark_evaluated({"prediction": "apple"})
+    session.add_points([{"x": 105, "y": 100}, MARKER])
+    assert session.ink_delta() == (0.0, 1, 0.0)
+
+
+def test_gate_skips_polls_without_enough_new_ink():
+    gate = InkGate(enabled=True, min_ink_length=40.0, min_new_strokes=1, min_bbox_change=0.5)
+    session = _session()
+    session.add_points([{"x": 100, "y": 100}, {"x": 100, "y": 150}])
+    assert gate.should_evaluate(session)
+    session.mark_evaluated({"prediction": "apple"})
+
+    session.add_points([{"x": 100, "y": 160}])
+    assert not gate.should_evaluate(session)
+    session.add_points([{"x": 100, "y": 200}])
+    assert gate.should_evaluate(session)
+    session.mark_evaluated({"prediction": "apple"})
+
+    session.add_points([MARKER])
+    assert gate.should_evaluate(session)
+    assert gate.stats()["skipped_total"] == 1
+    assert gate.stats()["evaluated_total"] == 3
+
+
+def test_disabled_gate_always_evaluates():
+    gate = InkGate(enabled=False)
+    session = _session()
+    session.mark_evaluated({"prediction": "apple"})
+    assert gate.should_evaluate(session)
+    assert gate.stats()["evaluated_total"] == 0
+
+
+def test_session_refuses_points_over_its_cap():
+    session = _session(max_points=3)
+    session.add_points([{"x": 0, "y": 0}, {"x": 1, "y": 1}])
+    with pytest.raises(SessionFullError):
+        session.add_points([{"x": 2, "y": 2}, {"x": 3, "y": 3}])
+    assert session.point_count == 2
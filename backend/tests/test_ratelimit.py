@@ -0,0 +1,90 @@
+from starlette.requests import Request
+
+from app.ratelimit import RateLimiter, TokenBucketLimiter, route_class
+
+
+def _request(path, query="", host="10.0.0.1", headers=()):
+    return Request({
+        "type": "http", "method": "POST", "path": path, "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": (host, 12345)
+    })
+
+
+def test_bucket_allows_the_burst_then_refills():
+    limiter = TokenBucketLimiter(rate=2.0, burst=3)
+    assert [limiter.acquire("a", 0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a", 0.0) == 0.5
+    assert limiter.acquire("a", 0.5) == 0.0
+    assert limiter.acquire("a", 0.5) > 0
+    # Refilling stops at the burst size
+    assert [limiter.acquire("a", 100.0) for _ in range(4)][-1] > 0
+
+
+def test_buckets_are_per_client_and_bounded():
+    limiter = TokenBucketLimiter(rate=1.0, burst=1, max_clients=2)
+    assert limiter.acquire("a", 0.0) == 0.0
+    assert limiter.acquire("b", 0.0) == 0.0
+    assert limiter.acquire("a", 0.0) > 0
+    limiter.acquire("c", 0.0)
+    assert len(limiter) == 2
+    # "b" was least recently used and evicted: it starts again with a full bucket
+    assert limiter.acquire("b", 0.0) == 0.0
+
+
+def test_route_class():
+    assert route_class("/health") is None
+    assert route_class("/metrics") is None
+    assert route_class("/api/recognize-drawing") == "inference"
+    assert route_class("/api/recognize-drawing/compact") == "inference"
+    assert route_class("/api/drawing-sessions/abc/points") == "inference"
+    assert route_class("/api/drawing-sessions") == "default"
+    assert route_class("/api/random-object") == "default"
+
+
+def test_inference_budget_is_separate_from_default():
+    limiter = RateLimiter(inference_rate=0.001, inference_burst=2, default_rate=0.001, default_burst=5)
+    assert [limiter.check(_request("/api/recognize-drawing")) for _ in range(2)] == [0, 0]
+    assert limiter.check(_request("/api/recognize-drawing")) > 0
+    assert limiter.check(_request("/api/random-object")) == 0
+    assert limiter.check(_request("/health")) == 0
+    stats = limiter.stats()
+    assert stats["throttled_by_class_total"]["inference"] == 1
+    assert stats["allowed_total"] == 3
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = RateLimiter(enabled=False, inference_rate=0.001, inference_burst=1)
+    assert all(limiter.check(_request("/api/recognize-drawing")) == 0 for _ in range(5))
+
+
+def test_fresh_session_ids_do_not_refill_the_client_budget():
+    limiter = RateLimiter(inference_rate=0.001, inference_burst=3, session_rate=0.001, session_burst=10)
+    waits = [limiter.check(_request(f"/api/drawing-sessions/s{n}/points")) for n in range(4)]
+    waits += [limiter.check(_request("/api/recognize-drawing/compact", f"round_id=r{n}")) for n in range(2)]
+    assert waits[:3] == [0, 0, 0]
+    assert all(wait > 0 for wait in waits[3:])
+
+
+def test_session_budget_caps_one_session():
+    limiter = RateLimiter(inference_rate=0.001, inference_burst=10, session_rate=0.001, session_burst=2)
+    path = "/api/drawing-sessions/s1/points"
+    assert [limiter.check(_request(path)) for _ in range(2)] == [0, 0]
+    assert limiter.check(_request(path)) > 0
+    # A throttled session doesn't use up its client's budget
+    assert limiter.check(_request("/api/drawing-sessions/s2/points")) == 0
+    assert limiter.stats()["throttled_by_class_total"]["session"] == 1
+    assert limiter.stats()["tracked_sessions"] == 2
+
+
+def test_round_query_only_counts_on_the_compact_route():
+    limiter = RateLimiter()
+    assert limiter.session_key(_request("/api/recognize-drawing/compact", "round_id=r1")) == "round:r1"
+    assert limiter.session_key(_request("/api/recognize-drawing", "round_id=r1")) is None
+    assert limiter.session_key(_request("/api/drawing-sessions/s1/points")) == "session:s1"
+
+
+def test_forwarded_address_only_behind_a_trusted_proxy():
+    request = _request("/api/recognize-drawing", headers=[("x-forwarded-for", "1.2.3.4, 10.0.0.9")])
+    assert RateLimiter().client_key(request) == "10.0.0.1"
+    assert RateLimiter(trust_proxy=True).client_key(request) == "1.2.3.4"
@@ -0,0 +1,66 @@
+import struct
+
+import numpy as np
+import pytest
+
+from app.models.stroke_codec import (
+    decode_binary, decode_compact_json, encode_binary, quickdraw_to_strokes, strokes_to_compact
+)
+
+
+def test_binary_round_trip():
+    points = np.array([[0.0, 0.0], [10.5, 20.25], [399.0, 1.0]])
+    decoded_points, stroke_offsets = decode_binary(encode_binary(points, [0, 2]))
+    np.testing.assert_array_equal(decoded_points, points)
+    assert decoded_points.dtype == np.float64
+    assert stroke_offsets.tolist() == [0, 2]
+
+
+def test_binary_empty_drawing():
+    points, stroke_offsets = decode_binary(encode_binary(np.zeros((0, 2)), []))
+    assert points.shape == (0, 2)
+    assert stroke_offsets.size == 0
+
+
+@pytest.mark.parametrize("body", [
+    b"QDS",
+    b"XXXX" + struct.pack("<II", 0, 0),
+    struct.pack("<4sII", b"QDS1", 2, 0) + np.zeros(2, dtype="<f4").tobytes(),
+    encode_binary([[1.0, 2.0]], [0]) + b"\x00",
+    encode_binary([[1.0, 2.0]], [5]),
+    encode_binary([[np.nan, 2.0]], [0]),
+])
+def test_binary_rejects_malformed(body):
+    with pytest.raises(ValueError):
+        decode_binary(body)
+
+
+def test_compact_json():
+    points, stroke_offsets = decode_compact_json({"points": [1, 2, 3, 4, 5, 6], "stroke_offsets": [0, 1]})
+    np.testing.assert_array_equal(points, [[1, 2], [3, 4], [5, 6]])
+    assert stroke_offsets.tolist() == [0, 1]
+    assert decode_compact_json({"points": [1, 2]})[1].size == 0
+
+
+@pytest.mark.parametrize("payload", [
+    [1, 2],
+    {"points": [1, 2, 3]},
+    {"points": [[1, 2]]},
+    {"points": ["a", "b"]},
+    {"points": [1, 2], "stroke_offsets": [[0]]},
+    {"points": [1, 2], "stroke_offsets": [-1]},
+])
+def test_compact_json_rejects_malformed(payload):
+    with pytest.raises(ValueError):
+        decode_compact_json(payload)
+
+
+def test_strokes_to_compact_skips_empty_strokes():
+    points, stroke_offsets = strokes_to_compact([[[0, 0], [1, 1]], [], [[5, 5]]])
+    np.testing.assert_array_equal(points, [[0, 0], [1, 1], [5, 5]])
+    assert stroke_offsets.tolist() == [0, 2]
+
+
+def test_quickdraw_to_strokes_scales_onto_the_canvas():
+    strokes = quickdraw_to_strokes([[[0, 255], [255, 0], [0, 10]]], canvas_size=400, padding=20)
+    np.testing.assert_allclose(strokes[0], [[20, 380], [380, 20]])
@@ -0,0 +1,444 @@
+"""
+Latency / throughput benchmark for the recognition pipeline
+
+    python benchmarks/bench_recognition.py --output runs/baseline.json
+    python benchmarks/bench_recognition.py --ndjson full_simplified_apple.ndjson --output runs/new.json --compare runs/baseline.json
+    python benchmarks/bench_recognition.py --capture captures/ --output runs/captured.json
+
+Replays stroke payloads, synthetic, taken from QuickDraw .ndjson files
+(simplified format, 0-255 coordinates, scaled onto the 400x400 game canvas)
+or from the server's drawing capture log (QUICKDRAW_CAPTURE=1; canvas
+coordinates as drawn, labelled with the round's target), against:
+    stages      - every step of the pipeline timed separately on one thread
+    in_process  - preprocess_drawing_to_image and predict_drawing from N threads
+    asgi        - POST /api/recognize-drawing (and /compact) from N concurrent
+                  clients through httpx.ASGITransport, i.e. the whole app
+                  without a network in between
+    responses   - payload size and encode time of every response profile and
+                  encoding, against FastAPI's default encoding of the full response
+    tta         - single pass vs test-time augmentation: cost per drawing
+                  (preprocessing + views + forward pass, one thread) and, with
+                  --ndjson files of game classes or --capture, top-1 accuracy of both
+
+Each entry reports p50/p95/p99 latency in milliseconds and requests per
+second. The prediction cache is disabled so every request pays for a forward
+pass, and payloads are replayed in a fixed order (--seed) so runs are
+comparable. Results are written as JSON; --compare prints the p50/p95 change
+against an earlier run.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+
+CANVAS_SIZE = 400
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def strokes_to_points(strokes):
+    """Flatten strokes into the frontend's [{x, y}] format, with its strokeEnd marker points"""
+    points = []
+    for stroke in strokes:
+        points.extend({"x": float(x), "y": float(y)} for x, y in stroke)
+        if len(stroke) > 1:
+            x, y = stroke[-1]
+            points.append({"x": float(x) + 100, "y": float(y) + 100, "strokeEnd": True})
+    return points
+
+
+def synthetic_drawings(count, seed=0):
+    """Random-walk scribbles with a realistic spread of stroke and point counts"""
+    rng = np.random.default_rng(seed)
+    drawings = []
+    for _ in range(count):
+        strokes = []
+        for _ in range(rng.integers(1, 8)):
+            steps = rng.normal(0, 6, size=(rng.integers(2, 60), 2))
+            start = rng.uniform(60, CANVAS_SIZE - 60, size=2)
+            strokes.append(np.clip(start + np.cumsum(steps, axis=0), 0, CANVAS_SIZE - 1))
+        drawings.append(strokes)
+    return drawings
+
+
+def ndjson_drawings(paths, count, padding=20, with_words=False):
+    """
+    Read QuickDraw drawings ({"drawing": [[xs, ys], ...]} per line) and scale them to the game canvas
+
+    Args:
+        paths: .ndjson files (simplified or raw; a third timing row is ignored)
+        count: Maximum number of drawings (spread over all files)
+        padding: Margin in canvas pixels around the scaled drawing
+        with_words: Also return the "word" (class name) of every drawing
+
+    Returns:
+        list: Drawings as lists of (K, 2) strokes (and a list of words if with_words)
+    """
+    from app.models.stroke_codec import quickdraw_to_strokes
+
+    per_file = max(1, count // len(paths))
+    drawings, words = [], []
+    for path in paths:
+        with open(path) as f:
+            for line, _ in zip(f, range(per_file)):
+                record = json.loads(line)
+                drawings.append(quickdraw_to_strokes(record["drawing"], CANVAS_SIZE, padding))
+                words.append(record.get("word"))
+    if with_words:
+        return drawings[:count], words[:count]
+    return drawings[:count]
+
+
+def captured_drawings(paths, count):
+    """
+    Read the drawings of the capture log (segment files or capture directories)
+
+    Returns:
+        tuple: (drawings as lists of (K, 2) strokes, their round targets)
+    """
+    from app.models.capture import read_capture
+
+    drawings, words = [], []
+    for record, _ in zip(read_capture(paths), range(count)):
+        drawings.append(record["strokes"])
+        words.append(record["target"])
+    return drawings, words
+
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+def summarize(latencies_ms, wall_seconds=None):
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    summary = {
+        "count": int(len(latencies)),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3)
+    }
+    if wall_seconds:
+        summary["rps"] = round(len(latencies) / wall_seconds, 1)
+    return summary
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def bench_stages(payloads):
+    """Time each pipeline stage separately for every payload on a single thread"""
+    from PIL import Image, ImageDraw
+    from app.models import drawing_model as dm
+
+    stages = {name: [] for name in (
+        "request_parse", "stroke_split", "rasterize", "canvas_preprocess", "fit_to_model_input", "forward", "response_build"
+    )}
+    for drawing in payloads:
+        (points, stroke_ends), ms = timed(dm.drawing_to_arrays, drawing)
+        stages["request_parse"].append(ms)
+        strokes, ms = timed(lambda: dm.split_stroke_array(points, stroke_ends=stroke_ends))
+        stages["stroke_split"].append(ms)
+
+        def rasterize():
+            img = Image.new('L', (CANVAS_SIZE, CANVAS_SIZE), color=0)
+            dm.draw_strokes(ImageDraw.Draw(img), strokes, dm.get_line_width((CANVAS_SIZE, CANVAS_SIZE)))
+            return np.array(img, dtype=np.uint8)
+
+        canvas, ms = timed(rasterize)
+        stages["rasterize"].append(ms)
+        image, ms = timed(dm.preprocess_canvas, canvas)
+        stages["canvas_preprocess"].append(ms)
+        if image is None:
+            continue
+        image, ms = timed(dm.fit_to_model_input, image)
+        stages["fit_to_model_input"].append(ms)
+        probabilities, ms = timed(dm.predict_batch, image)
+        stages["forward"].append(ms)
+        _, ms = timed(dm.build_prediction_result, probabilities[0], len(drawing))
+        stages["response_build"].append(ms)
+
+    return {name: summarize(values) for name, values in stages.items() if values}
+
+
+def bench_threads(fn, payloads, concurrency):
+    """Call fn(payload) for every payload from `concurrency` threads"""
+    def call(payload):
+        return timed(fn, payload)[1]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(call, payloads))
+        wall = time.perf_counter() - started
+    return {"concurrency": concurrency, **summarize(latencies, wall)}
+
+
+async def bench_asgi(app, requests, concurrency):
+    """POST every (path, kwargs) request with at most `concurrency` in flight"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def post(client, path, kwargs):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(post(client, path, kwargs) for path, kwargs in requests))
+        wall = time.perf_counter() - started
+    return {"concurrency": concurrency, "status_codes": statuses, **summarize(latencies, wall)}
+
+
+def asgi_requests(drawings, endpoint):
+    from app.models.stroke_codec import COMPACT_BINARY_MEDIA_TYPE, encode_binary, strokes_to_compact
+
+    if endpoint == "recognize-drawing":
+        return [("/api/recognize-drawing", {"json": {"drawing": strokes_to_points(strokes), "object": "apple"}})
+                for strokes in drawings]
+    return [("/api/recognize-drawing/compact?object=apple", {
+        "content": encode_binary(*strokes_to_compact(strokes)),
+        "headers": {"Content-Type": COMPACT_BINARY_MEDIA_TYPE}
+    }) for strokes in drawings]
+
+
+def bench_responses(count, seed=0):
+    """Encode time and size of the recognition response for every profile / encoding"""
+    from fastapi.encoders import jsonable_encoder
+    from app.models import drawing_model as dm
+    from app.responses import RESPONSE_PROFILES, msgpack
+    from app.routes.drawing import build_recognition_response
+
+    rng = np.random.default_rng(seed)
+    results = [dm.build_prediction_result(p, 0) for p in rng.dirichlet(np.full(len(dm.CLASS_LABELS), 0.3), count)]
+    report = {}
+
+    # Baseline: what returning the full dict cost before (FastAPI's jsonable_encoder + json.dumps)
+    full = [json.loads(build_recognition_response(result, "apple").body) for result in results]
+    latencies, sizes = [], []
+    for content in full:
+        body, ms = timed(lambda: json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                                            separators=(",", ":")).encode())
+        latencies.append(ms)
+        sizes.append(len(body))
+    report["fastapi_default.json"] = {"bytes": round(float(np.mean(sizes)), 1), **summarize(latencies)}
+
+    for profile in RESPONSE_PROFILES:
+        for response_format in ("json", "msgpack") if msgpack is not None else ("json",):
+            options = {"profile": profile, "top_k": 3, "format": response_format}
+            latencies, sizes = [], []
+            for result in results:
+                response, ms = timed(build_recognition_response, result, "apple", options)
+                latencies.append(ms)
+                sizes.append(len(response.body))
+            report[f"{profile}.{response_format}"] = {"bytes": round(float(np.mean(sizes)), 1), **summarize(latencies)}
+    return report
+
+
+def bench_tta(payloads, words=None, variants=None):
+    """Cost per drawing and top-1 accuracy (with words) of a single pass vs the averaged TTA views"""
+    from app.models import drawing_model as dm
+    from app.models.tta import DEFAULT_TTA_VARIANTS, average_probabilities, make_variants
+
+    variants = tuple(variants or DEFAULT_TTA_VARIANTS)
+    labelled = words is not None and any(word in dm.CLASS_LABELS for word in words)
+    latencies = {"single": [], "tta": []}
+    predictions = {"single": [], "tta": []}
+    for payload in payloads:
+        image, prepare_ms = timed(dm.prepare_model_input, payload)
+        if image is None:
+            predictions["single"].append(None)
+            predictions["tta"].append(None)
+            continue
+        probabilities, forward_ms = timed(dm.predict_batch, image)
+        latencies["single"].append(prepare_ms + forward_ms)
+        predictions["single"].append(int(np.argmax(probabilities[0])))
+
+        views, views_ms = timed(make_variants, image, variants)
+        probabilities, forward_ms = timed(dm.predict_batch, views)
+        latencies["tta"].append(prepare_ms + views_ms + forward_ms)
+        predictions["tta"].append(int(np.argmax(average_probabilities(probabilities))))
+
+    report = {}
+    for name in ("single", "tta"):
+        report[name] = {"variants": 1 if name == "single" else len(variants), **summarize(latencies[name])}
+        if labelled:
+            scored = [(predicted, dm.CLASS_LABELS.index(word)) for predicted, word in zip(predictions[name], words)
+                      if word in dm.CLASS_LABELS]
+            report[name]["accuracy"] = round(sum(p == w for p, w in scored) / len(scored), 4)
+    report["tta"]["agreement"] = round(float(np.mean(
+        [a == b for a, b in zip(predictions["single"], predictions["tta"]) if a is not None])), 4)
+    report["tta"]["cost_ratio"] = round(report["tta"]["mean_ms"] / report["single"]["mean_ms"], 2)
+    if labelled:
+        report["tta"]["accuracy_gain"] = round(report["tta"]["accuracy"] - report["single"]["accuracy"], 4)
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(results):
+    """{"stages.forward": {...}, "asgi.recognize-drawing.c8": {...}, ...} for --compare"""
+    flat = {}
+    for group in ("stages", "responses", "tta"):
+        for name, summary in results.get(group, {}).items():
+            flat[f"{group}.{name}"] = summary
+    for group in ("in_process", "asgi"):
+        for target, runs in results.get(group, {}).items():
+            for run in runs:
+                flat[f"{group}.{target}.c{run['concurrency']}"] = run
+    return flat
+
+
+def print_comparison(current, baseline):
+    print(f"\n📊 Compared with {baseline['meta'].get('git_revision')} ({baseline['meta'].get('timestamp')})")
+    old = flatten(baseline)
+    for key, summary in flatten(current).items():
+        if key not in old:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "rps", "bytes", "accuracy"):
+            if metric in summary and old[key].get(metric):
+                change = (summary[metric] - old[key][metric]) / old[key][metric] * 100
+                changes.append(f"{metric} {old[key][metric]} -> {summary[metric]} ({change:+.1f}%)")
+        print(f"   {key:40s} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ndjson", nargs="+", help="QuickDraw .ndjson files to replay (default: synthetic drawings)")
+    parser.add_argument("--capture", nargs="+", help="Capture segments or directories to replay")
+    parser.add_argument("--count", type=int, default=200, help="Drawings per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--modes", nargs="+", choices=["stages", "in_process", "asgi", "responses", "tta"],
+                        default=["stages", "in_process", "asgi", "responses", "tta"])
+    parser.add_argument("--endpoints", nargs="+", choices=["recognize-drawing", "compact"],
+                        default=["recognize-drawing", "compact"])
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's console output")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    from app import config
+    from app.models import drawing_model as dm
+
+    words = None
+    if args.ndjson:
+        drawings, words = ndjson_drawings(args.ndjson, args.count, with_words=True)
+    elif args.capture:
+        drawings, words = captured_drawings(args.capture, args.count)
+        if not drawings:
+            sys.exit("❌ No captured drawings found")
+    else:
+        drawings = synthetic_drawings(args.count, args.seed)
+    payloads = [strokes_to_points(strokes) for strokes in drawings]
+    print(f"📥 {len(payloads)} drawings, {np.mean([len(p) for p in payloads]):.0f} points on average")
+
+    if not dm.initialize_model((1, config.BATCH_MAX_SIZE), config.INFERENCE_BACKEND,
+                               config.MODEL_PATH, config.INFERENCE_THREADS):
+        sys.exit("❌ Model could not be loaded")
+    # Every request should pay for its own forward pass
+    dm.configure_prediction_cache(max_entries=0)
+    dm.configure_preprocessing(config.PREPROCESSING)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": dm.model_status["backend"],
+            "preprocessing": dm.preprocessing_mode,
+            "payload_source": "ndjson" if args.ndjson else "capture" if args.capture else "synthetic",
+            "drawings": len(payloads),
+            "mean_points": round(float(np.mean([len(p) for p in payloads])), 1),
+            "batch_max_size": config.BATCH_MAX_SIZE,
+            "batch_max_wait_ms": config.BATCH_MAX_WAIT_MS,
+            "inference_workers": config.INFERENCE_WORKERS
+        }
+    }
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        if "stages" in args.modes:
+            results["stages"] = bench_stages(payloads)
+
+        if "in_process" in args.modes:
+            results["in_process"] = {
+                name: [bench_threads(fn, payloads, c) for c in args.concurrency]
+                for name, fn in (("preprocess_drawing_to_image", dm.preprocess_drawing_to_image),
+                                 ("predict_drawing", dm.predict_drawing))
+            }
+
+        if "responses" in args.modes:
+            results["responses"] = bench_responses(len(payloads), args.seed)
+
+        if "tta" in args.modes:
+            results["tta"] = bench_tta(payloads, words, config.TTA_VARIANTS)
+
+        if "asgi" in args.modes:
+            from app.main import app
+            from app.ratelimit import configure_rate_limiter
+            # Importing app.main configures the pipeline from the environment again:
+            # keep the cache off, and every benchmark request comes from the same client
+            dm.configure_prediction_cache(max_entries=0)
+            configure_rate_limiter(enabled=False)
+            results["asgi"] = {}
+            for endpoint in args.endpoints:
+                requests = asgi_requests(drawings, endpoint)
+                asyncio.run(bench_asgi(app, requests[:16], 4))  # warm-up
+                results["asgi"][endpoint] = [asyncio.run(bench_asgi(app, requests, c)) for c in args.concurrency]
+
+    for key, summary in flatten(results).items():
+        rps = f", {summary['rps']} req/s" if "rps" in summary else ""
+        size = f", {summary['bytes']:.0f} bytes" if "bytes" in summary else ""
+        accuracy = "".join(f", {name} {summary[name]}" for name in ("accuracy", "accuracy_gain", "agreement", "cost_ratio")
+                           if name in summary)
+        print(f"   {key:40s} p50 {summary['p50_ms']:8.3f} ms  p95 {summary['p95_ms']:8.3f} ms  "
+              f"p99 {summary['p99_ms']:8.3f} ms{rps}{size}{accuracy}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
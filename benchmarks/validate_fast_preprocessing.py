@@ -0,0 +1,103 @@
+"""
+Validate the "fast" preprocessing mode against the "hybrid" one before switching
+
+    python benchmarks/validate_fast_preprocessing.py --ndjson full_simplified_apple.ndjson full_simplified_star.ndjson
+    python benchmarks/validate_fast_preprocessing.py --output runs/fast_vs_hybrid.json
+
+Both modes preprocess the same drawings and the model scores both inputs.
+The report contains:
+    agreement     - share of drawings where both modes give the same top-1 class
+    accuracy      - top-1 accuracy of each mode (QuickDraw .ndjson files carry the true "word")
+    confidence    - mean top-1 probability of each mode
+    pixel_mae     - mean absolute difference of the two 64x64 inputs
+    latency       - p50/p95 preprocessing time of each mode
+
+Without --ndjson, synthetic scribbles are used, so only agreement, pixel
+difference and latency are meaningful.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench_recognition import ndjson_drawings, synthetic_drawings, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ndjson", nargs="+", help="QuickDraw .ndjson files of the 15 game classes")
+    parser.add_argument("--count", type=int, default=1500, help="Drawings to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    from app import config
+    from app.models import drawing_model as dm
+
+    if args.ndjson:
+        drawings, words = ndjson_drawings(args.ndjson, args.count, with_words=True)
+    else:
+        drawings, words = synthetic_drawings(args.count, args.seed), [None] * args.count
+    labels = np.array([dm.CLASS_LABELS.index(word) if word in dm.CLASS_LABELS else -1 for word in words])
+
+    if not dm.initialize_model((1,), config.INFERENCE_BACKEND, config.MODEL_PATH, config.INFERENCE_THREADS):
+        sys.exit("❌ Model could not be loaded")
+
+    images = {"hybrid": [], "fast": []}
+    latencies = {"hybrid": [], "fast": []}
+    kept = []
+    for index, strokes in enumerate(drawings):
+        results = {}
+        for mode in images:
+            started = time.perf_counter()
+            results[mode] = dm.preprocess_strokes(strokes, mode=mode)
+            latencies[mode].append((time.perf_counter() - started) * 1000)
+        if results["hybrid"] is None or results["fast"] is None:
+            continue
+        kept.append(index)
+        for mode in images:
+            images[mode].append(dm.fit_to_model_input(results[mode])[0])
+
+    probabilities = {
+        mode: np.concatenate([dm.predict_batch(np.stack(batch[i:i + 64])) for i in range(0, len(batch), 64)])
+        for mode, batch in images.items()
+    }
+    labels = labels[kept]
+    labeled = labels >= 0
+
+    report = {
+        "drawings": len(kept),
+        "labeled": int(labeled.sum()),
+        "agreement": round(float(np.mean(probabilities["hybrid"].argmax(1) == probabilities["fast"].argmax(1))), 4),
+        "pixel_mae": round(float(np.mean(np.abs(np.stack(images["hybrid"]) - np.stack(images["fast"])))), 4),
+        "modes": {}
+    }
+    for mode in images:
+        summary = summarize(latencies[mode])
+        report["modes"][mode] = {
+            "confidence": round(float(probabilities[mode].max(1).mean()), 4),
+            "latency_ms": {"p50": summary["p50_ms"], "p95": summary["p95_ms"]}
+        }
+        if labeled.any():
+            accuracy = np.mean(probabilities[mode][labeled].argmax(1) == labels[labeled])
+            report["modes"][mode]["accuracy"] = round(float(accuracy), 4)
+
+    print(f"📊 {report['drawings']} drawings ({report['labeled']} labeled): "
+          f"top-1 agreement {report['agreement']:.2%}, pixel MAE {report['pixel_mae']}")
+    for mode, result in report["modes"].items():
+        accuracy = f", accuracy {result['accuracy']:.2%}" if "accuracy" in result else ""
+        print(f"   {mode:6s} p50 {result['latency_ms']['p50']:.3f} ms, p95 {result['latency_ms']['p95']:.3f} ms, "
+              f"confidence {result['confidence']:.3f}{accuracy}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
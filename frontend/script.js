@@ -20,6 +20,9 @@ let lastY = 0;
 let timeLeft = 30;
 let timer;
 let currentObject = "";
+// Server-authoritative round: the server knows the object and decides the win
+let currentRoundId = null;
+let roundDuration = 30;
 let gameActive = false;
 let gameWon = false;
 
@@ -29,6 +32,17 @@ let lastEvaluationTime = 0;
 const EVALUATION_DELAY = 1000; // 1 second delay between evaluations
 let isEvaluating = false;
 
+// Incremental drawing session: real-time polls only send the points added
+// since the previous poll, the server keeps the canvas
+let drawingSessionId = null;
+let sentPointCount = 0;
+
+// Streaming recognition over WebSocket: points are pushed as they are drawn
+// and the server pushes a new guess only when it changes
+let recognitionSocket = null;
+let socketSentPointCount = 0;
+const STREAM_BATCH_POINTS = 8; // Send mid-stroke points in small batches
+
 // Array to hold the sequence of drawing coordinates with stroke information
 // Updated for square canvas (400x400)
 let drawingData = [];
@@ -68,6 +82,13 @@ async function initializeGame() {
         const modelInfo = await fetch(`${API_BASE_URL}/api/model-info`);
         const info = await modelInfo.json();
         
+        // The server loads the model in the background right after startup
+        if (info.status === 'loading') {
+            console.log('⏳ Model is still loading, retrying...');
+            setTimeout(initializeGame, 1000);
+            return;
+        }
+        
         if (info.error) {
             console.error('Model not loaded:', info.error);
             alert('⚠️ Model not loaded. Please check the backend.');
@@ -88,11 +109,14 @@ async function initializeGame() {
 // Get a new random object to draw
 async function getNewObject() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/random-object`);
+        currentRoundId = null;
+        const response = await fetch(`${API_BASE_URL}/api/rounds`, { method: "POST" });
         const data = await response.json();
         
         if (data.success) {
             currentObject = data.object;
+            currentRoundId = data.round_id;
+            roundDuration = data.duration_seconds;
             const emoji = data.emoji;
             objectPlaceholder.textContent = `${emoji} ${currentObject.charAt(0).toUpperCase() + currentObject.slice(1)}`;
         } else {
@@ -150,7 +174,7 @@ function startGame() {
     startScreen.style.display = "none";
     gameScreen.style.display = "block";
     currentObjectDisplay.textContent = objectPlaceholder.textContent;
-    timeLeft = 30;
+    timeLeft = roundDuration;
     timeLeftDisplay.textContent = timeLeft;
     timeLeftDisplay.style.color = '#333';
     drawingData = [];
@@ -163,10 +187,22 @@ function startGame() {
         predictionTextDisplay.textContent = "Start drawing...";
     }
     
+    // Start the server's round clock together with ours
+    if (currentRoundId) {
+        fetch(`${API_BASE_URL}/api/rounds/${currentRoundId}/start`, { method: "POST" })
+            .catch(() => {});
+    }
+    
     clearCanvas();
+    openRecognitionSocket();
     startTimer();
 }
 
+// Recognition requests name the round; without one (offline fallback) they name the object
+function roundFields() {
+    return currentRoundId ? { round_id: currentRoundId } : { object: currentObject };
+}
+
 // Real-time drawing evaluation with debouncing
 async function evaluateDrawingRealTime() {
     // Don't evaluate if game is not active or already won
@@ -183,18 +219,28 @@ async function evaluateDrawingRealTime() {
     isEvaluating = true;
     
     try {
-        const requestData = {
-            drawing: drawingData,
-            object: currentObject
-        };
-
-        const response = await fetch(`${API_BASE_URL}/api/recognize-drawing`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-            },
-            body: JSON.stringify(requestData)
-        });
+        let response = await sendNewPointsToSession();
+        if (!response) return;
+
+        if (response.status === 404 || response.status === 410) {
+            const errorData = await response.clone().json().catch(() => ({}));
+            if (errorData.round_id || response.status === 410) {
+                // The round is gone or its time is up: no more live guesses, finish the game
+                console.warn("Round over:", errorData.error);
+                if (response.status === 404) {
+                    currentRoundId = null;
+                }
+                endGame();
+                return;
+            }
+            if (errorData.session_id) {
+                // Session expired or was evicted on the server: start over with the whole drawing
+                drawingSessionId = null;
+                sentPointCount = 0;
+                response = await sendNewPointsToSession();
+                if (!response) return;
+            }
+        }
 
         if (!response.ok) {
             console.warn("Real-time evaluation failed:", response.status);
@@ -208,28 +254,7 @@ async function evaluateDrawingRealTime() {
             return;
         }
 
-        // NEW SUCCESS LOGIC: Check if highest confidence prediction matches current object
-        const highestPrediction = data.prediction.toLowerCase();
-        const targetObject = currentObject.toLowerCase();
-        const isCorrectPrediction = highestPrediction === targetObject;
-        
-        // Update AI prediction display (object name only, no confidence)
-        if (predictionTextDisplay && gameActive) {
-            const emoji = emojiMap[highestPrediction] || '🤔';
-            const capitalizedPrediction = highestPrediction.charAt(0).toUpperCase() + highestPrediction.slice(1);
-            const displayText = `${emoji} ${capitalizedPrediction}`;
-            predictionTextDisplay.textContent = displayText;
-            console.log('AI prediction updated:', displayText); // Debug log
-        }
-        
-        if (isCorrectPrediction) {
-            // SUCCESS! Highest confidence prediction matches target
-            gameWon = true;
-            gameActive = false;
-            const actualTime = 30 - timeLeft;
-            clearInterval(timer);
-            showImmediateSuccess(data, actualTime);
-        }
+        applyLivePrediction(data);
         
     } catch (error) {
         console.warn("Real-time evaluation network error:", error);
@@ -238,6 +263,137 @@ async function evaluateDrawingRealTime() {
     }
 }
 
+// Show the live guess and end the round early when the AI gets it right
+function applyLivePrediction(data) {
+    if (!gameActive || gameWon) return;
+    
+    // The server decides the win for rounds; otherwise check the top prediction ourselves
+    const highestPrediction = data.prediction.toLowerCase();
+    const targetObject = currentObject.toLowerCase();
+    const isCorrectPrediction = data.round ? data.round.won : highestPrediction === targetObject;
+    
+    // Update AI prediction display (object name only, no confidence)
+    if (predictionTextDisplay && gameActive) {
+        const emoji = emojiMap[highestPrediction] || '🤔';
+        const capitalizedPrediction = highestPrediction.charAt(0).toUpperCase() + highestPrediction.slice(1);
+        const displayText = `${emoji} ${capitalizedPrediction}`;
+        predictionTextDisplay.textContent = displayText;
+        console.log('AI prediction updated:', displayText); // Debug log
+    }
+    
+    if (isCorrectPrediction) {
+        // SUCCESS! Highest confidence prediction matches target
+        gameWon = true;
+        gameActive = false;
+        const actualTime = roundDuration - timeLeft;
+        clearInterval(timer);
+        closeRecognitionSocket();
+        showImmediateSuccess(data, actualTime);
+    }
+}
+
+// Open the streaming recognition channel; HTTP session polling is the fallback
+function openRecognitionSocket() {
+    if (!('WebSocket' in window)) return;
+    
+    const socket = new WebSocket(API_BASE_URL.replace(/^http/, 'ws') + '/ws/recognize');
+    socket.onopen = () => {
+        socket.send(JSON.stringify({ type: 'start', ...roundFields() }));
+        socketSentPointCount = 0;
+        streamNewPoints();
+    };
+    socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'prediction') {
+            applyLivePrediction(message);
+        } else if (message.type === 'error' || message.type === 'round_over') {
+            console.warn("Live recognition error:", message.error);
+        }
+    };
+    socket.onclose = () => {
+        if (recognitionSocket === socket) {
+            recognitionSocket = null;
+        }
+    };
+    recognitionSocket = socket;
+}
+
+function closeRecognitionSocket() {
+    if (recognitionSocket) {
+        const socket = recognitionSocket;
+        recognitionSocket = null;
+        socket.close();
+    }
+}
+
+// Stream every point not sent yet (finished strokes + the stroke in progress).
+// Returns false when the socket isn't usable so the caller can fall back to polling.
+function streamNewPoints() {
+    if (!recognitionSocket || recognitionSocket.readyState !== WebSocket.OPEN) return false;
+    
+    const total = drawingData.length + currentStroke.length;
+    if (total > socketSentPointCount) {
+        const points = [];
+        for (let i = socketSentPointCount; i < total; i++) {
+            points.push(i < drawingData.length ? drawingData[i] : currentStroke[i - drawingData.length]);
+        }
+        recognitionSocket.send(JSON.stringify({ type: 'points', points }));
+        socketSentPointCount = total;
+    }
+    return true;
+}
+
+// Create a drawing session on the server if we don't have one yet
+async function ensureDrawingSession() {
+    if (drawingSessionId) return drawingSessionId;
+
+    const response = await fetch(`${API_BASE_URL}/api/drawing-sessions`, { method: "POST" });
+    if (!response.ok) {
+        console.warn("Could not create drawing session:", response.status);
+        return null;
+    }
+
+    const data = await response.json();
+    drawingSessionId = data.session_id;
+    sentPointCount = 0;
+    return drawingSessionId;
+}
+
+// Send only the points drawn since the previous real-time evaluation
+async function sendNewPointsToSession() {
+    const sessionId = await ensureDrawingSession();
+    if (!sessionId) return null;
+
+    const pointCount = drawingData.length;
+    // Live polls only need the top guess: ask for the minimal response profile
+    const response = await fetch(`${API_BASE_URL}/api/drawing-sessions/${sessionId}/points?profile=minimal`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+            points: drawingData.slice(sentPointCount, pointCount),
+            ...roundFields()
+        })
+    });
+
+    // Only advance if the canvas wasn't cleared (new session) while the request was in flight
+    if (response.ok && drawingSessionId === sessionId) {
+        sentPointCount = pointCount;
+    }
+    return response;
+}
+
+// Drop the server-side canvas, e.g. when the drawing is cleared
+function resetDrawingSession() {
+    if (drawingSessionId) {
+        fetch(`${API_BASE_URL}/api/drawing-sessions/${drawingSessionId}`, { method: "DELETE" })
+            .catch(() => {});
+    }
+    drawingSessionId = null;
+    sentPointCount = 0;
+}
+
 // Show immediate success screen
 function showImmediateSuccess(data, actualTime) {
     gameScreen.style.display = "none";
@@ -307,6 +463,11 @@ function draw(e) {
     // Add point to current stroke
     currentStroke.push({ x, y, timestamp: currentTime });
     
+    // Stream the stroke in progress; the server coalesces the bursts
+    if (gameActive && !gameWon && drawingData.length + currentStroke.length - socketSentPointCount >= STREAM_BATCH_POINTS) {
+        streamNewPoints();
+    }
+    
     // Draw on canvas
     ctx.beginPath();
     ctx.moveTo(lastX, lastY);
@@ -335,8 +496,8 @@ function stopDrawing() {
         
         currentStroke = [];
         
-        // Trigger real-time evaluation after each stroke completion
-        if (gameActive && !gameWon) {
+        // Stream the finished stroke; fall back to polling without a socket
+        if (gameActive && !gameWon && !streamNewPoints()) {
             // Clear any pending evaluation
             if (evaluationTimeout) {
                 clearTimeout(evaluationTimeout);
@@ -365,6 +526,12 @@ function clearCanvas() {
     ctx.clearRect(0, 0, canvas.width, canvas.height);
     drawingData = [];
     currentStroke = [];
+    resetDrawingSession();
+    
+    socketSentPointCount = 0;
+    if (recognitionSocket && recognitionSocket.readyState === WebSocket.OPEN) {
+        recognitionSocket.send(JSON.stringify({ type: 'clear' }));
+    }
     
     // Reset prediction display when clearing
     if (predictionTextDisplay && gameActive) {
@@ -386,6 +553,7 @@ async function endGame() {
     }
     
     gameActive = false;
+    closeRecognitionSocket();
     gameScreen.style.display = "none";
     postGameScreen.style.display = "block";
     
@@ -395,6 +563,45 @@ async function endGame() {
     await sendDrawingData();
 }
 
+// Pack drawing points into the compact binary format:
+// "QDS1" | uint32 n_points | uint32 n_strokes | uint32 stroke_offsets[] | float32 xy[]
+function encodeCompactDrawing(points) {
+    const xy = [];
+    const strokeOffsets = [];
+    let newStroke = true;
+    
+    for (const point of points) {
+        // Stroke end markers become explicit stroke offsets
+        if (point.strokeEnd) {
+            newStroke = true;
+            continue;
+        }
+        if (newStroke) {
+            strokeOffsets.push(xy.length / 2);
+            newStroke = false;
+        }
+        xy.push(point.x, point.y);
+    }
+    
+    const headerBytes = 12;
+    const buffer = new ArrayBuffer(headerBytes + 4 * strokeOffsets.length + 4 * xy.length);
+    const view = new DataView(buffer);
+    [0x51, 0x44, 0x53, 0x31].forEach((byte, i) => view.setUint8(i, byte)); // "QDS1"
+    view.setUint32(4, xy.length / 2, true);
+    view.setUint32(8, strokeOffsets.length, true);
+    
+    let offset = headerBytes;
+    for (const strokeOffset of strokeOffsets) {
+        view.setUint32(offset, strokeOffset, true);
+        offset += 4;
+    }
+    for (const value of xy) {
+        view.setFloat32(offset, value, true);
+        offset += 4;
+    }
+    return buffer;
+}
+
 // Send drawing data to backend for recognition
 async function sendDrawingData() {
     if (drawingData.length === 0) {
@@ -407,18 +614,15 @@ async function sendDrawingData() {
         return;
     }
 
-    const requestData = {
-        drawing: drawingData,
-        object: currentObject
-    };
-
     try {
-        const response = await fetch(`${API_BASE_URL}/api/recognize-drawing`, {
+        // Packed binary body: the server decodes it straight into arrays
+        const query = new URLSearchParams(roundFields());
+        const response = await fetch(`${API_BASE_URL}/api/recognize-drawing/compact?${query}`, {
             method: "POST",
             headers: {
-                "Content-Type": "application/json",
+                "Content-Type": "application/x-quickdraw-strokes",
             },
-            body: JSON.stringify(requestData)
+            body: encodeCompactDrawing(drawingData)
         });
 
         // Check if the response is ok
@@ -473,7 +677,7 @@ async function sendDrawingData() {
 function displayPredictionResults(data) {
     const prediction = data.prediction;
     const expectedObject = data.expected_object;
-    const isCorrect = data.is_correct;
+    const isCorrect = data.round ? data.round.won : data.is_correct;
 
     // Get emojis from global mapping
     const predEmoji = emojiMap[prediction] || '❓';
@@ -523,13 +727,14 @@ async function restartGame() {
     startScreen.style.display = "block";
     
     // Reset game state
-    timeLeft = 30;
+    timeLeft = roundDuration;
     timeLeftDisplay.textContent = timeLeft;
     timeLeftDisplay.style.color = '#333';
     drawingData = [];
     gameActive = false;
     gameWon = false;
     isEvaluating = false;
+    closeRecognitionSocket();
     
     // Reset prediction display
     if (predictionTextDisplay) {
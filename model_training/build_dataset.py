@@ -0,0 +1,167 @@
+"""
+Build the training set from the QuickDraw class .npy bitmaps as memory-mapped uint8 shards
+
+    python build_dataset.py --data-dir "D:\\QuickDrawDataset(npyfiles)-Trad" --output-dir dataset
+    python build_dataset.py --data-dir ... --per-class 0 --shard-size 250000
+
+Replaces the pickle files written by load_data_onTrad.py. The source files
+are opened with mmap_mode and copied chunk by chunk into preallocated
+np.lib.format.open_memmap outputs, so peak memory is one chunk however big the
+dataset is, and the pixels stay uint8 (4x smaller than float32). The output
+directory holds:
+
+    images-00000.npy   (N, 28, 28) uint8, one shard per --shard-size drawings
+    labels-00000.npy   (N,) uint8 class indices into CLASS_LABELS
+    meta.json          class labels, per-class counts and the shard list
+
+Drawings are shuffled across classes while they are written (disable with
+--no-shuffle), so a reader can stream the shards in order with only a small
+shuffle buffer. Open the result with open_dataset().
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from export_model import CLASS_LABELS, class_of_file
+
+# Rows copied per read from a source file: bounds the memory used while building
+CHUNK_ROWS = 65536
+
+
+def find_class_files(data_dir):
+    """
+    The QuickDraw .npy file of every game class in data_dir
+
+    Returns:
+        list: (class index, path) sorted by class index
+
+    Raises:
+        ValueError: If no class file is found
+    """
+    found = {}
+    for filename in sorted(os.listdir(data_dir)):
+        label = class_of_file(filename) if filename.endswith(".npy") else None
+        if label is not None:
+            found[CLASS_LABELS.index(label)] = os.path.join(data_dir, filename)
+    if not found:
+        raise ValueError(f"No QuickDraw class .npy files found in {data_dir}")
+    missing = [label for index, label in enumerate(CLASS_LABELS) if index not in found]
+    if missing:
+        print(f"⚠️ No .npy file for: {', '.join(missing)}")
+    return sorted(found.items())
+
+
+def shard_name(kind, index):
+    return f"{kind}-{index:05d}.npy"
+
+
+def build_dataset(data_dir, output_dir, per_class=10000, shard_size=100000, shuffle=True, seed=42):
+    """
+    Write the class bitmaps of data_dir as uint8 image/label shards
+
+    Args:
+        data_dir: Folder with one (N, 784) uint8 .npy file per class
+        output_dir: Where the shards and meta.json are written
+        per_class: Drawings taken from every class (the first ones; 0 = all)
+        shard_size: Drawings per shard file
+        shuffle: Interleave the classes in a random order
+        seed: Shuffle seed
+
+    Returns:
+        dict: The metadata written to meta.json
+    """
+    class_files = find_class_files(data_dir)
+    sources = []
+    for class_index, path in class_files:
+        bitmaps = np.load(path, mmap_mode="r")
+        count = len(bitmaps) if not per_class else min(per_class, len(bitmaps))
+        sources.append((class_index, bitmaps, count))
+    image_shape = (28, 28)
+
+    total = sum(count for _, _, count in sources)
+    # Destination row of every source row; int64 positions are 8 bytes per drawing
+    order = np.random.default_rng(seed).permutation(total) if shuffle else np.arange(total)
+
+    os.makedirs(output_dir, exist_ok=True)
+    shard_counts = [min(shard_size, total - start) for start in range(0, total, shard_size)]
+    images = [np.lib.format.open_memmap(os.path.join(output_dir, shard_name("images", i)), mode="w+",
+                                        dtype=np.uint8, shape=(count,) + image_shape)
+              for i, count in enumerate(shard_counts)]
+    labels = [np.lib.format.open_memmap(os.path.join(output_dir, shard_name("labels", i)), mode="w+",
+                                        dtype=np.uint8, shape=(count,))
+              for i, count in enumerate(shard_counts)]
+
+    offset = 0
+    for class_index, bitmaps, count in sources:
+        print(f"📥 {CLASS_LABELS[class_index]}: {count} drawings")
+        for start in range(0, count, CHUNK_ROWS):
+            chunk = np.asarray(bitmaps[start:min(start + CHUNK_ROWS, count)]).reshape((-1,) + image_shape)
+            destination = order[offset + start:offset + start + len(chunk)]
+            shard_of_row = destination // shard_size
+            for shard in np.unique(shard_of_row):
+                rows = shard_of_row == shard
+                images[shard][destination[rows] % shard_size] = chunk[rows]
+                labels[shard][destination[rows] % shard_size] = class_index
+        offset += count
+
+    for array in images + labels:
+        array.flush()
+
+    meta = {
+        "class_labels": CLASS_LABELS,
+        "image_shape": list(image_shape),
+        "count": int(total),
+        "per_class": {CLASS_LABELS[class_index]: int(count) for class_index, _, count in sources},
+        "shuffled": shuffle,
+        "seed": seed,
+        "source": os.path.abspath(data_dir),
+        "shards": [
+            {"images": shard_name("images", i), "labels": shard_name("labels", i), "count": int(count)}
+            for i, count in enumerate(shard_counts)
+        ]
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def open_dataset(dataset_dir):
+    """
+    Open the shards written by build_dataset() without reading them into memory
+
+    Returns:
+        tuple: (meta dict, list of (images, labels) read-only memmaps per shard)
+    """
+    with open(os.path.join(dataset_dir, "meta.json")) as f:
+        meta = json.load(f)
+    shards = [
+        (np.load(os.path.join(dataset_dir, shard["images"]), mmap_mode="r"),
+         np.load(os.path.join(dataset_dir, shard["labels"]), mmap_mode="r"))
+        for shard in meta["shards"]
+    ]
+    return meta, shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.environ.get("QUICKDRAW_DATA_DIR"),
+                        required="QUICKDRAW_DATA_DIR" not in os.environ,
+                        help="Folder with the QuickDraw class .npy bitmaps (default: $QUICKDRAW_DATA_DIR)")
+    parser.add_argument("--output-dir", default="dataset")
+    parser.add_argument("--per-class", type=int, default=10000, help="Drawings per class, 0 = all of them")
+    parser.add_argument("--shard-size", type=int, default=100000, help="Drawings per shard file")
+    parser.add_argument("--no-shuffle", action="store_true", help="Keep the drawings grouped by class")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    meta = build_dataset(args.data_dir, args.output_dir, per_class=args.per_class, shard_size=args.shard_size,
+                         shuffle=not args.no_shuffle, seed=args.seed)
+    size_mb = meta["count"] * int(np.prod(meta["image_shape"])) / 1024 / 1024
+    print(f"✅ {meta['count']} drawings ({size_mb:.0f} MB uint8) in {len(meta['shards'])} shard(s) "
+          f"written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
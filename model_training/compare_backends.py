@@ -0,0 +1,173 @@
+"""
+Compare the exported inference backends against the Keras model before switching over
+
+    python compare_backends.py --calibration-dir "D:\\QuickDrawDataset(npyfiles)-Trad" --output compare.json
+
+Every model runs in its own subprocess so load time and peak memory are
+measured in isolation (a TFLite/ONNX process never imports TensorFlow). For
+each model the report lists:
+    - load_seconds / peak_rss_mb:   cost of bringing the backend up
+    - latency_ms:                   p50/p95 of one forward pass at batch size 1 and 32
+    - top1_agreement / max_abs_diff: how closely its probabilities follow the Keras model
+    - accuracy:                     top-1 accuracy when labeled QuickDraw .npy files are given
+
+Without --calibration-dir the evaluation set is synthetic scribbles rendered
+with the server's own HYBRID preprocessing.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from export_model import DEFAULT_MODEL, default_output_path, load_calibration_set
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def default_models(keras_path):
+    """The Keras model plus every exported variant found next to it"""
+    models = [("keras", keras_path)]
+    for fmt in ("tflite", "onnx"):
+        for quantize in ("none", "dynamic", "int8"):
+            path = default_output_path(keras_path, fmt, quantize)
+            if os.path.exists(path):
+                models.append((fmt, path))
+    return models
+
+
+def synthetic_eval_set(count=300, seed=0):
+    """Random multi-stroke scribbles run through the serving preprocessing"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.drawing_model import preprocess_strokes_to_image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        strokes = []
+        for _ in range(rng.integers(1, 5)):
+            steps = rng.normal(0, 12, size=(rng.integers(5, 40), 2))
+            strokes.append(np.clip(rng.uniform(80, 320, size=2) + np.cumsum(steps, axis=0), 0, 399))
+        images.append(preprocess_strokes_to_image(strokes)[0])
+    return np.stack(images).astype(np.float32)
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(backend_name, path, images_path, probabilities_path, repeats, num_threads):
+    """Subprocess side: load one backend, time it and save its probabilities"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.backends import create_backend
+
+    started = time.perf_counter()
+    backend = create_backend(backend_name, path, num_threads=num_threads)
+    load_seconds = time.perf_counter() - started
+
+    images = np.load(images_path)
+    latency = {}
+    for batch_size in (1, 32):
+        batch = np.resize(images, (batch_size,) + images.shape[1:])
+        backend.predict(batch)  # warm-up
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            backend.predict(batch)
+            timings.append((time.perf_counter() - started) * 1000)
+        latency[f"batch_{batch_size}"] = {
+            "p50": round(float(np.percentile(timings, 50)), 3),
+            "p95": round(float(np.percentile(timings, 95)), 3)
+        }
+
+    probabilities = np.concatenate([backend.predict(images[i:i + 32]) for i in range(0, len(images), 32)])
+    np.save(probabilities_path, probabilities)
+
+    print(json.dumps({
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "tensorflow_imported": "tensorflow" in sys.modules,
+        "latency_ms": latency
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keras-model", default=DEFAULT_MODEL)
+    parser.add_argument("--model", action="append", metavar="BACKEND=PATH",
+                        help="Model to compare, e.g. tflite=model_int8.tflite (repeatable; "
+                             "default: every exported model next to --keras-model)")
+    parser.add_argument("--calibration-dir", help="Folder with the QuickDraw class .npy bitmaps (labeled evaluation)")
+    parser.add_argument("--per-class", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for TFLite / ONNX Runtime")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend_name, path, images_path, probabilities_path = args.worker
+        run_worker(backend_name, path, images_path, probabilities_path, args.repeats, args.threads)
+        return
+
+    models = default_models(args.keras_model)
+    if args.model:
+        models = [("keras", args.keras_model)] + [tuple(spec.split("=", 1)) for spec in args.model]
+
+    labels = None
+    if args.calibration_dir:
+        images, labels = load_calibration_set(args.calibration_dir, per_class=args.per_class, seed=7)
+    else:
+        images = synthetic_eval_set()
+    print(f"📥 Evaluating {len(models)} models on {len(images)} images")
+
+    report = {"evaluation_images": len(images), "labeled": labels is not None, "models": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        images_path = os.path.join(tmp, "images.npy")
+        np.save(images_path, images)
+
+        reference = None
+        for index, (backend_name, path) in enumerate(models):
+            probabilities_path = os.path.join(tmp, f"probabilities_{index}.npy")
+            command = [sys.executable, os.path.abspath(__file__), "--repeats", str(args.repeats),
+                       "--worker", backend_name, path, images_path, probabilities_path]
+            if args.threads:
+                command += ["--threads", str(args.threads)]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"❌ {backend_name} {path} failed:\n{completed.stderr[-2000:]}")
+                report["models"].append({"backend": backend_name, "path": path, "error": completed.stderr[-2000:]})
+                continue
+
+            result = {"backend": backend_name, "path": path, **json.loads(completed.stdout.strip().splitlines()[-1])}
+            probabilities = np.load(probabilities_path)
+            if reference is None:
+                reference = probabilities
+            result["top1_agreement"] = round(float(np.mean(probabilities.argmax(1) == reference.argmax(1))), 4)
+            result["max_abs_diff"] = round(float(np.abs(probabilities - reference).max()), 6)
+            if labels is not None:
+                result["accuracy"] = round(float(np.mean(probabilities.argmax(1) == labels)), 4)
+            report["models"].append(result)
+
+            print(f"✅ {backend_name:6s} {os.path.basename(path)}: load {result['load_seconds']}s, "
+                  f"RSS {result['peak_rss_mb']} MB, "
+                  f"p50 {result['latency_ms']['batch_1']['p50']} ms (b=1) / "
+                  f"{result['latency_ms']['batch_32']['p50']} ms (b=32), "
+                  f"agreement {result['top1_agreement']:.2%}"
+                  + (f", accuracy {result['accuracy']:.2%}" if "accuracy" in result else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
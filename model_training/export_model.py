@@ -0,0 +1,176 @@
+"""
+Export the trained Keras model for the lightweight inference backends
+
+    python export_model.py --format tflite
+    python export_model.py --format tflite --quantize int8 --calibration-dir "D:\\QuickDrawDataset(npyfiles)-Trad"
+    python export_model.py --format onnx --quantize int8 --calibration-dir ...
+
+The exported files are written next to the .keras model with a .tflite /
+.onnx extension. The float export is where the server looks for it when
+QUICKDRAW_INFERENCE_BACKEND is set; quantized models get a "_dynamic" /
+"_int8" suffix (the naming of default_backend_path in
+backend/app/models/backends.py) and are only served when QUICKDRAW_MODEL_PATH
+points at them. Int8 models keep float32 input/output, so the server feeds
+them exactly like the Keras model.
+
+Int8 is not recommended for serving this model: on CPU it is several times
+slower than float at batch 32 (XNNPACK / ONNX Runtime run the small float
+convolutions faster than the quantized kernels plus (de)quantization) and
+agrees with the Keras model on only ~93-95% of the top-1 predictions. It is
+kept for experiments; check compare_backends.py on the target machine. Calibration images are taken from the QuickDraw .npy bitmaps the model
+was trained on and go through the same 28x28 -> 64x64 upscaling as the
+training notebook.
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_trad")
+DEFAULT_MODEL = os.path.join(MODEL_DIR, "QuickDraw_CALIBRATED_FINAL_64x64.keras")
+
+# Same order as CLASS_LABELS in backend/app/models/drawing_model.py
+CLASS_LABELS = [
+    'apple', 'bowtie', 'candle', 'door', 'envelope', 'fish', 'guitar', 'ice cream',
+    'lightning', 'moon', 'mountain', 'star', 'tent', 'toothbrush', 'wristwatch'
+]
+
+
+def class_of_file(filename):
+    """Map a QuickDraw .npy file name (e.g. full_numpy_bitmap_ice cream.npy) to its class label"""
+    name = os.path.splitext(os.path.basename(filename))[0].lower().replace("_", " ")
+    matches = [label for label in CLASS_LABELS if name.endswith(label)]
+    return max(matches, key=len) if matches else None
+
+
+def load_calibration_set(data_dir, per_class=100, target_size=64, seed=42):
+    """
+    Sample calibration / evaluation images from the QuickDraw .npy bitmaps
+
+    Args:
+        data_dir: Folder with one (N, 784) uint8 .npy file per class
+        per_class: Images sampled from every class
+        target_size: Model input size
+        seed: Sampling seed
+
+    Returns:
+        tuple: ((M, target_size, target_size, 1) float32 images in [0, 1], (M,) int class indices)
+    """
+    rng = np.random.default_rng(seed)
+    images, labels = [], []
+    for filename in sorted(os.listdir(data_dir)):
+        label = class_of_file(filename) if filename.endswith(".npy") else None
+        if label is None:
+            continue
+        bitmaps = np.load(os.path.join(data_dir, filename), mmap_mode="r")
+        picked = rng.choice(len(bitmaps), size=min(per_class, len(bitmaps)), replace=False)
+        for bitmap in bitmaps[np.sort(picked)]:
+            img = bitmap.reshape(28, 28).astype(np.float32) / 255.0
+            images.append(cv2.resize(img, (target_size, target_size), interpolation=cv2.INTER_CUBIC))
+            labels.append(CLASS_LABELS.index(label))
+
+    if not images:
+        raise ValueError(f"No QuickDraw class .npy files found in {data_dir}")
+    return np.stack(images)[..., np.newaxis].astype(np.float32), np.array(labels)
+
+
+def export_tflite(model, output_path, quantize="none", calibration_images=None):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == "int8":
+        def representative_dataset():
+            for img in calibration_images:
+                yield [img[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader over an in-memory image array"""
+
+    def __init__(self, input_name, images):
+        self._batches = iter([{input_name: img[np.newaxis]} for img in images])
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+def export_onnx(model, output_path, quantize="none", calibration_images=None, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    height, width, channels = model.input_shape[1:]
+    signature = [tf.TensorSpec((None, height, width, channels), tf.float32, name="input")]
+
+    @tf.function(input_signature=signature)
+    def serve(images):
+        return model(images, training=False)
+
+    float_path = output_path if quantize == "none" else output_path + ".float"
+    tf2onnx.convert.from_function(serve, input_signature=signature, opset=opset, output_path=float_path)
+    if quantize == "none":
+        return
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+    try:
+        if quantize == "dynamic":
+            quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+        else:
+            quantize_static(
+                float_path, output_path, _CalibrationReader("input", calibration_images),
+                activation_type=QuantType.QInt8, weight_type=QuantType.QInt8
+            )
+    finally:
+        os.remove(float_path)
+
+
+def default_output_path(model_path, fmt, quantize):
+    suffix = "" if quantize == "none" else f"_{quantize}"
+    return os.path.splitext(model_path)[0] + suffix + "." + fmt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Keras model to export")
+    parser.add_argument("--format", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="none",
+                        help="int8 = full integer quantization calibrated on --calibration-dir")
+    parser.add_argument("--calibration-dir", help="Folder with the QuickDraw class .npy bitmaps")
+    parser.add_argument("--calibration-per-class", type=int, default=100)
+    parser.add_argument("--output", help="Output file (default: next to --model)")
+    args = parser.parse_args()
+
+    if args.quantize == "int8" and not args.calibration_dir:
+        parser.error("--quantize int8 needs --calibration-dir")
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(args.model)
+    output_path = args.output or default_output_path(args.model, args.format, args.quantize)
+
+    calibration_images = None
+    if args.quantize == "int8":
+        calibration_images, _ = load_calibration_set(
+            args.calibration_dir, per_class=args.calibration_per_class, target_size=model.input_shape[1]
+        )
+        print(f"📥 Loaded {len(calibration_images)} calibration images")
+
+    if args.format == "tflite":
+        export_tflite(model, output_path, args.quantize, calibration_images)
+    else:
+        export_onnx(model, output_path, args.quantize, calibration_images)
+
+    size_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"✅ Exported {args.format} ({args.quantize}) model to {output_path} ({size_mb:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,41 @@
+"""
+Legacy loader: writes the pickled features_onTrad / labels_onTrad files
+
+    python load_data_onTrad.py "D:\\QuickDrawDataset(npyfiles)-Trad"
+
+Kept for the notebooks that still unpickle these files. New code should use
+build_dataset.py, which writes memory-mapped uint8 shards instead of one
+float32 pickle. The class files are memory-mapped and copied straight into one
+preallocated float32 array, so the only full-size copy is the output itself.
+"""
 import numpy as np
 import os
 import pickle
+import sys
+
+DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("QUICKDRAW_DATA_DIR", r"D:\QuickDrawDataset(npyfiles)-Trad")
+PER_CLASS = 10000
+
+
+def load_data(data_dir=DATA_DIR, per_class=PER_CLASS):
+    files = sorted(file for file in os.listdir(data_dir) if file.endswith(".npy"))
+    sources = [np.load(os.path.join(data_dir, file), mmap_mode="r")[:per_class] for file in files]
+
+    features = np.empty((sum(len(x) for x in sources), sources[0].shape[1]), dtype=np.float32)
+    labels = np.empty((len(features), 1), dtype=np.float32)
+    start = 0
+    for count, x in enumerate(sources):
+        np.divide(x, 255., out=features[start:start + len(x)])
+        labels[start:start + len(x)] = count
+        start += len(x)
+
+    return features, labels
+
+
+if __name__ == "__main__":
+    features, labels = load_data()
 
-files = os.listdir(r"D:\QuickDrawDataset(npyfiles)-Trad")
-x = []
-x_load = []
-y = []
-y_load = []
-
-
-def load_data():
-    count = 0
-    for file in files:
-        file = r"D:\QuickDrawDataset(npyfiles)-Trad\\" + file
-        x = np.load(file)
-        x = x.astype('float32') / 255.
-        x = x[0:10000, :]
-        x_load.append(x)
-        y = [count for _ in range(10000)]
-        count += 1
-        y = np.array(y).astype('float32')
-        y = y.reshape(y.shape[0], 1)
-        y_load.append(y)
-
-    return x_load, y_load
-
-
-features, labels = load_data()
-features = np.array(features).astype('float32')
-labels = np.array(labels).astype('float32')
-features=features.reshape(features.shape[0]*features.shape[1],features.shape[2])
-labels=labels.reshape(labels.shape[0]*labels.shape[1],labels.shape[2])
-
-
-with open("features_onTrad", "wb") as f:
-    pickle.dump(features, f, protocol=4)
-with open("labels_onTrad", "wb") as f:
-    pickle.dump(labels, f, protocol=4)
+    with open("features_onTrad", "wb") as f:
+        pickle.dump(features, f, protocol=4)
+    with open("labels_onTrad", "wb") as f:
+        pickle.dump(labels, f, protocol=4)
@@ -0,0 +1,105 @@
+"""
+Render the server's drawing capture log into training shards
+
+    python render_capture.py --capture ../captures --output-dir captured64
+    python render_capture.py --capture ../captures --won-only --mode fast --output-dir captured64
+
+With QUICKDRAW_CAPTURE=1 the server appends the final drawing of every game
+round to segment files (app/models/capture.py): the strokes as drawn on the
+400x400 game canvas, the round's target class and the model's prediction.
+These are rendered with the serving preprocess_strokes, like render_ndjson.py
+does for the QuickDraw files, and labelled with the target. Drawings that
+did not win their round are either the model's mistakes (the most useful
+ones to train on) or drawings that were never finished; --won-only keeps
+only the recognized ones. The output has the build_dataset.py layout
+(images-00000.npy, labels-00000.npy, meta.json), so training_data.make_dataset()
+reads it directly, on its own or next to a render_ndjson.py dataset.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from export_model import CLASS_LABELS
+from render_ndjson import BACKEND_DIR, CANVAS_SIZE, ShardWriter
+
+
+def render_capture(capture, output_dir, target_size=64, mode="hybrid", won_only=False, shard_size=25000, seed=42):
+    """
+    Render every captured drawing into image/label shards
+
+    Args:
+        capture: Capture segment files or directories
+        output_dir: Where the shards and meta.json are written
+        target_size: Model input size the drawings are rendered at
+        mode: Serving preprocessing mode, "hybrid" or "fast"
+        won_only: Only the drawings the model recognized during their round
+        shard_size: Drawings per shard file
+        seed: Shard shuffle seed
+
+    Returns:
+        dict: The metadata written to meta.json
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.capture import read_capture
+    from app.models.drawing_model import preprocess_strokes
+
+    counts = {label: 0 for label in CLASS_LABELS}
+    skipped = 0
+    writer = ShardWriter(output_dir, shard_size, (target_size, target_size), seed)
+
+    started = time.perf_counter()
+    for record in read_capture(capture, won_only=won_only):
+        image = None
+        if record["target"] in counts and record["strokes"]:
+            image = preprocess_strokes(record["strokes"], (CANVAS_SIZE, CANVAS_SIZE), (target_size, target_size), mode)
+        if image is None:
+            skipped += 1
+            continue
+        writer.add(np.round(image[:, :, :, 0] * 255).astype(np.uint8), CLASS_LABELS.index(record["target"]))
+        counts[record["target"]] += 1
+    writer.flush()
+
+    meta = {
+        "class_labels": CLASS_LABELS,
+        "image_shape": [target_size, target_size],
+        "count": int(sum(counts.values())),
+        "per_class": counts,
+        "skipped": int(skipped),
+        "shuffled": True,
+        "seed": seed,
+        "source": [os.path.abspath(path) for path in capture],
+        "won_only": won_only,
+        "preprocessing": mode,
+        "canvas": {"size": CANVAS_SIZE, "padding": None},
+        "render_seconds": round(time.perf_counter() - started, 1),
+        "shards": writer.shards
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", nargs="+", required=True, help="Capture segment files or directories")
+    parser.add_argument("--output-dir", default="captured64")
+    parser.add_argument("--target-size", type=int, default=64)
+    parser.add_argument("--mode", choices=("hybrid", "fast"), default="hybrid",
+                        help="Serving preprocessing mode (match QUICKDRAW_PREPROCESSING)")
+    parser.add_argument("--won-only", action="store_true", help="Only drawings that won their round")
+    parser.add_argument("--shard-size", type=int, default=25000, help="Drawings per shard (~100 MB at 64x64)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    meta = render_capture(args.capture, args.output_dir, target_size=args.target_size, mode=args.mode,
+                          won_only=args.won_only, shard_size=args.shard_size, seed=args.seed)
+    print(f"✅ {meta['count']} captured drawings rendered ({meta['skipped']} skipped) in {meta['render_seconds']}s, "
+          f"{len(meta['shards'])} shard(s) written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
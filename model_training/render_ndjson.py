@@ -0,0 +1,235 @@
+"""
+Render the raw QuickDraw strokes with the serving preprocessing into training shards
+
+    python render_ndjson.py --ndjson-dir /path/to/quickdraw-simplified --output-dir dataset64
+    python render_ndjson.py --ndjson-dir ... --per-class 0 --recognized-only --mode fast --workers 16
+
+The 28x28 .npy bitmaps are rendered differently from the strokes the game
+sends, which is what adapt_image_for_training_match papers over. This
+pipeline instead takes the simplified .ndjson stroke files, scales every
+drawing onto the 400x400 game canvas (quickdraw_to_strokes) and rasterizes
+it with the server's own preprocess_strokes at the model resolution, so the
+model trains on exactly what it will see in production.
+
+Lines are read in chunks, round-robin over the class files, and rendered on
+a process pool with a bounded number of chunks in flight. Finished drawings
+go into one preallocated shard buffer that is shuffled and written when
+full, so memory stays at about one shard plus the in-flight chunks
+whatever the input size. The output has the same layout as build_dataset.py
+(images-00000.npy as (N, 64, 64) uint8, labels-00000.npy, meta.json), so
+training_data.make_dataset() reads it directly.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from build_dataset import shard_name
+from export_model import CLASS_LABELS, class_of_file
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# Game canvas the web client draws on, and the margin QuickDraw drawings get on it
+CANVAS_SIZE = 400
+CANVAS_PADDING = 20
+
+
+def find_ndjson_files(ndjson_dir):
+    """(class index, path) of every game class .ndjson file in ndjson_dir"""
+    found = {}
+    for filename in sorted(os.listdir(ndjson_dir)):
+        label = class_of_file(filename) if filename.endswith(".ndjson") else None
+        if label is not None:
+            found[CLASS_LABELS.index(label)] = os.path.join(ndjson_dir, filename)
+    if not found:
+        raise ValueError(f"No QuickDraw class .ndjson files found in {ndjson_dir}")
+    return sorted(found.items())
+
+
+def _init_worker():
+    import cv2
+
+    sys.path.insert(0, BACKEND_DIR)
+    # One OpenCV thread per process: the pool already uses every core
+    cv2.setNumThreads(1)
+
+
+def render_chunk(lines, target_size=64, mode="hybrid", recognized_only=False):
+    """
+    Worker side: render .ndjson lines with the serving preprocessing
+
+    Returns:
+        tuple: ((M, target_size, target_size) uint8 images, number of lines skipped)
+    """
+    from app.models.drawing_model import preprocess_strokes
+    from app.models.stroke_codec import quickdraw_to_strokes
+
+    images = []
+    for line in lines:
+        record = json.loads(line)
+        if recognized_only and not record.get("recognized", True):
+            continue
+        strokes = quickdraw_to_strokes(record["drawing"], CANVAS_SIZE, CANVAS_PADDING)
+        image = preprocess_strokes(strokes, (CANVAS_SIZE, CANVAS_SIZE), (target_size, target_size), mode)
+        if image is not None:
+            images.append(np.round(image[0, :, :, 0] * 255).astype(np.uint8))
+    rendered = np.stack(images) if images else np.zeros((0, target_size, target_size), dtype=np.uint8)
+    return rendered, len(lines) - len(images)
+
+
+def read_chunks(class_files, chunk_lines, wanted):
+    """
+    Yield (class index, lines) chunks, taking one chunk per class file in turn
+
+    wanted(class_index) is asked before every chunk; a class stops being read
+    once it returns False or its file is exhausted.
+    """
+    handles = {class_index: open(path, "rb") for class_index, path in class_files}
+    try:
+        while handles:
+            for class_index in list(handles):
+                lines = list(islice(handles[class_index], chunk_lines)) if wanted(class_index) else []
+                if not lines:
+                    handles.pop(class_index).close()
+                    continue
+                yield class_index, lines
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+class ShardWriter:
+    """Collects rendered drawings in one preallocated buffer and writes it as a shuffled shard when full"""
+
+    def __init__(self, output_dir, shard_size, image_shape, seed=42):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.images = np.empty((shard_size,) + tuple(image_shape), dtype=np.uint8)
+        self.labels = np.empty(shard_size, dtype=np.uint8)
+        self.filled = 0
+        self.shards = []
+        self._rng = np.random.default_rng(seed)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add(self, images, class_index):
+        while len(images):
+            take = min(len(images), self.shard_size - self.filled)
+            self.images[self.filled:self.filled + take] = images[:take]
+            self.labels[self.filled:self.filled + take] = class_index
+            self.filled += take
+            images = images[take:]
+            if self.filled == self.shard_size:
+                self.flush()
+
+    def flush(self):
+        if not self.filled:
+            return
+        order = self._rng.permutation(self.filled)
+        index = len(self.shards)
+        np.save(os.path.join(self.output_dir, shard_name("images", index)), self.images[:self.filled][order])
+        np.save(os.path.join(self.output_dir, shard_name("labels", index)), self.labels[:self.filled][order])
+        self.shards.append({"images": shard_name("images", index), "labels": shard_name("labels", index),
+                            "count": int(self.filled)})
+        print(f"💾 Shard {index}: {self.filled} drawings")
+        self.filled = 0
+
+
+def render_dataset(ndjson_dir, output_dir, per_class=0, target_size=64, mode="hybrid", recognized_only=False,
+                   shard_size=25000, workers=None, chunk_lines=256, seed=42):
+    """
+    Render every class .ndjson file of ndjson_dir into image/label shards
+
+    Args:
+        ndjson_dir: Folder with the QuickDraw simplified .ndjson files of the game classes
+        output_dir: Where the shards and meta.json are written
+        per_class: Drawings kept per class (0 = all)
+        target_size: Model input size the drawings are rendered at
+        mode: Serving preprocessing mode, "hybrid" or "fast"
+        recognized_only: Skip drawings the QuickDraw game itself didn't recognize
+        shard_size: Drawings per shard file
+        workers: Rendering processes (default: CPU count)
+        chunk_lines: Lines per task handed to a worker
+        seed: Shard shuffle seed
+
+    Returns:
+        dict: The metadata written to meta.json
+    """
+    class_files = find_ndjson_files(ndjson_dir)
+    workers = workers or os.cpu_count() or 1
+    counts = {class_index: 0 for class_index, _ in class_files}
+    skipped = 0
+    writer = ShardWriter(output_dir, shard_size, (target_size, target_size), seed)
+
+    def wanted(class_index):
+        return not per_class or counts[class_index] < per_class
+
+    def collect(class_index, future):
+        nonlocal skipped
+        images, chunk_skipped = future.result()
+        if per_class:
+            images = images[:max(0, per_class - counts[class_index])]
+        writer.add(images, class_index)
+        counts[class_index] += len(images)
+        skipped += chunk_skipped
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # At most two chunks per worker in flight: reading never runs ahead of rendering
+        in_flight = deque()
+        for class_index, lines in read_chunks(class_files, chunk_lines, wanted):
+            in_flight.append((class_index, pool.submit(render_chunk, lines, target_size, mode, recognized_only)))
+            while len(in_flight) >= 2 * workers or (in_flight and in_flight[0][1].done()):
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+    writer.flush()
+
+    meta = {
+        "class_labels": CLASS_LABELS,
+        "image_shape": [target_size, target_size],
+        "count": int(sum(counts.values())),
+        "per_class": {CLASS_LABELS[class_index]: int(count) for class_index, count in counts.items()},
+        "skipped": int(skipped),
+        "shuffled": True,
+        "seed": seed,
+        "source": os.path.abspath(ndjson_dir),
+        "preprocessing": mode,
+        "canvas": {"size": CANVAS_SIZE, "padding": CANVAS_PADDING},
+        "render_seconds": round(time.perf_counter() - started, 1),
+        "shards": writer.shards
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ndjson-dir", required=True, help="Folder with the QuickDraw simplified .ndjson files")
+    parser.add_argument("--output-dir", default="dataset64")
+    parser.add_argument("--per-class", type=int, default=0, help="Drawings per class, 0 = all of them")
+    parser.add_argument("--target-size", type=int, default=64)
+    parser.add_argument("--mode", choices=("hybrid", "fast"), default="hybrid",
+                        help="Serving preprocessing mode (match QUICKDRAW_PREPROCESSING)")
+    parser.add_argument("--recognized-only", action="store_true", help="Skip drawings QuickDraw didn't recognize")
+    parser.add_argument("--shard-size", type=int, default=25000, help="Drawings per shard (~100 MB at 64x64)")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    meta = render_dataset(args.ndjson_dir, args.output_dir, per_class=args.per_class, target_size=args.target_size,
+                          mode=args.mode, recognized_only=args.recognized_only, shard_size=args.shard_size,
+                          workers=args.workers, seed=args.seed)
+    rate = meta["count"] / max(meta["render_seconds"], 1e-9)
+    print(f"✅ {meta['count']} drawings rendered ({meta['skipped']} skipped) in {meta['render_seconds']}s "
+          f"({rate:.0f}/s), {len(meta['shards'])} shard(s) written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
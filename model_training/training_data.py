@@ -0,0 +1,129 @@
+"""
+tf.data input pipeline over the shards written by build_dataset.py
+
+    from training_data import make_dataset, split_size
+
+    train_ds = make_dataset("dataset", "train", batch_size=64)
+    val_ds = make_dataset("dataset", "validation", batch_size=256)
+    model.fit(train_ds, validation_data=val_ds, steps_per_epoch=split_size("dataset", "train") // 64, ...)
+
+Drawings are streamed from the memory-mapped uint8 shards (several shards
+read in parallel), shuffled in a bounded buffer, batched, upscaled to the
+model input size and augmented on the fly, so the whole QuickDraw set can be
+used without ever holding it in RAM. The augmentation is the stroke-style
+post-processing the server applies in adapt_image_for_training_match (blur,
+contrast, noise), with the constants imported from the server code so the
+two can't drift apart.
+
+Every shard is split by row into train / validation / test (70 / 15 / 15,
+like the training notebook); build_dataset.py shuffles across classes, so
+each split has the same class mix.
+"""
+import os
+import sys
+
+import numpy as np
+
+from build_dataset import open_dataset
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+from app.models.drawing_model import (  # noqa: E402
+    TRAINING_MATCH_BLUR_SIGMA, TRAINING_MATCH_CONTRAST, TRAINING_MATCH_NOISE_STD
+)
+
+SPLITS = {"train": (0.0, 0.7), "validation": (0.7, 0.85), "test": (0.85, 1.0)}
+
+# Rows handed to tf.data per read from a shard
+READ_ROWS = 1024
+
+
+def split_rows(count, split):
+    """[start, stop) rows of a shard with count drawings that belong to split"""
+    if split not in SPLITS:
+        raise ValueError(f"Unknown split '{split}', expected one of {sorted(SPLITS)}")
+    low, high = SPLITS[split]
+    return int(count * low), int(count * high)
+
+
+def split_size(dataset_dir, split):
+    """Number of drawings in a split (for steps_per_epoch / validation_steps)"""
+    meta, _ = open_dataset(dataset_dir)
+    return sum(stop - start for start, stop in (split_rows(shard["count"], split) for shard in meta["shards"]))
+
+
+def gaussian_kernel(sigma, truncate=4.0):
+    """1-D Gaussian taps matching scipy.ndimage.gaussian_filter(sigma=sigma)"""
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def make_dataset(dataset_dir, split="train", batch_size=64, target_size=64, augment=None,
+                 shuffle_buffer=20000, parallel_shards=4, one_hot=True, seed=None):
+    """
+    Build a tf.data.Dataset of (images, labels) batches
+
+    Args:
+        dataset_dir: Output directory of build_dataset.py
+        split: "train", "validation" or "test"
+        batch_size: Drawings per batch
+        target_size: Model input size; the 28x28 bitmaps are upscaled bicubically
+        augment: Apply the stroke-style augmentation (default: only for "train")
+        shuffle_buffer: Shuffle buffer size in drawings (0 = keep the shard order)
+        parallel_shards: Shards read concurrently
+        one_hot: Labels as one-hot float vectors (for categorical_crossentropy) instead of class indices
+        seed: Shuffle / noise seed
+
+    Returns:
+        tf.data.Dataset yielding ((B, target_size, target_size, 1) float32 in [0, 1], labels)
+    """
+    import tensorflow as tf
+
+    meta, shards = open_dataset(dataset_dir)
+    num_classes = len(meta["class_labels"])
+    height, width = meta["image_shape"]
+    training = split == "train"
+    if augment is None:
+        augment = training
+
+    def read_shard(index):
+        images, labels = shards[index]
+        start, stop = split_rows(len(labels), split)
+        for row in range(start, stop, READ_ROWS):
+            end = min(row + READ_ROWS, stop)
+            yield np.asarray(images[row:end]), np.asarray(labels[row:end])
+
+    signature = (tf.TensorSpec((None, height, width), tf.uint8), tf.TensorSpec((None,), tf.uint8))
+    dataset = tf.data.Dataset.range(len(shards))
+    if training:
+        dataset = dataset.shuffle(len(shards), seed=seed)
+    dataset = dataset.interleave(
+        lambda index: tf.data.Dataset.from_generator(read_shard, args=(index,), output_signature=signature),
+        cycle_length=min(parallel_shards, len(shards)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not training
+    ).unbatch()
+    if training and shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size, drop_remainder=training)
+
+    blur = gaussian_kernel(TRAINING_MATCH_BLUR_SIGMA)
+    blur_kernel = tf.constant(np.outer(blur, blur)[:, :, np.newaxis, np.newaxis])
+
+    def to_model_input(images, labels):
+        images = tf.cast(images, tf.float32)[..., tf.newaxis] / 255.0
+        # Bicubic 28x28 -> target_size upscaling like the notebook's cv2.INTER_CUBIC (within ~0.015 mean abs)
+        images = tf.clip_by_value(tf.image.resize(images, (target_size, target_size), method="bicubic"), 0.0, 1.0)
+        if augment:
+            # adapt_image_for_training_match: light blur, contrast boost, a little noise
+            images = tf.nn.conv2d(images, blur_kernel, strides=1, padding="SAME")
+            images = tf.clip_by_value(images * TRAINING_MATCH_CONTRAST, 0.0, 1.0)
+            noise = tf.random.normal(tf.shape(images), stddev=TRAINING_MATCH_NOISE_STD, seed=seed)
+            images = tf.clip_by_value(images + noise, 0.0, 1.0)
+        labels = tf.one_hot(tf.cast(labels, tf.int32), num_classes) if one_hot else tf.cast(labels, tf.int32)
+        return images, labels
+
+    dataset = dataset.map(to_model_input, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    return dataset.prefetch(tf.data.AUTOTUNE)